@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import contextlib
+import sys
+from pathlib import Path
+
+from pr_reviewer.review_options import DEFAULT_MODEL, configure_logging, read_manifest
+
+
+def parse_limit(value: str) -> tuple[str, int]:
+    provider, _, limit = value.partition('=')
+    if not provider or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(f"Expected PROVIDER=LIMIT, got '{value}'")
+    return provider, int(limit)
+
+
+def initialize_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Review many branch pairs listed in a JSONL manifest concurrently.")
+    parser.add_argument("manifest", type=Path,
+                        help="JSONL file with `path`, `source_branch`, `destination_branch` "
+                             "and optional `model` and `id` keys on every line")
+    parser.add_argument("-r", "--result",
+                        help="JSONL filename for storing results (stdout by default)")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Maximum number of reviews in flight")
+    parser.add_argument("-l", "--limit", type=parse_limit, action="append", default=[],
+                        help="Per-provider concurrency limit, e.g. groq=2 (repeatable)")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL,
+                        help="Model for manifest lines without a `model` key")
+    parser.add_argument("--llm_cache", type=Path,
+                        help="Path to the on-disk cache of model responses. Repeated runs on "
+                             "identical inputs are served from the cache")
+    parser.add_argument("--llm_cache_ttl", type=float, default=7 * 24 * 3600,
+                        help="Lifetime of cached model responses in seconds (default: 7 days)")
+    parser.add_argument("--replay", action="store_true",
+                        help="Serve model responses only from --llm_cache and fail on a miss "
+                             "(for deterministic benchmarks)")
+    parser.add_argument("-c", "--cache", type=Path,
+                        help="Path to the on-disk cache of decoded files and rendered diffs")
+    parser.add_argument("-a", "--async", dest="use_async", action="store_true",
+                        help="Run reviews on one event loop instead of a thread pool. "
+                             "Allows many more reviews in flight.")
+    return parser.parse_args()
+
+
+def main():
+    args = initialize_arguments()
+    if args.replay and not args.llm_cache:
+        print("Error: --replay requires --llm_cache.")
+        sys.exit(1)
+
+    # LangChain and the provider SDKs are imported only after the arguments are parsed
+    from dotenv import load_dotenv
+
+    from pr_reviewer.batch_runner import BatchReviewRunner, awrite_results, write_results
+    from pr_reviewer.llm_cache import enable_llm_cache
+
+    load_dotenv()
+    configure_logging()
+    if args.llm_cache:
+        enable_llm_cache(args.llm_cache, ttl=args.llm_cache_ttl, replay=args.replay)
+    if not args.manifest.is_file():
+        print(f"Error: The manifest '{args.manifest}' does not exist.")
+        sys.exit(1)
+
+    jobs = read_manifest(args.manifest, default_model=args.model)
+    runner = BatchReviewRunner(workers=args.workers, provider_limits=dict(args.limit),
+                               cache_path=args.cache)
+
+    def review_all(stream) -> dict[str, float]:
+        if args.use_async:
+            return asyncio.run(awrite_results(runner.arun(jobs), stream))
+        return write_results(runner.run(jobs), stream)
+
+    # The agents print their steps, they go to stderr so stdout stays valid JSONL
+    results = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.result:
+            with open(args.result, 'wt', encoding='utf-8') as f:
+                stats = review_all(f)
+        else:
+            stats = review_all(results)
+
+    print(f"Reviewed {stats['reviews']} PRs ({stats['failed']} failed) in "
+          f"{stats['elapsed']:.1f}s: {stats['prs_per_minute']:.2f} PRs/minute",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from pr_reviewer.git_tools.diff_filter import DiffFilter
+from pr_reviewer.git_tools.diff_stats import assign_shards
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.review_options import read_manifest
+
+
+def initialize_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Count changed files and lines of many branch pairs without calling a "
+                    "model, to order and shard review work.")
+    parser.add_argument("manifest", type=Path,
+                        help="JSONL file with `path`, `source_branch`, `destination_branch` "
+                             "and optional `id` keys on every line, as for make_batch_review.py")
+    parser.add_argument("-r", "--result",
+                        help="JSONL filename for storing the statistics (stdout by default)")
+    parser.add_argument("--files", action="store_true",
+                        help="Include the counts of every changed file")
+    parser.add_argument("--sort", action="store_true",
+                        help="Order the PRs by the number of changed lines, the largest first")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="Split the PRs into this many shards of about the same number of "
+                             "changed lines")
+    parser.add_argument("--keep_all", action="store_true",
+                        help="Count lockfiles, vendored, generated and binary files as well")
+    return parser.parse_args()
+
+
+def main():
+    args = initialize_arguments()
+    if not args.manifest.is_file():
+        print(f"Error: The manifest '{args.manifest}' does not exist.")
+        sys.exit(1)
+    if args.shards < 0:
+        print("Error: --shards must be positive.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    jobs = read_manifest(args.manifest)
+    # Every repository is opened once, its pairs share the caches of the toolbox
+    by_repo = defaultdict(list)
+    for job in jobs:
+        by_repo[job.path].append(job)
+    records = []
+    for path, repo_jobs in by_repo.items():
+        if not Path(path).is_dir():
+            records.extend({'id': job.id, 'path': path, 'error': "Repository does not exist"}
+                           for job in repo_jobs)
+            continue
+        try:
+            git_tools = GitTools(path,
+                                 diff_filter=DiffFilter.keep_all() if args.keep_all else None)
+        except Exception as e:
+            records.extend({'id': job.id, 'path': path, 'error': f"{type(e).__name__}: {e}"}
+                           for job in repo_jobs)
+            continue
+        try:
+            for job in repo_jobs:
+                record = {'id': job.id, 'path': path, 'source_branch': job.source_branch,
+                          'destination_branch': job.destination_branch}
+                # One broken pair must not lose the statistics of the others
+                try:
+                    stats = git_tools.diff_stats(job.destination_branch, job.source_branch)
+                except KeyError:
+                    record['error'] = (f"Unknown branch {job.destination_branch} or "
+                                       f"{job.source_branch}")
+                except Exception as e:
+                    record['error'] = f"{type(e).__name__}: {e}"
+                else:
+                    record.update(stats.to_dict())
+                    if not args.files:
+                        del record['files']
+                records.append(record)
+        finally:
+            git_tools.close()
+
+    costs = [record.get('added', 0) + record.get('removed', 0) for record in records]
+    if args.shards:
+        for record, shard in zip(records, assign_shards(costs, args.shards)):
+            record['shard'] = shard
+    if args.sort:
+        records = [record for _, record in sorted(zip(costs, records), key=lambda item: -item[0])]
+
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+    if args.result:
+        with open(args.result, 'wt', encoding='utf-8') as f:
+            f.write(lines)
+    else:
+        sys.stdout.write(lines)
+    print(f"Counted {len(records)} PRs from {len(by_repo)} repositories in "
+          f"{time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
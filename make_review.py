@@ -1,13 +1,14 @@
 import argparse
 import sys
 from pathlib import Path
-
-from dotenv import load_dotenv
+from typing import Iterable, TYPE_CHECKING
 
 from pr_reviewer.git_tools.git_tools import GitTools
-from pr_reviewer.simple_reviewer import make_review
+from pr_reviewer.review_options import REVIEW_MODES, SPECIALISTS, configure_logging
+from pr_reviewer.tracing import Tracer
 
-load_dotenv()
+if TYPE_CHECKING:
+    from pr_reviewer.streaming_reviewer import FileFinding
 
 
 def initialize_arguments() -> argparse.Namespace:
@@ -25,7 +26,66 @@ def initialize_arguments() -> argparse.Namespace:
         help="Name of the model to use (e.g., gpt-4o-mini, llama-3.1-70b-versatile). "
              "If model name starting with 'gpt' will use OpenAI provider, otherwise Groq provider."
     )
-    return parser.parse_args()
+    parser.add_argument("--llm_cache", type=Path,
+                        help="Path to the on-disk cache of model responses. Repeated runs on "
+                             "identical inputs are served from the cache")
+    parser.add_argument("--llm_cache_ttl", type=float, default=7 * 24 * 3600,
+                        help="Lifetime of cached model responses in seconds (default: 7 days)")
+    parser.add_argument("--replay", action="store_true",
+                        help="Serve model responses only from --llm_cache and fail on a miss "
+                             "(for deterministic benchmarks)")
+    parser.add_argument("--trace", type=Path,
+                        help="Filename for storing the spans of the review as JSON")
+    parser.add_argument("--otlp", type=Path,
+                        help="Filename for storing the spans in the OpenTelemetry (OTLP/JSON) "
+                             "format")
+    parser.add_argument("-c", "--cache", type=Path,
+                        help="Path to the on-disk cache of decoded files and rendered diffs. "
+                             "It can be shared between runs and reviewer processes.")
+    parser.add_argument("--mode", choices=REVIEW_MODES,
+                        help="'agent' (default) fetches every diff with a tool call, "
+                             "'prefetch' packs all diffs into the first prompt to save model "
+                             "round-trips, 'chunked' reviews token-budgeted batches of diffs "
+                             "in parallel. Not used with --stream, --specialists and --state")
+    parser.add_argument("--diff_budget", type=int,
+                        help="Token budget for the diffs of one review call in the 'chunked' "
+                             "mode (by default derived from the model context size)")
+    parser.add_argument("--state", type=Path,
+                        help="Path to the state of the last review of these branches. Enables "
+                             "incremental review: only files changed since the last review "
+                             "are reviewed again, other findings are carried forward")
+    parser.add_argument("--stream", action="store_true",
+                        help="Review files by parallel calls and output the finding for every "
+                             "file as soon as it is ready")
+    parser.add_argument("--specialists", type=parse_specialists, nargs="?",
+                        const=list(SPECIALISTS),
+                        help="Review by parallel specialist reviewers and merge their findings. "
+                             f"Comma-separated subset of {','.join(SPECIALISTS)} (all by "
+                             "default)")
+    parser.add_argument("--fallback_model", action="append", default=[],
+                        help="Model to call when the main model keeps failing, e.g. on rate "
+                             "limits (repeatable, tried in order)")
+    parser.add_argument("--rate_limit", action="append", default=[],
+                        help="Requests per minute of a provider or a model, e.g. groq=30 or "
+                             "openai/gpt-4o=500 (repeatable)")
+    parser.add_argument("--max_retries", type=int, default=4,
+                        help="Retries of a failed model call before the fallback model is used")
+    args = parser.parse_args()
+    # These reviews call the model per file or per specialist, they have no modes
+    if args.mode:
+        for name in ('stream', 'specialists', 'state'):
+            if getattr(args, name):
+                parser.error(f"argument --mode: not allowed with --{name}")
+    return args
+
+
+def parse_specialists(value: str) -> list[str]:
+    specialists = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in specialists if name not in SPECIALISTS]
+    if not specialists or unknown:
+        raise argparse.ArgumentTypeError(
+            f"Expected a comma-separated subset of {','.join(SPECIALISTS)}, got '{value}'")
+    return specialists
 
 
 def validate_repository(path: Path):
@@ -66,15 +126,92 @@ def store_results(review: str, result_file: str = ''):
         print(review)
 
 
+def stream_results(findings: Iterable['FileFinding'], result_file: str = ''):
+    if result_file:
+        with open(result_file, 'wt', encoding='utf-8') as f:
+            for finding in findings:
+                f.write(finding.render() + "\n\n")
+                f.flush()
+                print(f"Review of {finding.file_path} has been written to {result_file}")
+    else:
+        print("Review:")
+        for finding in findings:
+            print(finding.render() + "\n", flush=True)
+
+
 def main():
     args = initialize_arguments()
+    if args.replay and not args.llm_cache:
+        print("Error: --replay requires --llm_cache.")
+        sys.exit(1)
+
+    # Reviewers pull in LangChain and the provider SDKs, they are imported only after the
+    # arguments are parsed, so --help and argument errors are instant
+    from dotenv import load_dotenv
+
+    from pr_reviewer.incremental_reviewer import make_incremental_review
+    from pr_reviewer.llm_cache import enable_llm_cache
+    from pr_reviewer.resilient_llm import (RateLimits, RetryPolicy, get_resilient_llm,
+                                           parse_rate_limits)
+    from pr_reviewer.simple_reviewer import make_review
+    from pr_reviewer.specialist_reviewer import make_specialist_review
+    from pr_reviewer.streaming_reviewer import stream_review
+
+    try:
+        rate_limits = RateLimits(parse_rate_limits(args.rate_limit))
+    except ValueError as e:
+        print(f"Error: {e}.")
+        sys.exit(1)
+
+    load_dotenv()
+    configure_logging()
+    if args.llm_cache:
+        enable_llm_cache(args.llm_cache, ttl=args.llm_cache_ttl, replay=args.replay)
     validate_repository(args.path)
+    llm = get_resilient_llm(args.model, args.fallback_model, rate_limits=rate_limits,
+                            policy=RetryPolicy(max_retries=args.max_retries))
 
     git_tools = GitTools(str(args.path))
-    source_branch, destination_branch = determine_branches(git_tools, args)
-
-    review = make_review(args.path, destination_branch, source_branch, args.model)
-    store_results(review, args.result)
+    try:
+        source_branch, destination_branch = determine_branches(git_tools, args)
+    finally:
+        git_tools.close()
+
+    tracer = Tracer()
+    with tracer.activate():
+        if args.stream:
+            stream_results(stream_review(args.path, destination_branch, source_branch,
+                                         args.model, cache_path=args.cache, llm=llm),
+                           args.result)
+        elif args.specialists:
+            review = make_specialist_review(args.path, destination_branch, source_branch,
+                                            args.model, cache_path=args.cache,
+                                            specialists=args.specialists,
+                                            diff_budget=args.diff_budget, llm=llm)
+            store_results(review, args.result)
+        elif args.state:
+            review = make_incremental_review(args.path, destination_branch, source_branch,
+                                             args.state, args.model, cache_path=args.cache,
+                                             llm=llm)
+            store_results(review, args.result)
+        else:
+            review = make_review(args.path, destination_branch, source_branch, args.model,
+                                 cache_path=args.cache, mode=args.mode or 'agent',
+                                 diff_budget=args.diff_budget, llm=llm)
+            store_results(review, args.result)
+
+    report_trace(tracer, args)
+
+
+def report_trace(tracer: Tracer, args: argparse.Namespace):
+    print("Performance summary:")
+    print(tracer.summary_table())
+    if args.trace:
+        tracer.write_json(args.trace)
+        print(f"Trace has been written to {args.trace}")
+    if args.otlp:
+        tracer.write_otlp(args.otlp)
+        print(f"OpenTelemetry trace has been written to {args.otlp}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, TextIO
+
+from pr_reviewer.review_options import ReviewJob
+from pr_reviewer.simple_reviewer import amake_review, get_provider, make_review
+
+
+@dataclass
+class ReviewResult:
+    id: str
+    path: str
+    source_branch: str
+    destination_branch: str
+    model: str
+    status: str
+    review: str = ''
+    error: str = ''
+    elapsed: float = 0.0
+
+
+class BatchReviewRunner:
+    """Runs many reviews concurrently in a bounded thread pool.
+
+    The total number of reviews in flight is limited by `workers`, the number of reviews per
+    provider by `provider_limits` (provider name -> limit). Jobs of a provider that reached its
+    limit wait in the scheduler, not in a worker thread, so a rate-limited provider can't
+    occupy the pool while jobs for other providers are pending.
+    """
+
+    def __init__(self, workers: int = 4, provider_limits: dict[str, int] | None = None,
+                 review_fn: Callable[..., str] = make_review,
+                 cache_path: str | Path | None = None,
+                 areview_fn: Callable[..., Awaitable[str]] = amake_review):
+        self.workers = workers
+        self.review_fn = review_fn
+        self.areview_fn = areview_fn
+        self.cache_path = cache_path
+        self._limits = provider_limits or {}
+
+    def _limit(self, provider: str) -> int:
+        return max(1, min(self._limits.get(provider, self.workers), self.workers))
+
+    def _review_args(self, job: ReviewJob) -> tuple[tuple, dict]:
+        kwargs = {'cache_path': self.cache_path} if self.cache_path else {}
+        return (job.path, job.destination_branch, job.source_branch, job.model), kwargs
+
+    @staticmethod
+    def _new_result(job: ReviewJob) -> ReviewResult:
+        return ReviewResult(id=job.id, path=job.path, source_branch=job.source_branch,
+                            destination_branch=job.destination_branch, model=job.model,
+                            status='ok')
+
+    def _run_job(self, job: ReviewJob) -> ReviewResult:
+        result = self._new_result(job)
+        args, kwargs = self._review_args(job)
+        start = time.perf_counter()
+        try:
+            result.review = self.review_fn(*args, **kwargs)
+        except Exception as e:
+            result.status = 'error'
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    async def _arun_job(self, job: ReviewJob, slots: asyncio.Semaphore,
+                        provider_slots: asyncio.Semaphore) -> ReviewResult:
+        result = self._new_result(job)
+        args, kwargs = self._review_args(job)
+        async with provider_slots, slots:
+            start = time.perf_counter()
+            try:
+                result.review = await self.areview_fn(*args, **kwargs)
+            except Exception as e:
+                result.status = 'error'
+                result.error = f"{type(e).__name__}: {e}"
+            result.elapsed = time.perf_counter() - start
+        return result
+
+    async def arun(self, jobs: Iterable[ReviewJob]) -> AsyncIterator[ReviewResult]:
+        """Review all jobs on the running event loop, yielding results in completion order.
+
+        Reviews wait for the model without occupying threads, so `workers` can be much
+        larger than for `run`.
+        """
+        slots = asyncio.Semaphore(self.workers)
+        provider_slots: dict[str, asyncio.Semaphore] = {}
+        tasks = []
+        for job in jobs:
+            provider = get_provider(job.model)
+            if provider not in provider_slots:
+                provider_slots[provider] = asyncio.Semaphore(self._limit(provider))
+            tasks.append(asyncio.ensure_future(
+                self._arun_job(job, slots, provider_slots[provider])))
+
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+
+    def run(self, jobs: Iterable[ReviewJob]) -> Iterator[ReviewResult]:
+        """Review all jobs, yielding results in the order of completion."""
+        pending: dict[str, deque[ReviewJob]] = {}
+        for job in jobs:
+            pending.setdefault(get_provider(job.model), deque()).append(job)
+        running: dict[Future, str] = {}
+        in_flight = Counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='reviewer') as executor:
+            while pending or running:
+                # Start jobs of every provider that has free slots, round-robin
+                started = True
+                while started and len(running) < self.workers:
+                    started = False
+                    for provider in list(pending):
+                        if len(running) >= self.workers:
+                            break
+                        if in_flight[provider] >= self._limit(provider):
+                            continue
+                        job = pending[provider].popleft()
+                        if not pending[provider]:
+                            del pending[provider]
+                        running[executor.submit(self._run_job, job)] = provider
+                        in_flight[provider] += 1
+                        started = True
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight[running.pop(future)] -= 1
+                    yield future.result()
+
+
+class _ResultWriter:
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.total = self.failed = 0
+
+    def write(self, result: ReviewResult):
+        self.stream.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.total += 1
+        self.failed += result.status != 'ok'
+
+    def stats(self) -> dict[str, float]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            'reviews': self.total,
+            'failed': self.failed,
+            'elapsed': elapsed,
+            'prs_per_minute': self.total * 60 / elapsed if elapsed else 0.0,
+        }
+
+
+def write_results(results: Iterable[ReviewResult], stream: TextIO) -> dict[str, float]:
+    """Write results to a stream as JSON lines and return throughput statistics."""
+    writer = _ResultWriter(stream)
+    for result in results:
+        writer.write(result)
+    return writer.stats()
+
+
+async def awrite_results(results: AsyncIterator[ReviewResult],
+                         stream: TextIO) -> dict[str, float]:
+    """Async counterpart of `write_results`."""
+    writer = _ResultWriter(stream)
+    async for result in results:
+        writer.write(result)
+    return writer.stats()
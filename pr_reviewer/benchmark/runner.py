@@ -0,0 +1,128 @@
+import contextlib
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from pr_reviewer.benchmark.import_time import STARTUP_BUDGET_MS, startup_profiles
+from pr_reviewer.benchmark.stub_llm import ScriptedReviewModel
+from pr_reviewer.benchmark.synthetic_repo import (BASE_BRANCH, FEATURE_BRANCH, RepoSpec,
+                                                  create_synthetic_repo)
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.simple_reviewer import make_review
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, warmup: int = 0) -> dict[str, float]:
+    """Time `repeat` calls of `func` after `warmup` untimed calls, in milliseconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings)}
+
+
+def _quiet(func: Callable[[], Any]) -> Callable[[], Any]:
+    """Drop the verbose agent output, printing it would dominate the timings."""
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+    return wrapper
+
+
+def _cold(repo_path: str, func: Callable[[GitTools], Any]) -> Callable[[], Any]:
+    """Run `func` with a new `GitTools`, closing it before the next call."""
+    def wrapper():
+        with contextlib.closing(GitTools(repo_path)) as toolbox:
+            return func(toolbox)
+    return wrapper
+
+
+def benchmark_repo(repo_path: str | Path, repeat: int = 5) -> dict[str, dict[str, float]]:
+    """Time the git tools and the review loop with the scripted model on a repository.
+
+    Cold timings use a new `GitTools` per call, warm ones reuse the caches of one instance.
+    """
+    repo_path = str(repo_path)
+    with contextlib.closing(GitTools(repo_path)) as warm:
+        files = [path for path, _ in warm.changed_files(BASE_BRANCH, FEATURE_BRANCH)]
+        sample = files[len(files) // 2] if files else None
+        llm = ScriptedReviewModel()
+
+        def file_diffs(toolbox: GitTools):
+            for path in files:
+                toolbox.diff_file_content(BASE_BRANCH, FEATURE_BRANCH, path)
+
+        cases: dict[str, Callable[[], Any]] = {
+            'list_branches': _cold(repo_path, lambda toolbox: toolbox.list_branches()),
+            'diff_between_branches_cold': _cold(
+                repo_path,
+                lambda toolbox: toolbox.diff_between_branches(BASE_BRANCH, FEATURE_BRANCH)),
+            'diff_between_branches_warm':
+                lambda: warm.diff_between_branches(BASE_BRANCH, FEATURE_BRANCH),
+            'diff_file_content_all_cold': _cold(repo_path, file_diffs),
+            'diff_file_content_all_warm': lambda: file_diffs(warm),
+            'review_agent': _quiet(lambda: make_review(repo_path, BASE_BRANCH, FEATURE_BRANCH,
+                                                       mode='agent', llm=llm)),
+            'review_prefetch': _quiet(lambda: make_review(repo_path, BASE_BRANCH,
+                                                          FEATURE_BRANCH, mode='prefetch',
+                                                          llm=llm)),
+        }
+        if sample:
+            cases['get_file_content_cold'] = _cold(
+                repo_path, lambda toolbox: toolbox.get_file_content(FEATURE_BRANCH, sample))
+
+        return {name: measure(func, repeat=repeat, warmup=1) for name, func in cases.items()}
+
+
+def benchmark_startup(repo_path: str | Path, repeat: int = 5) -> dict[str, dict[str, float]]:
+    """Import time of the CLI start-up and of a git-only process, in milliseconds."""
+    timings: dict[str, list[float]] = {}
+    for _ in range(repeat):
+        for name, profile in startup_profiles(repo_path).items():
+            timings.setdefault(f'import_{name}', []).append(profile.total_ms)
+    return {name: {'median_ms': statistics.median(values), 'min_ms': min(values)}
+            for name, values in timings.items()}
+
+
+def run_benchmarks(spec: RepoSpec, repeat: int = 5,
+                   work_dir: str | Path | None = None) -> dict[str, Any]:
+    """Generate a synthetic repository of the given shape and benchmark it."""
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        repo_path = Path(tmp) / 'repo'
+        start = time.perf_counter()
+        shape = create_synthetic_repo(repo_path, spec)
+        generation_ms = (time.perf_counter() - start) * 1000
+        results = benchmark_repo(repo_path, repeat=repeat)
+        results |= benchmark_startup(repo_path, repeat=repeat)
+    return {
+        'params': spec.to_dict() | {'repeat': repeat},
+        'repo': shape | {'generation_ms': generation_ms},
+        'results': results,
+    }
+
+
+def find_regressions(report: dict[str, Any], baseline: dict[str, Any],
+                     threshold: float = 0.2) -> list[str]:
+    """Describe the cases whose median is more than `threshold` slower than in the baseline."""
+    regressions = []
+    for name, timing in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous['median_ms']:
+            continue
+        change = timing['median_ms'] / previous['median_ms'] - 1
+        if change > threshold:
+            regressions.append(f"{name}: {previous['median_ms']:.2f}ms -> "
+                               f"{timing['median_ms']:.2f}ms (+{change:.0%})")
+    return regressions
+
+
+def find_slow_startup(report: dict[str, Any], budget_ms: float = STARTUP_BUDGET_MS) -> list[str]:
+    """Describe the import time cases whose median exceeds `budget_ms`."""
+    return [f"{name}: {timing['median_ms']:.2f}ms > {budget_ms:.0f}ms"
+            for name, timing in report['results'].items()
+            if name.startswith('import_') and timing['median_ms'] > budget_ms]
@@ -0,0 +1,96 @@
+import re
+import time
+from typing import Any, Sequence
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_BRANCHES = re.compile(r"from the branch '([^']+)'\s*to the '([^']+)'")
+_CHANGE = re.compile(r"^Type: \w+, Old: (\S+), New: (\S+)$", re.MULTILINE)
+
+
+class ScriptedReviewModel(BaseChatModel):
+    """Offline chat model following the review prompts like a well-behaved agent.
+
+    With diffs already in the prompt it answers at once, otherwise it fetches the list of
+    changes and then the diff of every file before answering, so the benchmark exercises
+    the same tool round trips as a real review. `latency` seconds are slept per call to
+    simulate the network.
+    """
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted-review'
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(**kwargs)
+
+    def _next_message(self, messages: list[BaseMessage]) -> AIMessage:
+        prompt = next((m.content for m in messages if isinstance(m, HumanMessage)), '')
+        results = [m for m in messages if isinstance(m, ToolMessage)]
+        if '```diff\n' in prompt:
+            return AIMessage(content="Reviewed the prefetched changes.")
+
+        new_branch, old_branch = _BRANCHES.search(prompt).groups()
+        if not results:
+            return AIMessage(content='', tool_calls=[{
+                'name': 'diff_between_branches',
+                'args': {'base_branch': old_branch, 'feature_branch': new_branch},
+                'id': 'call_0',
+            }])
+        if len(results) == 1:
+            paths = [new if new != 'None' else old
+                     for old, new in _CHANGE.findall(results[0].content)]
+            if paths:
+                return AIMessage(content='', tool_calls=[{
+                    'name': 'diff_file_content',
+                    'args': {'base_branch': old_branch, 'feature_branch': new_branch,
+                             'file_path': path},
+                    'id': f'call_{i}',
+                } for i, path in enumerate(paths, start=1)])
+        return AIMessage(content=f"Reviewed {len(results) - 1} files.")
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None,
+                  **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+
+class FakeResponse:
+    """The part of an HTTP response the retry logic reads."""
+
+    def __init__(self, status_code: int, headers: dict[str, str] | None = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    """Error of a provider SDK with the status code and the response."""
+
+    def __init__(self, status_code: int, retry_after: float | None = None):
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+class FlakyReviewModel(ScriptedReviewModel):
+    """Scripted model failing the calls listed in `failures` (1-based) with `status_code`,
+    like a provider hitting its rate limits."""
+    failures: list[int] = []
+    status_code: int = 429
+    retry_after: float | None = None
+    calls: int = 0
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None,
+                  **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        if self.calls in self.failures:
+            raise FakeAPIError(self.status_code, self.retry_after)
+        return super()._generate(messages, stop, run_manager, **kwargs)
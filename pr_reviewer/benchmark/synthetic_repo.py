@@ -0,0 +1,140 @@
+import random
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+from dulwich.objects import Blob, Commit, ShaFile, Tree
+from dulwich.repo import Repo
+
+BASE_BRANCH = 'main'
+FEATURE_BRANCH = 'feature'
+
+_WORDS = ('value', 'result', 'items', 'config', 'index', 'count', 'buffer', 'request', 'cache',
+          'node', 'path', 'total', 'limit', 'state', 'token', 'record', 'offset', 'payload')
+
+
+@dataclass
+class RepoSpec:
+    """Shape of a synthetic repository."""
+    files: int = 200
+    depth: int = 3
+    fan_out: int = 4
+    blob_size: int = 4096
+    changed_ratio: float = 0.1
+    added_ratio: float = 0.02
+    deleted_ratio: float = 0.02
+    seed: int = 42
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _source_line(rnd: random.Random) -> str:
+    a, b, c = rnd.choices(_WORDS, k=3)
+    return f"    {a}_{rnd.randrange(1000)} = {b}.{c}({rnd.randrange(100)})\n"
+
+
+def _source_file(rnd: random.Random, size: int) -> list[str]:
+    lines = []
+    used = 0
+    while used < size:
+        if not lines or rnd.random() < 0.1:
+            line = f"\ndef {rnd.choice(_WORDS)}_{rnd.randrange(10 ** 6)}():\n"
+        else:
+            line = _source_line(rnd)
+        lines.append(line)
+        used += len(line)
+    return lines
+
+
+def _modify(rnd: random.Random, lines: list[str]) -> list[str]:
+    """Change a few places of a file like a typical commit does."""
+    lines = list(lines)
+    for _ in range(rnd.randint(1, 3)):
+        pos = rnd.randrange(len(lines))
+        action = rnd.random()
+        if action < 0.5:
+            lines[pos] = _source_line(rnd)
+        elif action < 0.8:
+            lines[pos:pos] = [_source_line(rnd) for _ in range(rnd.randint(1, 5))]
+        elif len(lines) > 1:
+            del lines[pos]
+    return lines
+
+
+def _file_paths(spec: RepoSpec, rnd: random.Random, count: int, prefix: str) -> list[str]:
+    paths = []
+    for i in range(count):
+        dirs = [f"dir_{rnd.randrange(spec.fan_out)}" for _ in range(rnd.randint(0, spec.depth))]
+        paths.append('/'.join(dirs + [f"{prefix}_{i}.py"]))
+    return paths
+
+
+def _store_commit(objects: list[tuple[ShaFile, str | None]], files: dict[str, bytes],
+                  parents: list[bytes], commit_time: int, message: bytes) -> bytes:
+    trees: dict[str, Tree] = {'': Tree()}
+    blobs: dict[bytes, Blob] = {}
+    for file_path, data in files.items():
+        blob = Blob.from_string(data)
+        blobs.setdefault(blob.id, blob)
+        *dirs, fn = file_path.split('/')
+        for i in range(len(dirs)):
+            trees.setdefault('/'.join(dirs[:i + 1]), Tree())
+        trees['/'.join(dirs)].add(fn.encode(), 0o100644, blob.id)
+    objects.extend((blob, None) for blob in blobs.values())
+
+    for dir_path in sorted(trees, key=lambda p: p.count('/') if p else -1, reverse=True):
+        if dir_path:
+            parent_path, _, name = dir_path.rpartition('/')
+            trees[parent_path].add(name.encode(), 0o040000, trees[dir_path].id)
+        objects.append((trees[dir_path], None))
+
+    commit = Commit()
+    commit.tree = trees[''].id
+    commit.parents = parents
+    commit.author = commit.committer = b'Benchmark <benchmark@example.com>'
+    commit.author_time = commit.commit_time = commit_time
+    commit.author_timezone = commit.commit_timezone = 0
+    commit.encoding = b'UTF-8'
+    commit.message = message
+    objects.append((commit, None))
+    return commit.id
+
+
+def create_synthetic_repo(repo_path: str | Path, spec: RepoSpec) -> dict[str, int]:
+    """Create a repository with `main` and `feature` branches of the given shape offline.
+
+    All objects are written as one pack, like in a cloned repository. Returns the numbers
+    of changed, added and deleted files of the feature branch.
+    """
+    rnd = random.Random(spec.seed)
+    base_files = {file_path: _source_file(rnd, spec.blob_size)
+                  for file_path in _file_paths(spec, rnd, spec.files, 'module')}
+
+    feature_files = dict(base_files)
+    existing = sorted(base_files)
+    changed = rnd.sample(existing, int(len(existing) * spec.changed_ratio))
+    for file_path in changed:
+        feature_files[file_path] = _modify(rnd, base_files[file_path])
+    deleted = rnd.sample(sorted(set(existing) - set(changed)),
+                         int(len(existing) * spec.deleted_ratio))
+    for file_path in deleted:
+        del feature_files[file_path]
+    added = _file_paths(spec, rnd, int(spec.files * spec.added_ratio), 'added')
+    for file_path in added:
+        feature_files[file_path] = _source_file(rnd, spec.blob_size)
+
+    objects: list[tuple[ShaFile, str | None]] = []
+    base = _store_commit(objects, {p: ''.join(lines).encode() for p, lines in base_files.items()},
+                         [], 1700000000, b'Base')
+    feature = _store_commit(objects,
+                            {p: ''.join(lines).encode() for p, lines in feature_files.items()},
+                            [base], 1700000100, b'Feature')
+
+    repo = Repo.init(str(repo_path), mkdir=True)
+    try:
+        repo.object_store.add_objects(objects)
+        repo.refs[f'refs/heads/{BASE_BRANCH}'.encode()] = base
+        repo.refs[f'refs/heads/{FEATURE_BRANCH}'.encode()] = feature
+    finally:
+        repo.close()
+    return {'changed': len(changed), 'added': len(set(added)), 'deleted': len(deleted)}
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+# Rough estimate for code and diffs, it doesn't require a tokenizer download
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class DiffChunk:
+    file_path: str
+    change_type: str
+    text: str
+    tokens: int
+    part: int = 1
+    parts: int = 1
+
+    def render(self) -> str:
+        part = f", part {self.part}/{self.parts}" if self.parts > 1 else ""
+        return f"### {self.file_path} ({self.change_type}{part})\n```diff\n{self.text}\n```"
+
+
+def _split_header(lines: list[str]) -> tuple[list[str], list[list[str]]]:
+    """Split diff lines into the file header and hunks, each hunk starts with '@@'."""
+    header = []
+    hunks: list[list[str]] = []
+    for line in lines:
+        if line.startswith('@@'):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            header.append(line)
+    if not hunks:
+        # Diffs of added and deleted files have no hunk markers, every line is content
+        return [], [header] if header else []
+    return header, hunks
+
+
+def _split_lines(lines: list[str], max_tokens: int,
+                 count_tokens: Callable[[str], int]) -> list[list[str]]:
+    pieces: list[list[str]] = [[]]
+    used = 0
+    for line in lines:
+        tokens = count_tokens(line)
+        if pieces[-1] and used + tokens > max_tokens:
+            pieces.append([])
+            used = 0
+        pieces[-1].append(line)
+        used += tokens
+    return pieces
+
+
+def split_diff(file_path: str, change_type: str, diff: str, max_tokens: int,
+               count_tokens: Callable[[str], int] = estimate_tokens) -> list[DiffChunk]:
+    """Split the diff of one file into chunks of at most `max_tokens` at hunk boundaries.
+
+    Every chunk repeats the file header. Hunks larger than the limit are split by lines.
+    """
+    header, hunks = _split_header(diff.splitlines())
+    header_tokens = count_tokens("\n".join(header))
+    hunk_budget = max(1, max_tokens - header_tokens)
+
+    pieces: list[list[str]] = []
+    used = 0
+    for hunk in hunks:
+        tokens = count_tokens("\n".join(hunk))
+        if tokens > hunk_budget:
+            pieces.extend(_split_lines(hunk, hunk_budget, count_tokens))
+            used = hunk_budget  # Don't append more hunks to the split one
+            continue
+        if pieces and used + tokens <= hunk_budget:
+            pieces[-1].extend(hunk)
+            used += tokens
+        else:
+            pieces.append(list(hunk))
+            used = tokens
+
+    if not pieces:
+        pieces = [[]]
+    chunks = []
+    for i, piece in enumerate(pieces, start=1):
+        text = "\n".join(header + piece)
+        chunks.append(DiffChunk(file_path, change_type, text, count_tokens(text), i, len(pieces)))
+    return chunks
+
+
+def pack_chunks(chunks: Iterable[DiffChunk], budget: int) -> list[list[DiffChunk]]:
+    """Pack chunks into batches that fit into `budget` tokens, keeping the order of files."""
+    batches: list[list[DiffChunk]] = []
+    used = 0
+    for chunk in chunks:
+        if batches and used + chunk.tokens <= budget:
+            batches[-1].append(chunk)
+            used += chunk.tokens
+        else:
+            batches.append([chunk])
+            used = chunk.tokens
+    return batches
+
+
+def chunk_file_diffs(file_diffs: Iterable[tuple[str, str, str]], budget: int,
+                     count_tokens: Callable[[str], int] = estimate_tokens
+                     ) -> list[list[DiffChunk]]:
+    """Split (path, change type, diff) triples into chunks and pack them into batches."""
+    chunks = []
+    for file_path, change_type, diff in file_diffs:
+        chunks.extend(split_diff(file_path, change_type, diff, budget, count_tokens))
+    return pack_chunks(chunks, budget)
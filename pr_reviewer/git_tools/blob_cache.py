@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _write_access_times(conn: sqlite3.Connection, touched: dict[str, float]):
+    if touched:
+        conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?",
+                         [(accessed, key) for key, accessed in touched.items()])
+        touched.clear()
+
+
+def _close(conn: sqlite3.Connection, lock: threading.Lock, touched: dict[str, float]):
+    with lock:
+        try:
+            if touched:
+                with _transaction(conn):
+                    _write_access_times(conn, touched)
+        finally:
+            conn.close()
+
+
+class BlobCache:
+    """Content-addressed on-disk cache for decoded blobs and rendered diffs.
+
+    Entries are keyed by (kind, old blob SHA, new blob SHA, options), so they never go stale
+    and can be shared between review runs. The cache is an SQLite database in WAL mode, which
+    lets several reviewer processes on one host use the same file. When the total size of the
+    stored values exceeds `max_bytes`, the least recently used entries are evicted.
+
+    The total size is kept up to date by triggers, so a put doesn't sum the whole table.
+    Access times of hits are buffered and written in one statement with the next put, on
+    close or after `touch_batch` hits. A cache which is not closed writes them when it is
+    garbage collected or at the exit of the interpreter.
+    """
+
+    def __init__(self, db_path: str | Path, max_bytes: int = 256 * 1024 * 1024,
+                 timeout: float = 30.0, touch_batch: int = 64):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.misses = 0
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}
+        self._conn = sqlite3.connect(str(self.db_path), timeout=timeout,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with _transaction(self._conn):
+            self._create_schema()
+        self._finalizer = weakref.finalize(self, _close, self._conn, self._lock, self._touched)
+
+    def _create_schema(self):
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        # Single row with the total size of the entries, databases created before it was
+        # added are summed up once
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0),"
+            " bytes INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO totals (id, bytes) "
+                           "SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN"
+            " UPDATE totals SET bytes = bytes + new.size WHERE id = 0; END")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN"
+            " UPDATE totals SET bytes = bytes - old.size WHERE id = 0; END")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN"
+            " UPDATE totals SET bytes = bytes - old.size + new.size WHERE id = 0; END")
+
+    @staticmethod
+    def make_key(kind: str, old_sha: bytes | None, new_sha: bytes | None,
+                 options: str = '') -> str:
+        old = old_sha.decode('ascii') if old_sha else '-'
+        new = new_sha.decode('ascii') if new_sha else '-'
+        return f"{kind}:{old}:{new}:{options}"
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.touch_batch:
+                with _transaction(self._conn):
+                    self._flush_touched()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock, _transaction(self._conn):
+            # Access times go first, so the eviction sees the recent hits
+            self._flush_touched()
+            # An upsert instead of INSERT OR REPLACE, whose deletes don't fire triggers
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "size = excluded.size, accessed = excluded.accessed",
+                (key, value, size, time.time()))
+            self._evict()
+
+    def _flush_touched(self):
+        _write_access_times(self._conn, self._touched)
+
+    def _total(self) -> int:
+        return self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def _evict(self):
+        total = self._total()
+        if total <= self.max_bytes:
+            return
+        to_delete = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total()
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM entries")
+
+    def close(self):
+        self._finalizer()
@@ -0,0 +1,93 @@
+import zlib
+from typing import Callable
+
+from dulwich.object_store import BaseObjectStore, DiskObjectStore
+from dulwich.pack import OFS_DELTA, REF_DELTA
+
+_CHUNK = 4096
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _inflate_head(read: Callable[[int], bytes], length: int) -> bytes:
+    """Decompress only the first `length` bytes of a zlib stream."""
+    inflater = zlib.decompressobj()
+    head = b''
+    while len(head) < length and not inflater.eof:
+        chunk = inflater.unconsumed_tail or read(_CHUNK)
+        if not chunk:
+            break
+        head += inflater.decompress(chunk, length - len(head))
+    return head
+
+
+def _probe_pack(pack, sha: bytes, head_bytes: int) -> tuple[int, bytes | None]:
+    offset = pack.index.object_offset(sha)
+    file = pack.data._file
+    file.seek(offset)
+    byte = file.read(1)[0]
+    type_num = (byte >> 4) & 0x07
+    size = byte & 0x0F
+    shift = 4
+    while byte & 0x80:
+        byte = file.read(1)[0]
+        size |= (byte & 0x7F) << shift
+        shift += 7
+    if type_num == OFS_DELTA:
+        while file.read(1)[0] & 0x80:
+            pass
+    elif type_num == REF_DELTA:
+        file.read(20)
+    else:
+        return size, _inflate_head(file.read, head_bytes)
+    # A delta starts with the sizes of its base and of the result, the content itself
+    # needs the base, so it is read by the caller
+    delta = _inflate_head(file.read, 20)
+    _, pos = _read_varint(delta, 0)
+    size, _ = _read_varint(delta, pos)
+    return size, None
+
+
+def _probe_loose(path: str, head_bytes: int) -> tuple[int, bytes] | None:
+    try:
+        with open(path, 'rb') as f:
+            data = _inflate_head(f.read, head_bytes + 32)
+    except FileNotFoundError:
+        return None
+    header, _, content = data.partition(b'\0')
+    return int(header.split(b' ')[1]), content[:head_bytes]
+
+
+def probe_blob(object_store: BaseObjectStore, sha: bytes,
+               head_bytes: int) -> tuple[int, Callable[[], bytes]]:
+    """Get the size of a blob and a function reading its first `head_bytes` bytes.
+
+    The size is taken from the object header in the pack or the loose object, and only the
+    head is decompressed, so large files are not read in full. The head of a deltified
+    object is read from the whole blob on request, other object stores read it at once.
+    """
+    probed = None
+    if isinstance(object_store, DiskObjectStore):
+        for pack in object_store.packs:
+            if sha in pack:
+                probed = _probe_pack(pack, sha, head_bytes)
+                break
+        else:
+            probed = _probe_loose(object_store._get_shafile_path(sha), head_bytes)
+    if probed is not None and probed[1] is not None:
+        size, head = probed
+        return size, lambda: head
+
+    if probed is not None:
+        return probed[0], lambda: object_store[sha].as_raw_string()[:head_bytes]
+    data = object_store[sha].as_raw_string()
+    return len(data), lambda: data[:head_bytes]
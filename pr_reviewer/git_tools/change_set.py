@@ -0,0 +1,140 @@
+from collections import OrderedDict
+
+from dulwich.diff_tree import TreeChange, tree_changes
+from dulwich.object_store import BaseObjectStore
+from dulwich.objects import S_ISGITLINK
+
+from pr_reviewer.git_tools.blob_probe import probe_blob
+from pr_reviewer.git_tools.diff_filter import DiffFilter, ExcludedFile
+from pr_reviewer.tracing import trace_span
+
+
+def change_path(change: TreeChange) -> str:
+    # New path wins: for 'modify' both paths are equal, for 'delete' only old exists
+    return (change.new.path or change.old.path).decode('utf-8')
+
+
+class ChangeSet:
+    """Tree changes between two trees, indexed by file path.
+
+    `changes` are the files for review, `excluded` are the files skipped by the diff filter.
+    """
+
+    def __init__(self, base_tree: bytes, feature_tree: bytes, changes: list[TreeChange],
+                 excluded: list[ExcludedFile] | None = None):
+        self.base_tree = base_tree
+        self.feature_tree = feature_tree
+        self.changes = changes
+        self.excluded = excluded or []
+        self._by_path: dict[str, TreeChange] = {change_path(change): change
+                                                for change in changes}
+        self._excluded_by_path = {file.path: file for file in self.excluded}
+
+    def __len__(self) -> int:
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def get(self, file_path: str) -> TreeChange | None:
+        """Get the change for a file path or None if the file is unchanged."""
+        return self._by_path.get(file_path)
+
+    def get_excluded(self, file_path: str) -> ExcludedFile | None:
+        """Get the description of a file skipped by the diff filter."""
+        return self._excluded_by_path.get(file_path)
+
+    def find_blob(self, tree_sha: bytes, file_path: str) -> tuple[int, bytes] | None:
+        """Get (mode, sha) of a changed file on the side of the change set with `tree_sha`."""
+        change = self._by_path.get(file_path)
+        if change is None:
+            return None
+        if tree_sha == self.feature_tree:
+            entry = change.new
+        elif tree_sha == self.base_tree:
+            entry = change.old
+        else:
+            return None
+        if entry.path is None or entry.path.decode('utf-8') != file_path:
+            return None
+        return entry.mode, entry.sha
+
+
+class ChangeSetCache:
+    """LRU cache of change sets keyed by the (base, feature) tree SHAs.
+
+    Tree SHAs identify the content, so cached entries stay valid when branch refs move.
+    """
+
+    def __init__(self, object_store: BaseObjectStore, max_size: int = 32,
+                 diff_filter: DiffFilter | None = None):
+        self.object_store = object_store
+        self.max_size = max_size
+        self.diff_filter = diff_filter
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[bytes, bytes], ChangeSet] = OrderedDict()
+
+    def get(self, base_tree: bytes, feature_tree: bytes) -> ChangeSet:
+        """Get the change set for two trees, walking them only on the first request."""
+        key = (base_tree, feature_tree)
+        change_set = self._entries.get(key)
+        if change_set is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return change_set
+
+        self.misses += 1
+        with trace_span('tree_changes', 'tree_walk') as span:
+            changes = list(tree_changes(self.object_store, base_tree, feature_tree))
+            change_set = ChangeSet(base_tree, feature_tree, *self._filter(changes))
+            if span is not None:
+                span.attributes.update(files=len(change_set.changes),
+                                       excluded=len(change_set.excluded))
+        self._entries[key] = change_set
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return change_set
+
+    def _filter(self, changes: list[TreeChange]) -> tuple[list[TreeChange], list[ExcludedFile]]:
+        if self.diff_filter is None:
+            return changes, []
+        included = []
+        excluded = []
+        for change in changes:
+            path = change_path(change)
+            # Path rules don't need the content. Sizes come from the object headers and only
+            # the heads of the blobs are read, the second one only if the first passes.
+            reason = self.diff_filter.check_path(path)
+            sizes = [None, None]
+            if reason is None:
+                heads = []
+                for i, entry in enumerate((change.old, change.new)):
+                    if entry.sha is not None and not S_ISGITLINK(entry.mode):
+                        sizes[i], read_head = probe_blob(self.object_store, entry.sha,
+                                                         self.diff_filter.head_bytes)
+                        heads.append((sizes[i], read_head))
+                for size, read_head in heads:
+                    reason = self.diff_filter.check_blob(size, read_head)
+                    if reason is not None:
+                        break
+            if reason is None:
+                included.append(change)
+            else:
+                excluded.append(ExcludedFile(path, change.type, reason, *sizes))
+        return included, excluded
+
+    def find_blob(self, tree_sha: bytes, file_path: str) -> tuple[int, bytes] | None:
+        """Look up a changed file of `tree_sha` in the already computed change sets."""
+        for change_set in reversed(self._entries.values()):
+            found = change_set.find_blob(tree_sha, file_path)
+            if found is not None:
+                return found
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                'max_size': self.max_size}
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Callable
+
+# Files that are rarely worth the tokens of a review
+DEFAULT_EXCLUDE = (
+    '*.lock',
+    'package-lock.json',
+    'pnpm-lock.yaml',
+    'go.sum',
+    'vendor/*',
+    '*/vendor/*',
+    'third_party/*',
+    'node_modules/*',
+    '*_pb2.py',
+    '*_pb2_grpc.py',
+    '*.pb.go',
+    '*.min.js',
+    '*.min.css',
+    '*.map',
+)
+
+# Markers of generated files, they are searched at the beginning of the file
+GENERATED_MARKERS = (
+    b'@generated',
+    b'DO NOT EDIT',
+    b'Code generated by',
+    b'Generated by the protocol buffer compiler',
+    b'This file is automatically generated',
+    b'<auto-generated',
+)
+
+
+@dataclass
+class ExcludedFile:
+    path: str
+    change_type: str
+    reason: str
+    old_size: int | None = None
+    new_size: int | None = None
+
+    def describe(self) -> str:
+        details = [self.change_type, self.reason]
+        if self.old_size is not None or self.new_size is not None:
+            details.append(" -> ".join(f"{size} bytes" if size is not None else "none"
+                                       for size in (self.old_size, self.new_size)))
+        return f"{self.path} ({', '.join(details)})"
+
+
+# Git looks for NUL bytes in this many first bytes of a file
+BINARY_SNIFF_BYTES = 8000
+
+
+def is_binary(data: bytes, sniff_bytes: int = BINARY_SNIFF_BYTES) -> bool:
+    """Detect binary content the same way git does: by a NUL byte at the beginning."""
+    return b'\0' in data[:sniff_bytes]
+
+
+class DiffFilter:
+    """Decides which changed files are sent to the model.
+
+    Files are excluded by glob rules (a pattern without '/' is matched against the file name,
+    otherwise against the full path), by size, by binary content and by generated markers.
+    """
+
+    def __init__(self, exclude: tuple[str, ...] | list[str] = DEFAULT_EXCLUDE,
+                 max_size: int | None = 256 * 1024, detect_binary: bool = True,
+                 generated_markers: tuple[bytes, ...] | list[bytes] = GENERATED_MARKERS,
+                 marker_search_bytes: int = 1024):
+        self.exclude = tuple(exclude)
+        self.max_size = max_size
+        self.detect_binary = detect_binary
+        self.generated_markers = tuple(generated_markers)
+        self.marker_search_bytes = marker_search_bytes
+
+    @classmethod
+    def keep_all(cls) -> 'DiffFilter':
+        """Filter that doesn't exclude any file."""
+        return cls(exclude=(), max_size=None, detect_binary=False, generated_markers=())
+
+    def match_path(self, path: str) -> str | None:
+        name = path.rsplit('/', 1)[-1]
+        for pattern in self.exclude:
+            if fnmatchcase(path if '/' in pattern else name, pattern):
+                return pattern
+        return None
+
+    @property
+    def head_bytes(self) -> int:
+        """Number of the first bytes of a blob the content rules look at."""
+        return max(BINARY_SNIFF_BYTES if self.detect_binary else 0,
+                   self.marker_search_bytes if self.generated_markers else 0)
+
+    def check_path(self, path: str) -> str | None:
+        """Get the reason to exclude a file by its path or None to keep it."""
+        pattern = self.match_path(path)
+        return f"matches '{pattern}'" if pattern else None
+
+    def check_blob(self, size: int, read_head: Callable[[], bytes]) -> str | None:
+        """Get the reason to exclude a blob of the given size or None to keep it.
+
+        `read_head` returns the first `head_bytes` bytes, it is called only if the size
+        doesn't exclude the blob.
+        """
+        if self.max_size is not None and size > self.max_size:
+            return f"larger than {self.max_size} bytes"
+        if not self.head_bytes:
+            return None
+        head = read_head()
+        if self.detect_binary and is_binary(head):
+            return "binary"
+        head = head[:self.marker_search_bytes]
+        if any(marker in head for marker in self.generated_markers):
+            return "generated"
+        return None
+
+    def check(self, path: str, contents: list[bytes]) -> str | None:
+        """Get the reason to exclude a file with the given blob contents or None to keep it."""
+        reason = self.check_path(path)
+        for data in contents:
+            if reason is not None:
+                break
+            reason = self.check_blob(len(data), lambda: data[:self.head_bytes])
+        return reason
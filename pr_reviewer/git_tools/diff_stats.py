@@ -0,0 +1,153 @@
+import difflib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Callable
+
+from pr_reviewer.git_tools.diff_filter import is_binary
+from pr_reviewer.tracing import trace_span
+
+LANGUAGES = {
+    '.py': 'Python', '.pyi': 'Python', '.ipynb': 'Jupyter',
+    '.js': 'JavaScript', '.jsx': 'JavaScript', '.mjs': 'JavaScript', '.cjs': 'JavaScript',
+    '.ts': 'TypeScript', '.tsx': 'TypeScript',
+    '.java': 'Java', '.kt': 'Kotlin', '.kts': 'Kotlin', '.scala': 'Scala',
+    '.go': 'Go', '.rs': 'Rust', '.rb': 'Ruby', '.php': 'PHP', '.swift': 'Swift',
+    '.c': 'C', '.h': 'C', '.cc': 'C++', '.cpp': 'C++', '.cxx': 'C++', '.hpp': 'C++',
+    '.cs': 'C#', '.m': 'Objective-C',
+    '.sh': 'Shell', '.bash': 'Shell', '.ps1': 'PowerShell', '.sql': 'SQL',
+    '.html': 'HTML', '.css': 'CSS', '.scss': 'CSS',
+    '.md': 'Markdown', '.rst': 'reStructuredText', '.txt': 'Text',
+    '.json': 'JSON', '.yaml': 'YAML', '.yml': 'YAML', '.toml': 'TOML', '.xml': 'XML',
+    '.ini': 'INI', '.cfg': 'INI',
+}
+LANGUAGE_BY_NAME = {'Dockerfile': 'Dockerfile', 'Makefile': 'Makefile'}
+
+
+def language_of(path: str) -> str:
+    """Guess the language of a file by its name, 'Other' for unknown extensions."""
+    name = PurePosixPath(path)
+    return LANGUAGE_BY_NAME.get(name.name) or LANGUAGES.get(name.suffix.lower(), 'Other')
+
+
+def count_changed_lines(old: list[bytes], new: list[bytes],
+                        exact_limit: int = 20000) -> tuple[int, int]:
+    """Count (added, removed) lines between two versions of a file.
+
+    The common head and tail are skipped, the rest is matched by difflib. When the changed
+    middle is longer than `exact_limit` lines, the lines are matched as multisets instead,
+    which ignores moves but stays linear.
+    """
+    head = 0
+    limit = min(len(old), len(new))
+    while head < limit and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old[-tail - 1] == new[-tail - 1]:
+        tail += 1
+    old = old[head:len(old) - tail]
+    new = new[head:len(new) - tail]
+    if not old or not new:
+        return len(new), len(old)
+
+    if len(old) + len(new) > exact_limit:
+        common = sum((Counter(old) & Counter(new)).values())
+        return len(new) - common, len(old) - common
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    added = removed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            removed += i2 - i1
+            added += j2 - j1
+    return added, removed
+
+
+@dataclass
+class FileStats:
+    path: str
+    change_type: str
+    added: int
+    removed: int
+    language: str
+    binary: bool = False
+
+
+@dataclass
+class DiffStats:
+    """Line-change counts of the files changed between two branches, without patch text."""
+    base_branch: str
+    feature_branch: str
+    files: list[FileStats] = field(default_factory=list)
+    # Changed files skipped by the diff filter, they don't cost model tokens
+    excluded: int = 0
+
+    @property
+    def added(self) -> int:
+        return sum(file.added for file in self.files)
+
+    @property
+    def removed(self) -> int:
+        return sum(file.removed for file in self.files)
+
+    def languages(self) -> dict[str, int]:
+        """Changed lines per language, the largest first."""
+        lines: Counter[str] = Counter()
+        for file in self.files:
+            lines[file.language] += file.added + file.removed
+        return dict(lines.most_common())
+
+    def to_dict(self) -> dict:
+        return {'base_branch': self.base_branch, 'feature_branch': self.feature_branch,
+                'files_changed': len(self.files), 'excluded': self.excluded,
+                'added': self.added, 'removed': self.removed,
+                'languages': self.languages(),
+                'files': [{'path': file.path, 'type': file.change_type, 'added': file.added,
+                           'removed': file.removed, 'language': file.language,
+                           'binary': file.binary} for file in self.files]}
+
+
+class LineStatsIndex:
+    """LRU cache of (added, removed) counts keyed by the (old, new) blob SHAs.
+
+    Branch pairs of one repository share most of their changed blobs, so every pair of blobs
+    is counted once per batch. Binary blobs are cached as None.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.counts = 0
+        self._entries: OrderedDict[tuple[bytes | None, bytes | None],
+                                   tuple[int, int] | None] = OrderedDict()
+
+    def get(self, old_sha: bytes | None, new_sha: bytes | None,
+            read_blob: Callable[[bytes], bytes]) -> tuple[int, int] | None:
+        """Get (added, removed) lines between two blobs, None if one of them is binary."""
+        key = (old_sha, new_sha)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        with trace_span('line_stats', 'diff'):
+            contents = [read_blob(sha) if sha is not None else b'' for sha in key]
+            if any(is_binary(data) for data in contents):
+                entry = None
+            else:
+                old, new = (data.splitlines() for data in contents)
+                entry = count_changed_lines(old, new)
+        self.counts += 1
+        self._entries[key] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+
+def assign_shards(costs: list[int], shards: int) -> list[int]:
+    """Assign items to shards balancing the total cost: the costliest item goes first to the
+    least loaded shard. Returns the shard number of every item."""
+    loads = [0] * shards
+    assigned = [0] * len(costs)
+    for i in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+        shard = min(range(shards), key=lambda shard: loads[shard])
+        assigned[i] = shard
+        loads[shard] += costs[i]
+    return assigned
@@ -1,101 +1,387 @@
+import contextvars
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
-from typing import cast, Annotated
+from typing import cast, Annotated, Callable, Iterator, TypeVar, TYPE_CHECKING
 
 from dulwich import patch
-from dulwich import porcelain
-from dulwich.diff_tree import tree_changes
-from langchain.tools import tool
-from langchain_core.tools import BaseTool
+from dulwich.objects import S_ISGITLINK
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.change_set import ChangeSet, ChangeSetCache, change_path
+from pr_reviewer.git_tools.diff_filter import DiffFilter, ExcludedFile
+from pr_reviewer.git_tools.diff_stats import DiffStats, FileStats, LineStatsIndex, language_of
+from pr_reviewer.git_tools.merge_base import AncestryIndex
+from pr_reviewer.git_tools.path_index import PathIndex, is_directory
+from pr_reviewer.git_tools.symbol_index import Symbol, SymbolIndex
+from pr_reviewer.tracing import traced
+
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+
+T = TypeVar('T')
 
 
 class GitTools:
-    def __init__(self, repo_path: str):
+    def __init__(self, repo_path: str, change_cache_size: int = 32,
+                 blob_cache: BlobCache | None = None, executor: Executor | None = None,
+                 diff_filter: DiffFilter | None = None, use_merge_base: bool = True,
+                 ref_prefix: str = 'refs/heads/'):
         self.repo_path = Path(repo_path)
-        self.repo = porcelain.open_repo(str(self.repo_path))
+        # `porcelain.open_repo` is the same, but porcelain pulls in the network clients
+        self.repo = Repo(str(self.repo_path))
+        # Branches are the refs under the prefix, e.g. the namespace of a job in a shared store
+        self.ref_prefix = ref_prefix
+        # Like a PR view, diffs are computed from the merge-base of the branches to the feature
+        # branch, so changes made in the base branch after the fork are not shown.
+        self.use_merge_base = use_merge_base
+        self.ancestry = AncestryIndex(self.repo.object_store)
+        # Lockfiles, vendored, generated and binary files are skipped by default,
+        # pass `DiffFilter.keep_all()` to review every file
+        self.diff_filter = diff_filter if diff_filter is not None else DiffFilter()
+        self.change_cache = ChangeSetCache(self.repo.object_store, max_size=change_cache_size,
+                                           diff_filter=self.diff_filter)
+        # Paths of files and directories per tree, shared by all tools reading the trees
+        self.path_index = PathIndex(self.repo.object_store)
+        # Functions and classes of Python files per blob SHA
+        self.symbol_index = SymbolIndex()
+        # Added and removed line counts per pair of blob SHAs
+        self.line_stats = LineStatsIndex()
+        self.blob_cache = blob_cache
+        # Executor for the async API. The own one has a single thread: dulwich repo and pack
+        # objects are not thread-safe, so access to one repository is serialized.
+        self._executor = executor
+        self._own_executor = executor is None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='git-tools')
+        return self._executor
+
+    async def run_blocking(self, func: Callable[..., T], *args) -> T:
+        """Run a function accessing the repository in the executor of the async API."""
+        import asyncio  # Only the async API needs the event loop machinery
+        loop = asyncio.get_running_loop()
+        # Context variables (e.g. the active tracer) are not passed to executors by default
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_executor(),
+                                          functools.partial(context.run, func, *args))
+
+    def close(self):
+        """Release the thread pool of the async API and the repository files."""
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.repo.close()
+
+    def _get_branch_commit(self, branch_name: str) -> bytes:
+        return self.repo.refs[f'{self.ref_prefix}{branch_name}'.encode()]
 
-    def _get_branch_tree(self, branch_name: str) -> object:
-        return self.repo[self.repo.refs[f'refs/heads/{branch_name}'.encode()]].tree
+    def _get_branch_tree(self, branch_name: str) -> bytes:
+        return self.repo[self._get_branch_commit(branch_name)].tree
 
+    def _get_base_tree(self, base_branch: str, feature_branch: str) -> bytes:
+        base_commit = self._get_branch_commit(base_branch)
+        if self.use_merge_base:
+            # Without common history (e.g. shallow clones) the tip of the base branch is used
+            merge_base = self.ancestry.merge_base(base_commit,
+                                                  self._get_branch_commit(feature_branch))
+            if merge_base is not None:
+                base_commit = merge_base
+        return self.repo[base_commit].tree
+
+    @traced('tool')
     def list_branches(self) -> list[str]:
         """List all branches in the local repository."""
-        branches = []
-        for ref in self.repo.refs.keys():
-            if ref.startswith(b'refs/heads/'):
-                branches.append(ref.decode().split('/')[-1])
-        return sorted(branches)
+        return sorted(ref.decode() for ref in self.repo.refs.keys(self.ref_prefix.encode()))
 
-    def _get_tree_changes(self, base_branch: str, feature_branch: str) -> list:
-        base_tree = self._get_branch_tree(base_branch)
+    def _get_change_set(self, base_branch: str, feature_branch: str) -> ChangeSet:
+        base_tree = self._get_base_tree(base_branch, feature_branch)
         feature_tree = self._get_branch_tree(feature_branch)
-        return list(tree_changes(self.repo, base_tree, feature_tree))
+        return self.change_cache.get(base_tree, feature_tree)
+
+    def _get_tree_changes(self, base_branch: str, feature_branch: str) -> list:
+        return self._get_change_set(base_branch, feature_branch).changes
+
+    def get_tree_sha(self, branch: str) -> str:
+        """Get the SHA of the root tree of a branch."""
+        return self._get_branch_tree(branch).decode('ascii')
+
+    def get_base_tree_sha(self, base_branch: str, feature_branch: str) -> str:
+        """Get the SHA of the tree the feature branch is compared with."""
+        return self._get_base_tree(base_branch, feature_branch).decode('ascii')
+
+    def merge_base(self, base_branch: str, feature_branch: str) -> str | None:
+        """Get the SHA of the best common ancestor of two branches."""
+        merge_base = self.ancestry.merge_base(self._get_branch_commit(base_branch),
+                                              self._get_branch_commit(feature_branch))
+        return merge_base.decode('ascii') if merge_base else None
 
+    def changed_paths_between_trees(self, old_tree: str, new_tree: str) -> set[str]:
+        """Get the paths of all files that differ between two trees, including excluded ones.
+
+        Raises KeyError if one of the trees is not in the repository.
+        """
+        change_set = self.change_cache.get(old_tree.encode('ascii'), new_tree.encode('ascii'))
+        return ({change_path(change) for change in change_set.changes}
+                | {file.path for file in change_set.excluded})
+
+    @traced('tool')
     def diff_between_branches(self, base_branch: str, feature_branch: str) -> str:
         """Get the diff between two branches."""
-        changes = self._get_tree_changes(base_branch, feature_branch)
+        change_set = self._get_change_set(base_branch, feature_branch)
 
         result = []
-        for change in changes:
+        for change in change_set.changes:
             old_path = change.old.path.decode('utf-8') if change.old.path else None
             new_path = change.new.path.decode('utf-8') if change.new.path else None
             result.append(f"Type: {change.type}, Old: {old_path}, New: {new_path}")
+        if change_set.excluded:
+            result.append("Excluded from the review:")
+            result.extend(f"- {file.describe()}" for file in change_set.excluded)
 
         return "\n".join(result) if result \
             else f"Branches `{base_branch}` and `{feature_branch}` have the same content"
 
+    def changed_files(self, base_branch: str, feature_branch: str) -> list[tuple[str, str]]:
+        """List (path, change type) of the files changed between two branches."""
+        return [((change.new.path or change.old.path).decode('utf-8'), change.type)
+                for change in self._get_tree_changes(base_branch, feature_branch)]
+
+    def excluded_files(self, base_branch: str, feature_branch: str) -> list[ExcludedFile]:
+        """List the changed files skipped by the diff filter."""
+        return self._get_change_set(base_branch, feature_branch).excluded
+
+    def iter_file_diffs(self, base_branch: str,
+                        feature_branch: str) -> Iterator[tuple[str, str, str]]:
+        """Yield (path, change type, diff) for every file changed between two branches."""
+        for file_path, change_type in self.changed_files(base_branch, feature_branch):
+            yield file_path, change_type, self.diff_file_content(base_branch, feature_branch,
+                                                                 file_path)
+
+    @traced('diff')
+    def diff_stats(self, base_branch: str, feature_branch: str) -> DiffStats:
+        """Count the added and removed lines of every file changed between two branches.
+
+        Blobs are compared line by line without rendering patches, so the counts are a cheap
+        estimate of the review cost for triage. Pairs of branches of one toolbox share the
+        change sets, merge-bases and the counts of common blobs.
+        """
+        change_set = self._get_change_set(base_branch, feature_branch)
+        stats = DiffStats(base_branch, feature_branch, excluded=len(change_set.excluded))
+        for change in change_set.changes:
+            old_sha, new_sha = (entry.sha if entry.sha and not S_ISGITLINK(entry.mode) else None
+                                for entry in (change.old, change.new))
+            counts = self.line_stats.get(old_sha, new_sha, self._read_blob)
+            path = change_path(change)
+            stats.files.append(FileStats(path, change.type, *(counts or (0, 0)),
+                                         language=language_of(path), binary=counts is None))
+        return stats
+
+    @traced('tool')
     def diff_file_content(self, base_branch: str, feature_branch: str, file_path: str) -> str:
         """Get the diff of a file's content between two branches."""
-        changes = self._get_tree_changes(base_branch, feature_branch)
-
-        for change in changes:
-            if change.new.path and (change.new.path.decode('utf-8') != file_path):
-                continue
-            if change.type == 'modify':
-                old_file = (change.old.path, change.old.mode, change.old.sha)
-                new_file = (change.new.path, change.new.mode, change.new.sha)
-
-                diff_output = BytesIO()
-                patch.write_object_diff(diff_output, self.repo.object_store, old_file, new_file)
-                return diff_output.getvalue().decode('utf-8')
-            if change.type == 'add':
-                content = self.get_file_content(feature_branch, file_path)
-                content = [f"+{line}" for line in content.splitlines()]
-                return "\n".join(content)
-            if change.type == 'delete':
-                content = self.get_file_content(base_branch, file_path)
-                content = [f"-{line}" for line in content.splitlines()]
-                return "\n".join(content)
-
-        return f"No changes found for file {file_path}"
+        change_set = self._get_change_set(base_branch, feature_branch)
+        change = change_set.get(file_path)
+
+        if change is None:
+            excluded = change_set.get_excluded(file_path)
+            if excluded is not None:
+                return f"File is excluded from the review: {excluded.describe()}"
+            return f"No changes found for file {file_path}"
+        # Blobs are taken from the change, the base side may differ from the base branch tip
+        if change.type == 'add':
+            content = self._read_entry_text(change.new.mode, change.new.sha)
+            content = [f"+{line}" for line in content.splitlines()]
+            return "\n".join(content)
+        if change.type == 'delete':
+            content = self._read_entry_text(change.old.mode, change.old.sha)
+            content = [f"-{line}" for line in content.splitlines()]
+            return "\n".join(content)
+
+        return self._render_diff(change)
+
+    @traced('diff', 'write_object_diff')
+    def _render_diff(self, change) -> str:
+        # The patch header contains the paths and the modes, so they are part of the options
+        options = (f"{change.old.path.decode('utf-8')}|{change.new.path.decode('utf-8')}|"
+                   f"{change.old.mode:o}|{change.new.mode:o}")
+        key = BlobCache.make_key('diff', change.old.sha, change.new.sha, options)
+        if self.blob_cache is not None:
+            cached = self.blob_cache.get(key)
+            if cached is not None:
+                return cached
+
+        old_file = (change.old.path, change.old.mode, change.old.sha)
+        new_file = (change.new.path, change.new.mode, change.new.sha)
+
+        diff_output = BytesIO()
+        patch.write_object_diff(diff_output, self.repo.object_store, old_file, new_file)
+        diff = diff_output.getvalue().decode('utf-8', errors='replace')
+        if self.blob_cache is not None:
+            self.blob_cache.put(key, diff)
+        return diff
+
+    def _read_entry_text(self, mode: int, sha: bytes) -> str:
+        # A submodule is shown by its commit, the same way as in `write_object_diff`
+        if S_ISGITLINK(mode):
+            return f"Subproject commit {sha.decode('ascii')}\n"
+        return self._read_blob_text(sha)
+
+    def _read_blob(self, blob_sha: bytes) -> bytes:
+        return self.repo[blob_sha].data
 
+    @traced('blob_read', 'read_blob')
+    def _read_blob_text(self, blob_sha: bytes) -> str:
+        key = BlobCache.make_key('text', None, blob_sha)
+        if self.blob_cache is not None:
+            cached = self.blob_cache.get(key)
+            if cached is not None:
+                return cached
+
+        text = self.repo[blob_sha].data.decode('utf-8', errors='replace')
+        if self.blob_cache is not None:
+            self.blob_cache.put(key, text)
+        return text
+
+    @traced('tool')
     def get_file_content(self, branch: str, file_path: str) -> str:
         """Get the full content of a file in a specific branch, including files in
         subdirectories."""
         tree = self._get_branch_tree(branch)
 
-        # Split the file path into parts and filename
-        *path_parts, fn = file_path.split('/')
-
-        # Traverse the tree structure
-        current_tree = tree
-        for part in path_parts:
+        # Files from already computed change sets don't need the tree traversal
+        found = self.change_cache.find_blob(tree, file_path)
+        if found is not None:
+            mode, file_sha = found
+        else:
             try:
-                mode, sha = self.repo[current_tree][part.encode()]
-                if mode & 0o040000:  # Directory
-                    current_tree = sha  # Just store the SHA, not the Tree object
-                else:
-                    return f"Path {'/'.join(path_parts)} is not a directory in branch {branch}"
-            except KeyError:
-                return f"Directory {part} not found in path {file_path} in branch {branch}"
-
-        # Get the file content
+                mode, file_sha = self.path_index.lookup(tree, file_path)
+            except NotADirectoryError as e:
+                return f"Path {e} is not a directory in branch {branch}"
+            except KeyError as e:
+                missing = e.args[0]
+                if missing == file_path.strip('/'):
+                    return f"File {file_path} not found in branch {branch}"
+                return (f"Directory {missing.split('/')[-1]} not found in path {file_path} "
+                        f"in branch {branch}")
+        if is_directory(mode):
+            return f"Path {file_path} is a directory in branch {branch}"
+        if S_ISGITLINK(mode):
+            # The commit of a submodule is not in this repository
+            return (f"Path {file_path} is a submodule at {file_sha.decode('ascii')} "
+                    f"in branch {branch}")
+        return self._read_blob_text(file_sha)
+
+    @traced('tool')
+    def list_directory(self, branch: str, dir_path: str = '') -> str:
+        """List the files and subdirectories of a directory in a specific branch."""
         try:
-            mode, file_sha = self.repo[current_tree][fn.encode()]
-            return self.repo[file_sha].data.decode('utf-8')
+            entries = self.path_index.list_directory(self._get_branch_tree(branch), dir_path)
+        except NotADirectoryError as e:
+            return f"Path {e} is not a directory in branch {branch}"
         except KeyError:
-            return f"File {file_path} not found in branch {branch}"
+            return f"Directory {dir_path} not found in branch {branch}"
+
+        lines = []
+        for name, mode, sha in entries:
+            if is_directory(mode):
+                lines.append(f"{name}/")
+            elif S_ISGITLINK(mode):
+                lines.append(f"{name} (submodule at {sha.decode('ascii')})")
+            else:
+                lines.append(name)
+        return "\n".join(lines) if lines else f"Directory {dir_path} is empty in branch {branch}"
+
+    def _format_symbol(self, lines: list[str], symbol: Symbol, note: str) -> str:
+        body = "\n".join(lines[symbol.start - 1:symbol.end])
+        return (f"# Lines {symbol.start}-{symbol.end}: {symbol.kind} `{symbol.name}` "
+                f"({note})\n{body}")
+
+    @traced('tool')
+    def get_changed_symbols(self, base_branch: str, feature_branch: str, file_path: str,
+                            max_callers: int = 5) -> str:
+        """Get the functions and classes of a Python file enclosing its changes between two
+        branches and the functions calling them in the same file, from the feature branch."""
+        change = self._get_change_set(base_branch, feature_branch).get(file_path)
+        if change is None:
+            return self.diff_file_content(base_branch, feature_branch, file_path)
+        if change.type == 'delete':
+            return f"File {file_path} is deleted in branch {feature_branch}"
+        if not file_path.endswith(('.py', '.pyi')):
+            return (f"Symbols are only extracted from Python files, use get_file_content "
+                    f"for {file_path}")
+        new_text = self._read_blob_text(change.new.sha)
+        try:
+            symbols = self.symbol_index.get(change.new.sha, self._read_blob_text)
+        except SyntaxError as e:
+            return (f"File {file_path} can't be parsed in branch {feature_branch} "
+                    f"(line {e.lineno}: {e.msg}), use get_file_content")
+
+        old_sha = change.old.sha if change.type != 'add' else None
+        lines = new_text.splitlines()
+        changed: list[Symbol] = []
+        module_level: list[tuple[int, int]] = []
+        for first, last in self.symbol_index.changed_ranges(old_sha, change.new.sha,
+                                                            self._read_blob_text):
+            found = {symbols.enclosing(line) for line in range(first, last + 1)}
+            if None in found:
+                module_level.append((first, last))
+            changed.extend(symbol for symbol in found
+                           if symbol is not None and symbol not in changed)
+        # Nested changed symbols are shown as part of the enclosing ones
+        changed = [symbol for symbol in changed
+                   if not any(other is not symbol and other.encloses(symbol)
+                              for other in changed)]
+        changed.sort(key=lambda symbol: symbol.start)
+
+        result = []
+        for first, last in module_level:
+            result.append(f"# Lines {first}-{last}: module level (changed)\n"
+                          + "\n".join(lines[first - 1:last]))
+        shown = list(changed)
+        for symbol in changed:
+            result.append(self._format_symbol(lines, symbol, 'changed'))
+        for symbol in changed:
+            callers = [caller for caller in symbols.callers(symbol)
+                       if not any(other.encloses(caller) for other in shown)]
+            for caller in callers[:max_callers]:
+                result.append(self._format_symbol(lines, caller,
+                                                  f"calls `{symbol.short_name}`"))
+                shown.append(caller)
+        if not result:
+            return f"No changed lines found in {file_path}"
+        return f"Changed symbols of {file_path} in branch {feature_branch}:\n\n" \
+            + "\n\n".join(result)
+
+    async def alist_branches(self) -> list[str]:
+        return await self.run_blocking(self.list_branches)
+
+    async def adiff_between_branches(self, base_branch: str, feature_branch: str) -> str:
+        return await self.run_blocking(self.diff_between_branches, base_branch, feature_branch)
+
+    async def adiff_file_content(self, base_branch: str, feature_branch: str,
+                                 file_path: str) -> str:
+        return await self.run_blocking(self.diff_file_content, base_branch, feature_branch,
+                                        file_path)
+
+    async def aget_file_content(self, branch: str, file_path: str) -> str:
+        return await self.run_blocking(self.get_file_content, branch, file_path)
+
+    async def alist_directory(self, branch: str, dir_path: str = '') -> str:
+        return await self.run_blocking(self.list_directory, branch, dir_path)
+
+    async def aget_changed_symbols(self, base_branch: str, feature_branch: str,
+                                   file_path: str) -> str:
+        return await self.run_blocking(self.get_changed_symbols, base_branch, feature_branch,
+                                        file_path)
+
+    def get_tools(self) -> list['BaseTool']:
+        # LangChain is imported only here, so the git layer can be used without it
+        from langchain_core.tools import BaseTool, tool
 
-    def get_tools(self) -> list[BaseTool]:
         @tool
         def list_branches() -> list[str]:
             """List all branches in the local repository."""
@@ -126,8 +412,36 @@ class GitTools:
             """Get the full content of a file in a specific branch."""
             return self.get_file_content(branch, file_path)
 
+        @tool
+        def list_directory(
+                branch: Annotated[str, "The branch to list the directory in"],
+                dir_path: Annotated[str, "The path to the directory, empty for the root"] = '',
+        ) -> str:
+            """List the files and subdirectories of a directory in a specific branch.
+            Subdirectories end with '/'."""
+            return self.list_directory(branch, dir_path)
+
+        @tool
+        def get_changed_symbols(
+                base_branch: Annotated[str, "The branch with the original code"],
+                feature_branch: Annotated[str, "The branch with the modified code"],
+                file_path: Annotated[str, "The path to the Python file in the repository"],
+        ) -> str:
+            """Get the full source of the functions and classes changed in a Python file and
+            of the functions calling them in the same file. Much shorter than the whole file."""
+            return self.get_changed_symbols(base_branch, feature_branch, file_path)
+
+        # Async variants are used by `ainvoke`, they run the git work in the executor
+        list_branches.coroutine = self.alist_branches
+        diff_between_branches.coroutine = self.adiff_between_branches
+        diff_file_content.coroutine = self.adiff_file_content
+        get_file_content.coroutine = self.aget_file_content
+        list_directory.coroutine = self.alist_directory
+        get_changed_symbols.coroutine = self.aget_changed_symbols
+
         return cast(list[BaseTool],
-                    [list_branches, diff_between_branches, diff_file_content, get_file_content])
+                    [list_branches, diff_between_branches, diff_file_content, get_file_content,
+                     list_directory, get_changed_symbols])
 
 # Usage example:
 # git_tools = GitTools('/path/to/local/repo')
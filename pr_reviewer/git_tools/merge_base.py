@@ -0,0 +1,103 @@
+import heapq
+
+from dulwich.object_store import BaseObjectStore
+
+_FROM_FIRST = 1
+_FROM_SECOND = 2
+_STALE = 4
+
+# Commits dated up to a day before their descendants are still walked, clocks of
+# committers can be skewed
+CLOCK_SKEW = 24 * 3600
+
+
+class AncestryIndex:
+    """Cached commit graph for fast merge-base queries.
+
+    Like `git merge-base` without a commit-graph file, the commits are walked from both tips
+    in the order of decreasing commit dates. The walk stops as soon as all commits in the
+    queue are ancestors of a found common ancestor, so it ends near the fork point however
+    deep the history is. Parents and dates are read once per commit, merge-bases once per
+    pair of commits. Parents missing from the object store (shallow clones) are treated as
+    absent, such commits are roots of the graph.
+    """
+
+    def __init__(self, object_store: BaseObjectStore):
+        self.object_store = object_store
+        self._commits: dict[bytes, tuple[int, tuple[bytes, ...]]] = {}
+        self._merge_bases: dict[tuple[bytes, bytes], list[bytes]] = {}
+
+    def _commit(self, commit_sha: bytes) -> tuple[int, tuple[bytes, ...]]:
+        entry = self._commits.get(commit_sha)
+        if entry is None:
+            commit = self.object_store[commit_sha]
+            entry = (commit.commit_time,
+                     tuple(p for p in commit.parents if p in self.object_store))
+            self._commits[commit_sha] = entry
+        return entry
+
+    def parents(self, commit_sha: bytes) -> tuple[bytes, ...]:
+        return self._commit(commit_sha)[1]
+
+    def commit_time(self, commit_sha: bytes) -> int:
+        return self._commit(commit_sha)[0]
+
+    def visited(self) -> int:
+        """Number of commits read so far."""
+        return len(self._commits)
+
+    def merge_bases(self, first: bytes, second: bytes) -> list[bytes]:
+        """Get the best common ancestors of two commits, the best one is the first."""
+        key = (first, second)
+        bases = self._merge_bases.get(key)
+        if bases is None:
+            bases = self._merge_bases[key] = self._find_merge_bases(first, second)
+        return list(bases)
+
+    def _find_merge_bases(self, first: bytes, second: bytes) -> list[bytes]:
+        if first == second:
+            return [first]
+
+        flags = {first: _FROM_FIRST, second: _FROM_SECOND}
+        queue = [(-self.commit_time(first), first), (-self.commit_time(second), second)]
+        heapq.heapify(queue)
+        result = []
+        while any(not flags[sha] & _STALE for _, sha in queue):
+            _, sha = heapq.heappop(queue)
+            commit_flags = flags[sha]
+            if commit_flags & (_FROM_FIRST | _FROM_SECOND) == _FROM_FIRST | _FROM_SECOND:
+                if not commit_flags & _STALE:
+                    result.append(sha)
+                # Ancestors of a common ancestor can't be the best common ancestors
+                commit_flags |= _STALE
+                flags[sha] = commit_flags
+            for parent in self.parents(sha):
+                parent_flags = flags.get(parent, 0)
+                if parent_flags & commit_flags == commit_flags:
+                    continue
+                flags[parent] = parent_flags | commit_flags
+                heapq.heappush(queue, (-self.commit_time(parent), parent))
+
+        # Criss-cross merges can leave candidates that are ancestors of other candidates
+        return [sha for sha in result
+                if not any(other != sha and self.is_ancestor(sha, other) for other in result)]
+
+    def merge_base(self, first: bytes, second: bytes) -> bytes | None:
+        """Get the best common ancestor of two commits or None if they have no common history."""
+        bases = self.merge_bases(first, second)
+        return bases[0] if bases else None
+
+    def is_ancestor(self, ancestor: bytes, descendant: bytes) -> bool:
+        # Commits much older than the ancestor can't be its descendants
+        cutoff = self.commit_time(ancestor) - CLOCK_SKEW
+        seen = {descendant}
+        stack = [descendant]
+        while stack:
+            sha = stack.pop()
+            if sha == ancestor:
+                return True
+            for parent in self.parents(sha):
+                if parent not in seen and self.commit_time(parent) >= cutoff:
+                    seen.add(parent)
+                    stack.append(parent)
+        return False
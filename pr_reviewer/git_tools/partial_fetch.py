@@ -0,0 +1,116 @@
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlparse
+
+from dulwich.client import GitClient, SubprocessGitClient, get_transport_and_path
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.merge_base import AncestryIndex
+
+DEFAULT_BASE_BRANCHES = ('main', 'master')
+DEFAULT_REF_PREFIXES = ('refs/heads/', 'refs/remotes/origin/')
+
+
+@dataclass
+class FetchStats:
+    branches: dict[str, str] = field(default_factory=dict)
+    rounds: int = 0
+    depth: int = 0
+    packs: int = 0
+    merge_bases: dict[str, str | None] = field(default_factory=dict)
+    shallow: bool = False
+
+
+def get_fetch_client(repo_url: str) -> tuple[GitClient, str]:
+    """Get the client for a repository URL.
+
+    The local client of dulwich copies objects directly and doesn't support shallow fetches,
+    so local repositories (paths and file:// URLs) are served by `git upload-pack` like
+    remote ones.
+    """
+    client, path = get_transport_and_path(repo_url)
+    if urlparse(repo_url).scheme in ('', 'file') or Path(repo_url).exists():
+        client = SubprocessGitClient()
+    return client, path
+
+
+def _print_progress(data: bytes):
+    sys.stderr.write(data.decode('utf-8', errors='replace'))
+    sys.stderr.flush()
+
+
+def _count_packs(repo: Repo) -> int:
+    return len(list(Path(repo.object_store.path, 'pack').glob('*.pack')))
+
+
+def _find_merge_bases(repo: Repo, base: str | None,
+                      tips: dict[str, bytes]) -> dict[str, str | None]:
+    # A new index on every round, the cached parents of the previous rounds are incomplete
+    ancestry = AncestryIndex(repo.object_store)
+    merge_bases = {}
+    for branch, sha in tips.items():
+        if base is None or branch == base:
+            continue
+        merge_base = ancestry.merge_base(tips[base], sha)
+        merge_bases[branch] = merge_base.decode('ascii') if merge_base else None
+    return merge_bases
+
+
+def partial_fetch(repo: Repo, repo_url: str, branches: list[str] | None = None,
+                  base_branch: str | None = None, depth: int = 16,
+                  max_depth: int | None = None,
+                  ref_prefixes: tuple[str, ...] = DEFAULT_REF_PREFIXES,
+                  progress: Callable[[bytes], None] | None = _print_progress) -> FetchStats:
+    """Fetch only the given branches (all if empty) with the history down to their merge-bases.
+
+    The branches are fetched shallow with `depth` commits first. While some branch has no
+    common history with `base_branch` (by default 'main' or 'master' if requested) in the
+    local repository, the history is deepened four times per round, until the merge-bases
+    are found, the full history is fetched or `max_depth` is reached. Every round fetches
+    one pack with only the objects missing locally, so an incremental sync of an up-to-date
+    repository transfers nothing and a new commit costs one small pack. Branches are stored
+    under every prefix of `ref_prefixes`, by default as `refs/heads/<branch>` and
+    `refs/remotes/origin/<branch>`.
+    """
+    client, path = get_fetch_client(repo_url)
+    remote_refs = client.get_refs(path)
+    remote_heads = {ref.decode('utf-8').removeprefix('refs/heads/'): sha
+                    for ref, sha in remote_refs.items() if ref.startswith(b'refs/heads/')}
+    missing = [branch for branch in branches or [] if branch not in remote_heads]
+    if missing:
+        raise ValueError(f"Branches {', '.join(missing)} don't exist in {repo_url}")
+    tips = {branch: remote_heads[branch] for branch in branches or remote_heads}
+    if base_branch is None:
+        base_branch = next((branch for branch in DEFAULT_BASE_BRANCHES if branch in tips), None)
+    elif base_branch not in tips:
+        raise ValueError(f"Base branch {base_branch} is not among the fetched branches")
+
+    stats = FetchStats(branches={branch: sha.decode('ascii') for branch, sha in tips.items()})
+    packs_before = _count_packs(repo)
+    wants = [sha for sha in tips.values() if sha not in repo.object_store]
+    while True:
+        if wants:
+            stats.rounds += 1
+            stats.depth = depth
+            if progress:
+                progress(f"Fetching {len(wants)} commits with depth {depth}\n".encode())
+            client.fetch(path, repo, determine_wants=lambda refs, depth=None: wants,
+                         progress=progress, depth=depth)
+
+        stats.merge_bases = _find_merge_bases(repo, base_branch, tips)
+        stats.shallow = bool(repo.get_shallow())
+        if all(stats.merge_bases.values()) or not stats.shallow:
+            break
+        if max_depth is not None and depth >= max_depth:
+            break
+        depth = depth * 4 if max_depth is None else min(depth * 4, max_depth)
+        # Deepening asks for the tips again, the server sends only the older history
+        wants = list(tips.values())
+
+    for branch, sha in tips.items():
+        for prefix in ref_prefixes:
+            repo.refs[f'{prefix}{branch}'.encode()] = sha
+    stats.packs = _count_packs(repo) - packs_before
+    return stats
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+from dulwich.object_store import BaseObjectStore
+
+from pr_reviewer.tracing import trace_span
+
+Entry = tuple[int, bytes]
+
+
+def is_directory(mode: int) -> bool:
+    return mode & 0o170000 == 0o040000
+
+
+class PathIndex:
+    """Lazily built path index of trees: full path -> (mode, sha) per root tree SHA.
+
+    Directories are parsed once per tree SHA and shared between all roots, so lookups of
+    many files under the same directories, or in branches sharing unchanged subtrees, read
+    every tree object only once. Resolved paths are memoized per root tree. Both caches are
+    LRU bounded, `max_roots` root indexes and `max_trees` parsed directories.
+    """
+
+    def __init__(self, object_store: BaseObjectStore, max_roots: int = 32,
+                 max_trees: int = 4096):
+        self.object_store = object_store
+        self.max_roots = max_roots
+        self.max_trees = max_trees
+        self._paths: OrderedDict[bytes, dict[str, Entry]] = OrderedDict()
+        self._trees: OrderedDict[bytes, dict[str, Entry]] = OrderedDict()
+        self.tree_reads = 0
+
+    def directory(self, tree_sha: bytes) -> dict[str, Entry]:
+        """Get the entries of a tree object by name."""
+        entries = self._trees.get(tree_sha)
+        if entries is not None:
+            self._trees.move_to_end(tree_sha)
+            return entries
+
+        with trace_span('read_tree', 'tree_walk'):
+            tree = self.object_store[tree_sha]
+            entries = {entry.path.decode('utf-8', errors='replace'): (entry.mode, entry.sha)
+                       for entry in tree.iteritems()}
+        self.tree_reads += 1
+        self._trees[tree_sha] = entries
+        if len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+        return entries
+
+    def _root_paths(self, root_tree: bytes) -> dict[str, Entry]:
+        paths = self._paths.get(root_tree)
+        if paths is None:
+            paths = self._paths[root_tree] = {'': (0o040000, root_tree)}
+            if len(self._paths) > self.max_roots:
+                self._paths.popitem(last=False)
+        else:
+            self._paths.move_to_end(root_tree)
+        return paths
+
+    def lookup(self, root_tree: bytes, path: str) -> Entry:
+        """Get (mode, sha) of a path in the tree `root_tree`.
+
+        Raises `KeyError` with the missing path prefix if a component doesn't exist and
+        `NotADirectoryError` with the prefix if a component is not a directory.
+        """
+        path = path.strip('/')
+        paths = self._root_paths(root_tree)
+        entry = paths.get(path)
+        if entry is not None:
+            return entry
+
+        # Resume from the deepest directory already resolved in this root
+        parts = path.split('/')
+        depth = len(parts) - 1
+        while depth > 0 and '/'.join(parts[:depth]) not in paths:
+            depth -= 1
+        mode, sha = paths['/'.join(parts[:depth])]
+        for i in range(depth, len(parts)):
+            prefix = '/'.join(parts[:i])
+            if not is_directory(mode):
+                raise NotADirectoryError(prefix)
+            entry = self.directory(sha).get(parts[i])
+            if entry is None:
+                raise KeyError('/'.join(parts[:i + 1]))
+            paths['/'.join(parts[:i + 1])] = entry
+            mode, sha = entry
+        return mode, sha
+
+    def list_directory(self, root_tree: bytes, path: str = '') -> list[tuple[str, int, bytes]]:
+        """List (name, mode, sha) of the entries of a directory sorted by name."""
+        mode, sha = self.lookup(root_tree, path)
+        if not is_directory(mode):
+            raise NotADirectoryError(path)
+        return sorted((name, mode, sha) for name, (mode, sha) in self.directory(sha).items())
+
+    def clear(self):
+        self._paths.clear()
+        self._trees.clear()
@@ -0,0 +1,265 @@
+import hashlib
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator
+from urllib.parse import urlparse
+
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.git_tools.partial_fetch import FetchStats, partial_fetch
+
+JOBS_NAMESPACE = 'refs/jobs/'
+_JOB_ID = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9._-]*$')
+
+
+def job_ref_prefix(job_id: str) -> str:
+    """Prefix of the branch refs of a job in a shared repository."""
+    if not _JOB_ID.match(job_id) or job_id.endswith('.lock'):
+        raise ValueError(f"Job id '{job_id}' can't be used in a ref name")
+    return f'{JOBS_NAMESPACE}{job_id}/heads/'
+
+
+def repo_key(repo_url: str) -> str:
+    """Directory name of the bare repository of an upstream: readable name and URL hash."""
+    url = repo_url.rstrip('/')
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', Path(urlparse(url).path).name.removesuffix('.git'))
+    return f"{name or 'repo'}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _disk_usage(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+
+@dataclass
+class StoredJob:
+    repo_url: str
+    job_id: str
+    branches: list[str]
+    last_used: float
+
+
+@dataclass
+class GCStats:
+    removed_jobs: list[str] = field(default_factory=list)
+    removed_repos: list[str] = field(default_factory=list)
+    repacked: list[str] = field(default_factory=list)
+    size_before: int = 0
+    size_after: int = 0
+
+
+class RepoStore:
+    """Shared bare repositories, one per upstream, with the branches of every job in its own
+    ref namespace (`refs/jobs/<job>/heads/<branch>`).
+
+    Jobs reviewing the same upstream share one object store, so a branch fetched by one
+    job is not transferred again for another one. `open` hands out `GitTools` reading the
+    objects straight from the packs, there is no working tree. The last use of a job is
+    the modification time of `jobs/<job>` in the repository, `gc` removes the refs of
+    stale jobs and repacks the repositories to drop the objects only they referenced.
+    """
+
+    def __init__(self, root: str | Path, depth: int = 16,
+                 progress: Callable[[bytes], None] | None = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.depth = depth
+        self.progress = progress
+        self._locks: dict[str, threading.RLock] = {}
+        # Number of open toolboxes per (repository, job)
+        self._readers: dict[tuple[str, str], int] = {}
+        # Repositories with removed jobs whose objects are not dropped yet
+        self._garbage: set[str] = set()
+        self._lock = threading.Lock()
+
+    def repo_path(self, repo_url: str) -> Path:
+        return self.root / f'{repo_key(repo_url)}.git'
+
+    def _repo_lock(self, key: str) -> threading.RLock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def _open_repo(self, repo_url: str) -> Repo:
+        path = self.repo_path(repo_url)
+        if path.exists():
+            return Repo(str(path))
+        repo = Repo.init_bare(str(path), mkdir=True)
+        config = repo.get_config()
+        config.set((b'remote', b'origin'), b'url', repo_url.encode('utf-8'))
+        config.write_to_path()
+        return repo
+
+    @staticmethod
+    def _touch(repo_path: Path, job_id: str):
+        marker = repo_path / 'jobs' / job_id
+        marker.parent.mkdir(exist_ok=True)
+        marker.touch()
+
+    def fetch(self, repo_url: str, job_id: str, branches: list[str],
+              base_branch: str | None = None, depth: int | None = None) -> FetchStats:
+        """Fetch the branches of a job into its namespace of the shared repository.
+
+        Only the objects missing in the shared store are transferred, see `partial_fetch`.
+        Fetching again for the same job replaces its branches.
+        """
+        prefix = job_ref_prefix(job_id)
+        path = self.repo_path(repo_url)
+        with self._repo_lock(path.name):
+            with self._open_repo(repo_url) as repo:
+                for ref in list(repo.refs.keys(prefix.encode())):
+                    del repo.refs[prefix.encode() + ref]
+                stats = partial_fetch(repo, repo_url, branches, base_branch=base_branch,
+                                      depth=depth or self.depth, ref_prefixes=(prefix,),
+                                      progress=self.progress)
+            self._touch(path, job_id)
+        return stats
+
+    @contextmanager
+    def open(self, repo_url: str, job_id: str, **kwargs: Any) -> Iterator[GitTools]:
+        """`GitTools` for the branches of a fetched job, the arguments are passed to it.
+
+        `gc` doesn't remove an open job and doesn't rewrite the packs of a repository while
+        one of its jobs is open.
+        """
+        prefix = job_ref_prefix(job_id)
+        path = self.repo_path(repo_url)
+        with self._repo_lock(path.name):
+            if not (path / 'jobs' / job_id).exists():
+                raise KeyError(f"Job {job_id} of {repo_url} is not in the store")
+            self._touch(path, job_id)
+            with self._lock:
+                key = (path.name, job_id)
+                self._readers[key] = self._readers.get(key, 0) + 1
+        toolbox = GitTools(str(path), ref_prefix=prefix, **kwargs)
+        try:
+            yield toolbox
+        finally:
+            toolbox.close()
+            with self._lock:
+                self._readers[key] -= 1
+                if not self._readers[key]:
+                    del self._readers[key]
+
+    def is_open(self, repo_url: str, job_id: str) -> bool:
+        with self._lock:
+            return (self.repo_path(repo_url).name, job_id) in self._readers
+
+    def jobs(self) -> list[StoredJob]:
+        """Jobs of all repositories, the least recently used first."""
+        jobs = []
+        for path in sorted(self.root.glob('*.git')):
+            with Repo(str(path)) as repo:
+                repo_url = repo.get_config().get((b'remote', b'origin'), b'url').decode('utf-8')
+                for marker in (path / 'jobs').glob('*'):
+                    prefix = job_ref_prefix(marker.name).encode()
+                    branches = sorted(ref.decode('utf-8') for ref in repo.refs.keys(prefix))
+                    jobs.append(StoredJob(repo_url, marker.name, branches,
+                                          marker.stat().st_mtime))
+        return sorted(jobs, key=lambda job: job.last_used)
+
+    def size(self) -> int:
+        """Disk usage of all repositories in bytes."""
+        return _disk_usage(self.root)
+
+    def remove_job(self, repo_url: str, job_id: str):
+        """Delete the refs of a job, its objects are dropped by the next `gc`."""
+        prefix = job_ref_prefix(job_id)
+        path = self.repo_path(repo_url)
+        with self._repo_lock(path.name):
+            with Repo(str(path)) as repo:
+                for ref in list(repo.refs.keys(prefix.encode())):
+                    del repo.refs[prefix.encode() + ref]
+            (path / 'jobs' / job_id).unlink(missing_ok=True)
+        with self._lock:
+            self._garbage.add(path.name)
+
+    def _repack(self, path: Path) -> bool:
+        """Write the objects reachable from the refs into one pack and delete the others.
+
+        Returns False if the repository is open or has no jobs left and was deleted instead.
+        """
+        with self._lock:
+            if any(name == path.name for name, _ in self._readers):
+                return False
+            self._garbage.discard(path.name)
+        with Repo(str(path)) as repo:
+            wants = {sha for sha in repo.refs.as_dict().values() if sha in repo.object_store}
+            if not wants:
+                shutil.rmtree(path)
+                return False
+            store = repo.object_store
+            old_packs = store.packs
+            loose = list(store._iter_loose_objects())
+            shallow = repo.get_shallow()
+            count, records = store.generate_pack_data([], list(wants), shallow=shallow)
+            new_pack = store.add_pack_data(count, records)
+            for pack in old_packs:
+                if new_pack is None or pack.name() != new_pack.name():
+                    store._remove_pack(pack)
+            for sha in loose:
+                store._remove_loose_object(sha)
+            # Boundary commits of the removed history are not shallow points anymore
+            repo.update_shallow(None, [sha for sha in shallow if sha not in store])
+        return True
+
+    def gc(self, max_age: float | None = None, max_bytes: int | None = None) -> GCStats:
+        """Remove jobs unused for `max_age` seconds, then the least recently used jobs while
+        the store is larger than `max_bytes`, and drop the objects they referenced.
+
+        Open jobs are never removed. Repositories without jobs are deleted, open repositories
+        keep their packs until the next `gc`, which repacks them first.
+        """
+        stats = GCStats(size_before=self.size())
+        jobs = [job for job in self.jobs() if not self.is_open(job.repo_url, job.job_id)]
+        stale = [job for job in jobs
+                 if max_age is not None and job.last_used < time.time() - max_age]
+
+        def remove(job: StoredJob) -> bool:
+            # `open` registers a job under the repository lock, so it can't be opened between
+            # the check and the removal
+            with self._repo_lock(self.repo_path(job.repo_url).name):
+                if self.is_open(job.repo_url, job.job_id):
+                    return False
+                self.remove_job(job.repo_url, job.job_id)
+            stats.removed_jobs.append(f'{repo_key(job.repo_url)}/{job.job_id}')
+            return True
+
+        def repack_garbage():
+            with self._lock:
+                pending = sorted(self._garbage)
+            for name in pending:
+                path = self.root / name
+                with self._repo_lock(name):
+                    if self._repack(path):
+                        stats.repacked.append(path.stem)
+                    elif not path.exists():
+                        stats.removed_repos.append(path.stem)
+
+        for job in stale:
+            remove(job)
+        repack_garbage()
+        if max_bytes is not None:
+            size = self.size()
+            if size > max_bytes:
+                # A job is estimated to free an equal share of its repository, all jobs of a
+                # repository free all of it. The jobs are chosen up front and every repository
+                # is repacked once.
+                repo_jobs: dict[str, int] = {}
+                for job in self.jobs():
+                    name = self.repo_path(job.repo_url).name
+                    repo_jobs[name] = repo_jobs.get(name, 0) + 1
+                repo_sizes = {name: _disk_usage(self.root / name) for name in repo_jobs}
+                for job in jobs[len(stale):]:
+                    if size <= max_bytes:
+                        break
+                    name = self.repo_path(job.repo_url).name
+                    if remove(job):
+                        size -= repo_sizes[name] // repo_jobs[name]
+                repack_garbage()
+        stats.size_after = self.size()
+        return stats
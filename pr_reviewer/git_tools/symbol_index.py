@@ -0,0 +1,174 @@
+import ast
+import difflib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+from pr_reviewer.tracing import trace_span
+
+
+@dataclass(eq=False)
+class Symbol:
+    """Function or class of a module, lines are 1-based and include the decorators."""
+    name: str
+    kind: str
+    start: int
+    end: int
+    # Names called in the own body, without the bodies of nested functions and classes
+    calls: set[str] = field(default_factory=set)
+
+    @property
+    def short_name(self) -> str:
+        return self.name.rsplit('.', 1)[-1]
+
+    def contains(self, line: int) -> bool:
+        return self.start <= line <= self.end
+
+    def encloses(self, other: 'Symbol') -> bool:
+        return self.start <= other.start and other.end <= self.end
+
+
+def _called_name(node: ast.Call) -> str | None:
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+class _SymbolCollector(ast.NodeVisitor):
+    def __init__(self):
+        self.symbols: list[Symbol] = []
+        self._stack: list[Symbol] = []
+
+    def _visit_scope(self, node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef):
+        parent = self._stack[-1] if self._stack else None
+        start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+        symbol = Symbol(name=f'{parent.name}.{node.name}' if parent else node.name,
+                        kind='class' if isinstance(node, ast.ClassDef) else 'function',
+                        start=start, end=node.end_lineno or node.lineno)
+        self.symbols.append(symbol)
+        self._stack.append(symbol)
+        self.generic_visit(node)
+        self._stack.pop()
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_scope
+
+    def visit_Call(self, node: ast.Call):
+        name = _called_name(node)
+        if name and self._stack:
+            self._stack[-1].calls.add(name)
+        self.generic_visit(node)
+
+
+class ModuleSymbols:
+    """Functions and classes of a parsed Python module."""
+
+    def __init__(self, symbols: list[Symbol]):
+        self.symbols = symbols
+
+    @classmethod
+    def parse(cls, source: str) -> 'ModuleSymbols':
+        """Raises SyntaxError if the source is not valid Python."""
+        collector = _SymbolCollector()
+        collector.visit(ast.parse(source))
+        return cls(collector.symbols)
+
+    def enclosing(self, line: int) -> Symbol | None:
+        """Get the innermost function or class containing a line."""
+        found = None
+        for symbol in self.symbols:
+            if symbol.contains(line) and (found is None or found.encloses(symbol)):
+                found = symbol
+        return found
+
+    def callers(self, symbol: Symbol) -> list[Symbol]:
+        """Get the functions and classes calling a symbol by its name, a class is called
+        when it is instantiated. Symbols enclosing the callee (e.g. recursion) are skipped."""
+        return [caller for caller in self.symbols
+                if symbol.short_name in caller.calls and not caller.encloses(symbol)]
+
+
+class SymbolIndex:
+    """LRU cache of parsed modules keyed by the blob SHA.
+
+    Blob SHAs identify the content, so a module is parsed once for all branches and reviews
+    sharing it. Unparsable sources are cached as their syntax error. The changed line ranges
+    are cached the same way per pair of blob SHAs.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.parses = 0
+        self.diffs = 0
+        self._entries: OrderedDict[bytes, ModuleSymbols | SyntaxError] = OrderedDict()
+        self._ranges: OrderedDict[tuple[bytes | None, bytes], list[tuple[int, int]]] = \
+            OrderedDict()
+
+    def get(self, blob_sha: bytes, read_text: Callable[[bytes], str]) -> ModuleSymbols:
+        """Get the symbols of a blob, raises SyntaxError if it is not valid Python."""
+        entry = self._entries.get(blob_sha)
+        if entry is None:
+            with trace_span('parse_symbols', 'parse'):
+                try:
+                    entry = ModuleSymbols.parse(read_text(blob_sha))
+                except SyntaxError as e:
+                    entry = e
+            self.parses += 1
+            self._entries[blob_sha] = entry
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(blob_sha)
+        if isinstance(entry, SyntaxError):
+            raise entry
+        return entry
+
+    def changed_ranges(self, old_sha: bytes | None, new_sha: bytes,
+                       read_text: Callable[[bytes], str]) -> list[tuple[int, int]]:
+        """Get `changed_line_ranges` between two blobs, `old_sha` is None for added files."""
+        key = (old_sha, new_sha)
+        ranges = self._ranges.get(key)
+        if ranges is None:
+            old_text = read_text(old_sha) if old_sha is not None else ''
+            ranges = changed_line_ranges(old_text, read_text(new_sha))
+            self.diffs += 1
+            self._ranges[key] = ranges
+            if len(self._ranges) > self.max_size:
+                self._ranges.popitem(last=False)
+        else:
+            self._ranges.move_to_end(key)
+        return ranges
+
+
+def changed_line_ranges(old_text: str, new_text: str) -> list[tuple[int, int]]:
+    """Get the 1-based (first, last) line ranges of the new text touched by the changes.
+
+    A deletion is reported as the line before the removed lines, which is in the same
+    function if the lines were removed from its middle or end.
+    """
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    # Most changes touch a few lines of a long file, the common head and tail are cut off
+    # before the quadratic matching
+    head = 0
+    limit = min(len(old_lines), len(new_lines))
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    limit -= head
+    while tail < limit and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+    matcher = difflib.SequenceMatcher(None, old_lines[head:len(old_lines) - tail],
+                                      new_lines[head:len(new_lines) - tail], autojunk=False)
+    ranges = []
+    for tag, _, _, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        j1 += head
+        j2 += head
+        if j2 > j1:
+            ranges.append((j1 + 1, j2))
+        else:
+            ranges.append((max(j1, 1), max(j1, 1)))
+    return ranges
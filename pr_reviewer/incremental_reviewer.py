@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+from langchain_core.language_models import BaseChatModel
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.simple_reviewer import (RoundTripCounter, create_file_review_chain,
+                                         file_review_inputs, get_llm, run_config)
+from pr_reviewer.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReviewState:
+    """Result of the last completed review of a branch pair, findings are stored per file."""
+    old_branch: str
+    new_branch: str
+    model: str
+    base_tree: str
+    feature_tree: str
+    findings: dict[str, str] = field(default_factory=dict)
+
+
+def load_state(state_path: str | Path) -> ReviewState | None:
+    state_path = Path(state_path)
+    if not state_path.is_file():
+        return None
+    with open(state_path, 'rt', encoding='utf-8') as f:
+        return ReviewState(**json.load(f))
+
+
+def save_state(state: ReviewState, state_path: str | Path):
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write and rename, so an interrupted run doesn't leave a broken state behind
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(asdict(state), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def files_to_review(toolbox: GitTools, state: ReviewState | None, old_branch: str,
+                    new_branch: str, model: str) -> list[str]:
+    """Get the changed files whose findings can't be carried forward from the last review.
+
+    A file is reviewed again if its blob changed in the feature or the base tree since the
+    last review or if it has no findings yet.
+    """
+    changed = [file_path for file_path, _ in toolbox.changed_files(old_branch, new_branch)]
+    if state is None or (state.old_branch, state.new_branch, state.model) != (
+            old_branch, new_branch, model):
+        return changed
+    try:
+        touched = toolbox.changed_paths_between_trees(state.feature_tree,
+                                                      toolbox.get_tree_sha(new_branch))
+        touched |= toolbox.changed_paths_between_trees(
+            state.base_tree, toolbox.get_base_tree_sha(old_branch, new_branch))
+    except KeyError:
+        # Trees of the last review are gone (e.g. after a force-push and GC)
+        return changed
+    return [file_path for file_path in changed
+            if file_path in touched or file_path not in state.findings]
+
+
+def merge_file_findings(findings: dict[str, str], file_paths: list[str]) -> str:
+    return "\n\n".join(f"### {file_path}\n\n{findings[file_path]}" for file_path in file_paths)
+
+
+@traced('review')
+def make_incremental_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                            state_path: str | Path, model: str = 'llama-3.1-70b-versatile',
+                            cache_path: str | Path | None = None,
+                            max_concurrency: int = 4,
+                            llm: BaseChatModel | None = None) -> str:
+    """Review the changes between two branches, reusing the findings of the last review.
+
+    Every file is reviewed by a separate model call, findings are persisted in `state_path`
+    together with the reviewed trees. On the next run only files changed since then are
+    reviewed again. A ready `llm` overrides `model`.
+    """
+    blob_cache = BlobCache(cache_path) if cache_path else None
+    toolbox = GitTools(repo_path, blob_cache=blob_cache)
+    try:
+        state = load_state(state_path)
+
+        changes = dict(toolbox.changed_files(old_branch, new_branch))
+        to_review = files_to_review(toolbox, state, old_branch, new_branch, model)
+        pending = set(to_review)
+        findings = {file_path: text
+                    for file_path, text in (state.findings if state else {}).items()
+                    if file_path in changes and file_path not in pending}
+
+        if to_review:
+            counter = RoundTripCounter()
+            chain = create_file_review_chain(llm or get_llm(model))
+            inputs = file_review_inputs(
+                toolbox, old_branch, new_branch,
+                [(file_path, changes[file_path]) for file_path in to_review])
+            results = chain.batch(inputs, config=run_config(counter,
+                                                            max_concurrency=max_concurrency))
+            findings.update(zip(to_review, results))
+            logger.info(counter.report())
+        logger.info(f"Reviewed {len(to_review)} of {len(changes)} changed files, "
+                    f"findings for {len(changes) - len(to_review)} files were carried forward")
+
+        save_state(ReviewState(old_branch=old_branch, new_branch=new_branch, model=model,
+                               base_tree=toolbox.get_base_tree_sha(old_branch, new_branch),
+                               feature_tree=toolbox.get_tree_sha(new_branch),
+                               findings=findings), state_path)
+
+        if not changes:
+            return f"Branches `{old_branch}` and `{new_branch}` have the same content"
+        return merge_file_findings(findings, list(changes))
+    finally:
+        toolbox.close()
+        if blob_cache is not None:
+            blob_cache.close()
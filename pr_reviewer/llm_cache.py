@@ -0,0 +1,72 @@
+import hashlib
+import json
+import time
+import warnings
+from pathlib import Path
+from typing import Any
+
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+
+
+class CacheMissError(RuntimeError):
+    """Raised in the replay mode when a response is not in the cache."""
+
+
+class DiskResponseCache(BaseCache):
+    """On-disk cache of model responses for LangChain chat models.
+
+    LangChain passes the rendered messages (including tool calls and tool results) as
+    `prompt` and the model parameters (name, temperature, bound tools) as `llm_string`,
+    so the key covers everything that determines the response. Entries older than `ttl`
+    seconds are ignored, the storage is the SQLite LRU cache of `BlobCache`, so it is
+    bounded by `max_bytes` and can be shared between processes.
+
+    In the replay mode a miss raises `CacheMissError` instead of calling the model, which
+    makes benchmarks over recorded responses deterministic.
+    """
+
+    def __init__(self, db_path: str | Path, ttl: float | None = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024, replay: bool = False):
+        self.storage = BlobCache(db_path, max_bytes=max_bytes)
+        self.ttl = ttl
+        self.replay = replay
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256(f"{llm_string}\0{prompt}".encode('utf-8')).hexdigest()
+        return f"llm:{digest}"
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        value = self.storage.get(self._key(prompt, llm_string))
+        if value is not None:
+            entry = json.loads(value)
+            if self.ttl is None or time.time() - entry['created'] <= self.ttl:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', LangChainBetaWarning)
+                    return [loads(generation) for generation in entry['generations']]
+        if self.replay:
+            raise CacheMissError("Response is not in the cache and the replay mode is on")
+        return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        entry = {
+            'created': time.time(),
+            'generations': [dumps(generation) for generation in return_val],
+        }
+        self.storage.put(self._key(prompt, llm_string), json.dumps(entry))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.storage.clear()
+
+
+def enable_llm_cache(db_path: str | Path, ttl: float | None = 7 * 24 * 3600,
+                     replay: bool = False) -> DiskResponseCache:
+    """Use the disk cache for all chat models created without an explicit cache."""
+    cache = DiskResponseCache(db_path, ttl=ttl, replay=replay)
+    set_llm_cache(cache)
+    return cache
@@ -0,0 +1,50 @@
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from pr_reviewer.tracing import Span, Tracer
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records model calls of LangChain runs as spans with token usage."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans: dict[UUID, Span] = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *,
+                            run_id: UUID, **kwargs: Any):
+        model = (kwargs.get('metadata') or {}).get('ls_model_name') \
+            or serialized.get('name', 'chat_model')
+        self._spans[run_id] = self.tracer.start_span(model, 'llm')
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        tokens_in, tokens_out = _token_usage(response)
+        span.attributes.update(tokens_in=tokens_in, tokens_out=tokens_out)
+        self.tracer.end_span(span)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.attributes['error'] = f"{type(error).__name__}: {error}"
+            self.tracer.end_span(span)
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int]:
+    tokens_in = tokens_out = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                tokens_in += usage.get('input_tokens', 0)
+                tokens_out += usage.get('output_tokens', 0)
+    if not tokens_in and not tokens_out and response.llm_output:
+        usage = response.llm_output.get('token_usage') or {}
+        tokens_in = usage.get('prompt_tokens', 0)
+        tokens_out = usage.get('completion_tokens', 0)
+    return tokens_in, tokens_out
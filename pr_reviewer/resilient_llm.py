@@ -0,0 +1,411 @@
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables.config import var_child_runnable_config
+
+from pr_reviewer.review_options import get_provider
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError', 'InternalServerError')
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of `capacity`.
+
+    Callers reserve a token and sleep until it is available, so concurrent callers are
+    served in order. `pause` empties the bucket for a while, e.g. when the provider
+    asked to retry later, so the other callers back off as well.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take the tokens and get the seconds to wait until they are available."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds: float):
+        """Don't hand out tokens for the next `seconds`."""
+        with self._lock:
+            self._tokens = min(self._tokens, -seconds * self.rate)
+            self._updated = self.clock()
+
+
+class RateLimits:
+    """Token buckets shared by all model clients of the process.
+
+    Limits are requests per minute keyed by the provider ('groq') or by the provider and
+    the model ('groq/llama-3.1-8b-instant'), a call waits for the buckets of both.
+    """
+
+    def __init__(self, requests_per_minute: dict[str, float] | None = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.requests_per_minute = dict(requests_per_minute or {})
+        self.clock = clock
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def buckets(self, model: str) -> list[TokenBucket]:
+        provider = get_provider(model)
+        keys = [key for key in (provider, f'{provider}/{model}')
+                if key in self.requests_per_minute]
+        with self._lock:
+            for key in keys:
+                if key not in self._buckets:
+                    self._buckets[key] = TokenBucket(self.requests_per_minute[key] / 60,
+                                                     clock=self.clock)
+            return [self._buckets[key] for key in keys]
+
+
+def parse_rate_limits(values: list[str]) -> dict[str, float]:
+    """Parse `key=requests per minute` options, e.g. `groq=30`."""
+    limits = {}
+    for value in values:
+        key, _, rpm = value.partition('=')
+        try:
+            limits[key.strip()] = float(rpm)
+        except ValueError:
+            limits[key.strip()] = 0.0
+        if not key.strip() or limits[key.strip()] <= 0:
+            raise ValueError(f"Rate limit '{value}' is not in the form provider[/model]=rpm")
+    return limits
+
+
+def _status_code(error: BaseException) -> int | None:
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, overloaded or unavailable servers and network errors are retried."""
+    if _status_code(error) in RETRYABLE_STATUS:
+        return True
+    return (isinstance(error, (TimeoutError, ConnectionError))
+            or type(error).__name__ in RETRYABLE_ERRORS)
+
+
+def retry_after(error: BaseException) -> float | None:
+    """Seconds to wait from the `retry-after-ms` or `retry-after` headers of the response."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            date = email.utils.parsedate_to_datetime(value)
+            return max(0.0, date.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """Retries with full-jitter exponential backoff, the retry-after of the provider wins
+    when it is longer."""
+    max_retries: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, error: BaseException | None = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error) if error is not None else None
+        return min(self.max_delay, max(backoff, requested or 0.0))
+
+
+@contextmanager
+def _detached():
+    """Hides the callbacks of the enclosing run, so the inner model isn't reported twice."""
+    token = var_child_runnable_config.set(None)
+    try:
+        yield
+    finally:
+        var_child_runnable_config.reset(token)
+
+
+class ResilientChatModel(BaseChatModel):
+    """Chat model calling `models` in order: the primary model and its fallbacks.
+
+    Every call waits for the rate limits of the model. Retryable errors are retried with
+    `policy`, a rate-limited answer also pauses the buckets of the model for all callers.
+    When the retries are exhausted or the error is not retryable, the next model is
+    called. Bound tools are bound to every model.
+    """
+    models: list[Any]
+    model_names: list[str]
+    rate_limits: Any = None
+    policy: RetryPolicy = RetryPolicy()
+    sleep: Callable[[float], None] = time.sleep
+    asleep: Callable[[float], Any] = asyncio.sleep
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def _llm_type(self) -> str:
+        return 'resilient'
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {'model_names': self.model_names}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> 'ResilientChatModel':
+        # `copy` would drop the fields excluded from serialization, e.g. the callbacks
+        fields = {name: getattr(self, name) for name in self.__fields__}
+        return type(self)(**fields | {'models': [model.bind_tools(tools, **kwargs)
+                                                 for model in self.models]})
+
+    def _buckets(self, model_name: str) -> list[TokenBucket]:
+        return self.rate_limits.buckets(model_name) if self.rate_limits else []
+
+    def _on_error(self, model_name: str, attempt: int, error: Exception) -> float | None:
+        """Get the delay before the next attempt or None to fall over to the next model."""
+        if not is_retryable(error) or attempt >= self.policy.max_retries:
+            return None
+        delay = self.policy.delay(attempt, error)
+        if _status_code(error) == 429:
+            for bucket in self._buckets(model_name):
+                bucket.pause(delay)
+        return delay
+
+    @staticmethod
+    def _result(message: BaseMessage, model_name: str, attempts: int) -> ChatResult:
+        info = {'model_name': model_name, 'attempts': attempts}
+        return ChatResult(generations=[ChatGeneration(message=message, generation_info=info)],
+                          llm_output=info)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: CallbackManagerForLLMRun | None = None,
+                  **kwargs: Any) -> ChatResult:
+        error: Exception | None = None
+        for model, model_name in zip(self.models, self.model_names):
+            attempt = 0
+            while True:
+                for bucket in self._buckets(model_name):
+                    self.sleep(bucket.reserve())
+                try:
+                    with _detached():
+                        message = model.invoke(messages, {'callbacks': []}, stop=stop, **kwargs)
+                    return self._result(message, model_name, attempt + 1)
+                except Exception as e:
+                    error = e
+                    delay = self._on_error(model_name, attempt, e)
+                    if delay is None:
+                        break
+                    if run_manager:
+                        run_manager.on_text(f"{model_name}: {type(e).__name__}, retrying in "
+                                            f"{delay:.1f}s\n")
+                    self.sleep(delay)
+                    attempt += 1
+        raise error
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: AsyncCallbackManagerForLLMRun | None = None,
+                         **kwargs: Any) -> ChatResult:
+        error: Exception | None = None
+        for model, model_name in zip(self.models, self.model_names):
+            attempt = 0
+            while True:
+                for bucket in self._buckets(model_name):
+                    await self.asleep(bucket.reserve())
+                try:
+                    with _detached():
+                        message = await model.ainvoke(messages, {'callbacks': []}, stop=stop,
+                                                      **kwargs)
+                    return self._result(message, model_name, attempt + 1)
+                except Exception as e:
+                    error = e
+                    delay = self._on_error(model_name, attempt, e)
+                    if delay is None:
+                        break
+                    if run_manager:
+                        await run_manager.on_text(f"{model_name}: {type(e).__name__}, "
+                                                  f"retrying in {delay:.1f}s\n")
+                    await self.asleep(delay)
+                    attempt += 1
+        raise error
+
+
+def get_resilient_llm(model: str, fallback_models: Sequence[str] = (),
+                      rate_limits: RateLimits | None = None,
+                      policy: RetryPolicy | None = None,
+                      llm_factory: Callable[[str], BaseChatModel] | None = None,
+                      **kwargs: Any) -> ResilientChatModel:
+    """Create the chat model of `model` with rate limits, retries and fallback models.
+
+    Every model is created with `llm_factory`, the default is `get_llm`.
+    """
+    if llm_factory is None:
+        from pr_reviewer.simple_reviewer import get_llm  # The reviewer imports this module
+        llm_factory = get_llm
+    names = [model, *(name for name in fallback_models if name != model)]
+    return ResilientChatModel(models=[llm_factory(name) for name in names], model_names=names,
+                              rate_limits=rate_limits, policy=policy or RetryPolicy(),
+                              cache=False, **kwargs)
+
+
+class AgentCheckpoint:
+    """Tool results of the finished steps of an agent run.
+
+    Each entry is the list of (action, observation) pairs of one step, i.e. the tool calls
+    of one model answer with their results. The steps are valid only for the `inputs` of
+    the run they were recorded in.
+    """
+
+    def __init__(self, inputs: dict[str, Any]):
+        self.inputs = dict(inputs)
+        self.steps: list[list[tuple[AgentAction, str]]] = []
+        self.replayed = 0
+
+    def check_inputs(self, inputs: dict[str, Any]):
+        if inputs != self.inputs:
+            raise ValueError("The checkpoint was recorded for other inputs of the agent")
+
+    def next_step(self, done: int) -> list[tuple[AgentAction, str]] | None:
+        """Get the recorded step following `done` intermediate steps, if there is one."""
+        position = 0
+        for step in self.steps:
+            if position == done:
+                self.replayed += 1
+                return step
+            position += len(step)
+        return None
+
+    def record(self, done: int, step: list[tuple[AgentAction, str]]):
+        if sum(len(recorded) for recorded in self.steps) == done:
+            self.steps.append(list(step))
+
+
+class CheckpointingAgentExecutor(AgentExecutor):
+    """Agent executor recording the tool results of every step in `checkpoint`.
+
+    Invoking it again with the same inputs and checkpoint, e.g. after the model calls
+    failed, replays the recorded steps without calling the model or the tools and resumes
+    from the first unfinished step.
+    """
+    checkpoint: AgentCheckpoint | None = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _take_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                        run_manager=None) -> AgentFinish | list[tuple[AgentAction, str]]:
+        if self.checkpoint is None:
+            return super()._take_next_step(name_to_tool_map, color_mapping, inputs,
+                                           intermediate_steps, run_manager)
+        done = len(intermediate_steps)
+        step = self.checkpoint.next_step(done)
+        if step is not None:
+            return step
+        output = super()._take_next_step(name_to_tool_map, color_mapping, inputs,
+                                         intermediate_steps, run_manager)
+        if not isinstance(output, AgentFinish):
+            self.checkpoint.record(done, output)
+        return output
+
+    async def _atake_next_step(self, name_to_tool_map, color_mapping, inputs,
+                               intermediate_steps,
+                               run_manager=None) -> AgentFinish | list[tuple[AgentAction, str]]:
+        if self.checkpoint is None:
+            return await super()._atake_next_step(name_to_tool_map, color_mapping, inputs,
+                                                  intermediate_steps, run_manager)
+        done = len(intermediate_steps)
+        step = self.checkpoint.next_step(done)
+        if step is not None:
+            return step
+        output = await super()._atake_next_step(name_to_tool_map, color_mapping, inputs,
+                                                intermediate_steps, run_manager)
+        if not isinstance(output, AgentFinish):
+            self.checkpoint.record(done, output)
+        return output
+
+
+@contextmanager
+def _checkpointed(executor: CheckpointingAgentExecutor, inputs: dict[str, Any],
+                  checkpoint: AgentCheckpoint | None):
+    if checkpoint is None:
+        checkpoint = AgentCheckpoint(inputs)
+    checkpoint.check_inputs(inputs)
+    executor.checkpoint = checkpoint
+    try:
+        yield checkpoint
+    finally:
+        executor.checkpoint = None
+
+
+def invoke_resumable(executor: CheckpointingAgentExecutor, inputs: dict[str, Any],
+                     config: dict[str, Any] | None = None, attempts: int = 3,
+                     policy: RetryPolicy | None = None,
+                     sleep: Callable[[float], None] = time.sleep,
+                     checkpoint: AgentCheckpoint | None = None) -> dict[str, Any]:
+    """Invoke the agent, a retryable failure resumes the run from its checkpoint.
+
+    Every call starts from a fresh checkpoint unless a `checkpoint` recorded for the same
+    inputs is given, e.g. to resume a run which ran out of attempts.
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+    with _checkpointed(executor, inputs, checkpoint) as checkpoint:
+        while True:
+            try:
+                return executor.invoke(inputs, config=config)
+            except Exception as e:
+                if attempt + 1 >= attempts or not is_retryable(e):
+                    raise
+                delay = policy.delay(attempt, e)
+                logger.warning("Review failed with %s, resuming after %d steps in %.1fs",
+                               type(e).__name__, len(checkpoint.steps), delay)
+                sleep(delay)
+                attempt += 1
+
+
+async def ainvoke_resumable(executor: CheckpointingAgentExecutor, inputs: dict[str, Any],
+                            config: dict[str, Any] | None = None, attempts: int = 3,
+                            policy: RetryPolicy | None = None,
+                            checkpoint: AgentCheckpoint | None = None) -> dict[str, Any]:
+    """Async variant of `invoke_resumable`."""
+    policy = policy or RetryPolicy()
+    attempt = 0
+    with _checkpointed(executor, inputs, checkpoint) as checkpoint:
+        while True:
+            try:
+                return await executor.ainvoke(inputs, config=config)
+            except Exception as e:
+                if attempt + 1 >= attempts or not is_retryable(e):
+                    raise
+                delay = policy.delay(attempt, e)
+                logger.warning("Review failed with %s, resuming after %d steps in %.1fs",
+                               type(e).__name__, len(checkpoint.steps), delay)
+                await asyncio.sleep(delay)
+                attempt += 1
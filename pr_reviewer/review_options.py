@@ -0,0 +1,65 @@
+# Options of the reviewers without their dependencies, so CLIs can parse arguments quickly
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_MODEL = 'llama-3.1-70b-versatile'
+
+REVIEW_MODES = ('agent', 'prefetch', 'chunked')
+
+SPECIALISTS = {
+    'security': "security issues: injections, unsafe deserialization, secrets in code, "
+                "missing input validation, authentication and authorization flaws",
+    'performance': "performance issues: needless work in loops, quadratic algorithms, "
+                   "repeated I/O, missing caching or batching, memory blow-ups",
+    'correctness': "correctness issues: logic errors, unhandled edge cases and errors, "
+                   "race conditions, broken contracts of the changed functions",
+    'style': "readability and maintainability: naming, duplication, dead code, missing "
+             "documentation of non-obvious code, consistency with the surrounding code",
+}
+
+
+def configure_logging(level: int = logging.INFO):
+    """Report the progress of the reviewers to stderr, other loggers keep their levels."""
+    logging.basicConfig(format='%(message)s')
+    logging.getLogger('pr_reviewer').setLevel(level)
+
+
+def get_provider(model: str) -> str:
+    """Name of the provider serving the model."""
+    return 'openai' if model.startswith('gpt') else 'groq'
+
+
+@dataclass
+class ReviewJob:
+    path: str
+    source_branch: str
+    destination_branch: str
+    model: str = DEFAULT_MODEL
+    id: str = ''
+
+
+def read_manifest(manifest: str | Path, default_model: str = DEFAULT_MODEL) -> list[ReviewJob]:
+    """Read review jobs from a JSONL manifest.
+
+    Every line is an object with `path`, `source_branch` and `destination_branch` keys and
+    optional `model` and `id` keys.
+    """
+    jobs = []
+    with open(manifest, 'rt', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            missing = {'path', 'source_branch', 'destination_branch'} - record.keys()
+            if missing:
+                raise ValueError(f"Manifest line {line_no} misses {', '.join(sorted(missing))}")
+            jobs.append(ReviewJob(
+                path=record['path'],
+                source_branch=record['source_branch'],
+                destination_branch=record['destination_branch'],
+                model=record.get('model') or default_model,
+                id=str(record.get('id') or line_no),
+            ))
+    return jobs
@@ -0,0 +1,358 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from langchain_core.language_models import BaseChatModel
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.review_options import DEFAULT_MODEL, REVIEW_MODES, ReviewJob
+from pr_reviewer.simple_reviewer import get_llm, make_review
+
+
+class GitToolsPool:
+    """Opened repositories kept warm between reviews.
+
+    Opening a repository loads its refs and pack indexes, a warm `GitTools` also keeps its
+    change sets, path index and merge-bases. `GitTools` is not thread-safe, so every
+    instance serves one review at a time: concurrent reviews of the same repository get
+    separate instances. Up to `max_idle` idle instances are kept, the least recently used
+    ones are closed.
+    """
+
+    def __init__(self, max_idle: int = 16, blob_cache: BlobCache | None = None):
+        self.max_idle = max_idle
+        self.blob_cache = blob_cache
+        self.opened = 0
+        self.reused = 0
+        self._idle: OrderedDict[str, list[GitTools]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _take_idle(self, key: str) -> GitTools | None:
+        with self._lock:
+            instances = self._idle.get(key)
+            if not instances:
+                return None
+            toolbox = instances.pop()
+            if not instances:
+                del self._idle[key]
+            self.reused += 1
+            return toolbox
+
+    def _release(self, key: str, toolbox: GitTools):
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(toolbox)
+            self._idle.move_to_end(key)
+            while sum(len(instances) for instances in self._idle.values()) > self.max_idle:
+                oldest = next(iter(self._idle))
+                evicted.append(self._idle[oldest].pop(0))
+                if not self._idle[oldest]:
+                    del self._idle[oldest]
+        for instance in evicted:
+            instance.close()
+
+    def idle_count(self) -> int:
+        with self._lock:
+            return sum(len(instances) for instances in self._idle.values())
+
+    @contextmanager
+    def acquire(self, repo_path: str | Path) -> Iterator[GitTools]:
+        key = str(Path(repo_path).resolve())
+        toolbox = self._take_idle(key)
+        if toolbox is None:
+            toolbox = GitTools(key, blob_cache=self.blob_cache)
+            with self._lock:
+                self.opened += 1
+        try:
+            yield toolbox
+        finally:
+            self._release(key, toolbox)
+
+    def close(self):
+        with self._lock:
+            instances = [toolbox for idle in self._idle.values() for toolbox in idle]
+            self._idle.clear()
+        for toolbox in instances:
+            toolbox.close()
+
+
+class LLMPool:
+    """Chat model clients created once per model and shared by all reviews."""
+
+    def __init__(self, factory: Callable[[str], BaseChatModel] = get_llm):
+        self.factory = factory
+        self._clients: dict[str, BaseChatModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> BaseChatModel:
+        with self._lock:
+            client = self._clients.get(model)
+            if client is None:
+                client = self._clients[model] = self.factory(model)
+            return client
+
+    def models(self) -> list[str]:
+        with self._lock:
+            return sorted(self._clients)
+
+
+class LatencyWindow:
+    """Durations of the last `size` events for percentile metrics."""
+
+    def __init__(self, size: int = 1000):
+        self._values: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+@dataclass
+class JobRecord:
+    id: str
+    path: str
+    source_branch: str
+    destination_branch: str
+    model: str
+    mode: str
+    status: str = 'queued'
+    review: str = ''
+    error: str = ''
+    submitted: float = 0.0
+    started: float = 0.0
+    finished: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        result = asdict(self)
+        if self.started:
+            result['queue_seconds'] = self.started - self.submitted
+        if self.finished:
+            result['review_seconds'] = self.finished - self.started
+        return result
+
+
+class ReviewService:
+    """Long-lived review worker: a job queue served by a pool of worker threads.
+
+    Plays the role of the LLM-based Review Agent of the service architecture (see
+    part1/part1.md), the in-process queue stands in for RabbitMQ. Repositories and model
+    clients stay warm between jobs, so a review doesn't pay for opening the repository
+    and creating the clients. Records of the last `max_records` jobs are kept for polling.
+    """
+
+    def __init__(self, workers: int = 4, review_fn: Callable[..., str] = make_review,
+                 cache_path: str | Path | None = None, max_repos: int = 16,
+                 max_queue: int = 0, max_records: int = 10_000,
+                 llm_factory: Callable[[str], BaseChatModel] = get_llm):
+        self.workers = workers
+        self.review_fn = review_fn
+        self.blob_cache = BlobCache(cache_path) if cache_path else None
+        self.repos = GitToolsPool(max_idle=max_repos, blob_cache=self.blob_cache)
+        self.llms = LLMPool(llm_factory)
+        self.queue_wait = LatencyWindow()
+        self.review_time = LatencyWindow()
+        self.max_records = max_records
+        self.started = time.time()
+        self.submitted = self.completed = self.failed = self.running = 0
+        self._queue: queue.Queue[JobRecord | None] = queue.Queue(maxsize=max_queue)
+        self._records: OrderedDict[str, JobRecord] = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def start(self, warm_models: list[str] | None = None):
+        for model in warm_models or []:
+            self.llms.get(model)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'review-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finish the queued jobs and stop the workers."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        self.repos.close()
+        if self.blob_cache is not None:
+            self.blob_cache.close()
+
+    def submit(self, job: ReviewJob, mode: str = 'agent') -> JobRecord:
+        """Queue a review, raises `queue.Full` if the queue is limited and full."""
+        if mode not in REVIEW_MODES:
+            raise ValueError(f"Unknown review mode '{mode}', expected one of {REVIEW_MODES}")
+        record = JobRecord(id=job.id or uuid.uuid4().hex, path=job.path,
+                           source_branch=job.source_branch,
+                           destination_branch=job.destination_branch, model=job.model,
+                           mode=mode, submitted=time.time())
+        with self._lock:
+            if record.id in self._records:
+                raise ValueError(f"Job '{record.id}' already exists")
+            self._records[record.id] = record
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+            self.submitted += 1
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._records.pop(record.id, None)
+                self.submitted -= 1
+            raise
+        return record
+
+    def get(self, job_id: str) -> JobRecord | None:
+        with self._lock:
+            return self._records.get(job_id)
+
+    def _work(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            with self._lock:
+                self.running += 1
+            record.started = time.time()
+            record.status = 'running'
+            self.queue_wait.add(record.started - record.submitted)
+            try:
+                with self.repos.acquire(record.path) as toolbox:
+                    record.review = self.review_fn(
+                        record.path, record.destination_branch, record.source_branch,
+                        record.model, mode=record.mode, llm=self.llms.get(record.model),
+                        toolbox=toolbox)
+                record.status = 'ok'
+            except Exception as e:
+                record.status = 'error'
+                record.error = f"{type(e).__name__}: {e}"
+            record.finished = time.time()
+            self.review_time.add(record.finished - record.started)
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.failed += record.status == 'error'
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            counters = {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'running': self.running,
+            }
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'workers': self.workers,
+            'queue_depth': self._queue.qsize(),
+            **counters,
+            'queue_wait_p50_seconds': self.queue_wait.percentile(0.5),
+            'queue_wait_p95_seconds': self.queue_wait.percentile(0.95),
+            'review_p50_seconds': self.review_time.percentile(0.5),
+            'review_p95_seconds': self.review_time.percentile(0.95),
+            'repos_opened': self.repos.opened,
+            'repos_reused': self.repos.reused,
+            'repos_idle': self.repos.idle_count(),
+            'models_warm': len(self.llms.models()),
+        }
+
+    def prometheus_metrics(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, value in self.metrics().items():
+            lines.append(f"pr_reviewer_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class _ReviewRequestHandler(BaseHTTPRequestHandler):
+    server: 'ReviewHTTPServer'
+
+    def _send(self, status: HTTPStatus, body: str, content_type: str = 'application/json'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: HTTPStatus, payload: dict[str, Any]):
+        self._send(status, json.dumps(payload, ensure_ascii=False))
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self._send_json(HTTPStatus.OK, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send(HTTPStatus.OK, service.prometheus_metrics(), 'text/plain; version=0.0.4')
+        elif self.path == '/stats':
+            self._send_json(HTTPStatus.OK, service.metrics())
+        elif self.path.startswith('/reviews/'):
+            record = service.get(self.path.removeprefix('/reviews/'))
+            if record is None:
+                self._send_json(HTTPStatus.NOT_FOUND, {'error': "Unknown job"})
+            else:
+                self._send_json(HTTPStatus.OK, record.to_dict())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/reviews':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            missing = {'path', 'source_branch', 'destination_branch'} - body.keys()
+            if missing:
+                raise ValueError(f"Missing {', '.join(sorted(missing))}")
+            job = ReviewJob(path=body['path'], source_branch=body['source_branch'],
+                            destination_branch=body['destination_branch'],
+                            model=body.get('model') or self.server.default_model,
+                            id=str(body.get('id') or ''))
+            record = self.server.service.submit(job, mode=body.get('mode') or 'agent')
+        except (ValueError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)})
+            return
+        except queue.Full:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': "The queue is full"})
+            return
+        self._send_json(HTTPStatus.ACCEPTED, {'id': record.id, 'status': record.status})
+
+    def log_message(self, format: str, *args: Any):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ReviewHTTPServer(ThreadingHTTPServer):
+    """Local HTTP interface of the review service.
+
+    `POST /reviews` queues a job (`path`, `source_branch`, `destination_branch` and optional
+    `model`, `mode` and `id`), `GET /reviews/<id>` returns its status and review,
+    `GET /metrics` and `GET /stats` report queue depth and latencies.
+    """
+    daemon_threads = True
+
+    def __init__(self, service: ReviewService, host: str = '127.0.0.1', port: int = 8080,
+                 default_model: str = DEFAULT_MODEL, verbose: bool = False):
+        super().__init__((host, port), _ReviewRequestHandler)
+        self.service = service
+        self.default_model = default_model
+        self.verbose = verbose
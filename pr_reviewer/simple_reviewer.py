@@ -1,14 +1,26 @@
+import logging
+import time
 from pathlib import Path
 from textwrap import dedent
+from typing import Any
 
-from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain.agents import create_tool_calling_agent
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import BaseTool
-from langchain_groq import ChatGroq
-from langchain_openai import ChatOpenAI
 
+from pr_reviewer.diff_chunker import chunk_file_diffs
+from pr_reviewer.git_tools.blob_cache import BlobCache
 from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.resilient_llm import (CheckpointingAgentExecutor, ainvoke_resumable,
+                                      invoke_resumable)
+from pr_reviewer.review_options import REVIEW_MODES, get_provider
+from pr_reviewer.tracing import trace_span, traced, tracing_callbacks
+
+logger = logging.getLogger(__name__)
 
 code_review_assistant_prompt = dedent("""    
     Your task is to review the changes that planned to be merged from the branch '{new_branch}' 
@@ -19,8 +31,10 @@ code_review_assistant_prompt = dedent("""
     2. For each file in the diff:
     2.1. Identify if the file contains significant logic changes. Continue to the next file if not. 
     2.1.1. Use ```diff_file_content``` tool for glance at the changes in the file.
-    2.1.2. Use ```get_file_content``` tool to get the content of the file in the branch 
-           '{new_branch}' if you can't realize the changes by the diff.
+    2.1.2. Use ```get_changed_symbols``` tool to get the changed functions and classes of 
+           a Python file and their callers if you can't realize the changes by the diff. 
+           Use ```get_file_content``` tool to get the content of the file in the branch 
+           '{new_branch}' only for other files or when this context is not enough.
     2.1.3. Decide if the changes are significant enough to be reviewed or we need continue the step 
            2 with the next file.
     2.2. Summarize the changes in the diff in clear and concise English, within 100 words.
@@ -28,35 +42,317 @@ code_review_assistant_prompt = dedent("""
     
 """)
 
+prefetch_review_prompt = dedent("""
+    Your task is to review the changes that planned to be merged from the branch '{new_branch}' 
+    to the '{old_branch}' and give constructive feedback.
+    
+    The changed files and their diffs are provided below. For each file:
+    1. Identify if the file contains significant logic changes. Continue to the next file if not.
+    2. Summarize the changes in the diff in clear and concise English, within 100 words.
+    3. Provide actionable suggestions if there are any issues in the code.
+    
+    Use the tools only as a fallback: ```diff_file_content``` for the files listed without 
+    a diff, ```get_changed_symbols``` to get the changed functions and classes of a Python 
+    file and their callers if you can't realize the changes by the diff, ```get_file_content``` 
+    to get the content of the file in the branch '{new_branch}' if that is not enough.
+    
+    {changes}
+""")
+
+chunk_review_prompt = dedent("""
+    Your task is to review the part {part} of {parts} of the changes that planned to be merged 
+    from the branch '{new_branch}' to the '{old_branch}' and give constructive feedback. 
+    The other parts are reviewed separately, large files may be split between parts.
+    
+    For each file below:
+    1. Identify if the file contains significant logic changes. Continue to the next file if not.
+    2. Summarize the changes in the diff in clear and concise English, within 100 words.
+    3. Provide actionable suggestions if there are any issues in the code.
+    
+    {changes}
+""")
+
+file_review_prompt = dedent("""
+    Your task is to review the changes of the file '{file_path}' ({change_type}) that planned
+    to be merged from the branch '{new_branch}' to the '{old_branch}' and give constructive
+    feedback.
+
+    1. Identify if the file contains significant logic changes. Answer only
+       "No significant changes." if not.
+    2. Summarize the changes in the diff in clear and concise English, within 100 words.
+    3. Provide actionable suggestions if there are any issues in the code.
+
+    ```diff
+    {diff}
+    ```
+""")
+
+# Context windows of the supported models
+MODEL_CONTEXT_TOKENS = {
+    'gpt-4o': 128_000,
+    'gpt-4o-mini': 128_000,
+    'gpt-4-turbo': 128_000,
+    'gpt-3.5-turbo': 16_385,
+    'llama-3.1-70b-versatile': 131_072,
+    'llama-3.1-8b-instant': 131_072,
+    'mixtral-8x7b-32768': 32_768,
+}
+DEFAULT_CONTEXT_TOKENS = 8_192
+
 
-def get_llm(model: str = 'llama-3.1-70b-versatile') -> BaseChatModel:
-    if model.startswith('gpt'):
-        return ChatOpenAI(model=model, temperature=0.1)
+def get_llm(model: str = 'llama-3.1-70b-versatile',
+            cache: BaseCache | None = None) -> BaseChatModel:
+    """Create the chat model, responses are cached in `cache` or in the global LLM cache.
+
+    Only the SDK of the selected provider is imported.
+    """
+    if get_provider(model) == 'openai':
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, temperature=0.1, cache=cache)
     else:
-        return ChatGroq(model=model, temperature=0.1)
+        from langchain_groq import ChatGroq
+        return ChatGroq(model=model, temperature=0.1, cache=cache)
 
 
-def make_review(repo_path: str | Path, old_branch: str, new_branch: str,
-                model: str = 'llama-3.1-70b-versatile') -> str:
-    """Review the changes between two branches."""
-    llm = get_llm(model)
-    toolbox = GitTools(repo_path)
+def get_diff_budget(model: str, share: float = 0.25, max_tokens: int = 16_000) -> int:
+    """Token budget for the diffs sent in one review call of the chunked mode.
+
+    Only a share of the context is used, the rest is left for the prompt and the answer.
+    Budgets are capped, because smaller batches are reviewed in parallel and keep
+    the cost of a single call predictable.
+    """
+    context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    return min(int(context * share), max_tokens)
+
+
+class RoundTripCounter(BaseCallbackHandler):
+    """Counts model and tool calls of a review."""
+
+    def __init__(self):
+        self.model_calls = 0
+        self.tool_calls = 0
+        self.start = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, **kwargs: Any):
+        self.model_calls += 1
+
+    def on_tool_start(self, serialized: dict[str, Any], input_str: str, **kwargs: Any):
+        self.tool_calls += 1
+
+    def report(self) -> str:
+        return (f"Review took {time.perf_counter() - self.start:.1f}s, "
+                f"{self.model_calls} model calls, {self.tool_calls} tool calls")
+
+
+def run_config(counter: RoundTripCounter, **config: Any) -> dict[str, Any]:
+    """Config of a review run with the round-trip counter and the tracing callbacks."""
+    return {'callbacks': [counter, *tracing_callbacks()], **config}
+
+
+def format_changes(toolbox: GitTools, old_branch: str, new_branch: str,
+                   max_chars: int = 60_000) -> str:
+    """Render all changed files with their diffs for the prefetch prompt.
+
+    Diffs are included while they fit into `max_chars`, the rest of the files are only listed,
+    the agent can fetch them with the tools.
+    """
+    included = []
+    omitted = []
+    used = 0
+    for file_path, change_type, diff in toolbox.iter_file_diffs(old_branch, new_branch):
+        if used + len(diff) > max_chars:
+            omitted.append(f"- {file_path} ({change_type})")
+            continue
+        used += len(diff)
+        included.append(f"### {file_path} ({change_type})\n```diff\n{diff}\n```")
+
+    excluded = [f"- {file.describe()}"
+                for file in toolbox.excluded_files(old_branch, new_branch)]
+
+    if not included and not omitted and not excluded:
+        return f"Branches `{old_branch}` and `{new_branch}` have the same content"
+    parts = ["Changed files:", *included]
+    if omitted:
+        parts += ["Files without a diff (too large to include):", *omitted]
+    if excluded:
+        parts += ["Files excluded from the review (generated, vendored, binary or lockfiles):",
+                  "\n".join(excluded)]
+    return "\n\n".join(parts)
 
-    tools: list[BaseTool] = toolbox.get_tools()
+
+def _create_agent_executor(llm: BaseChatModel, tools: list[BaseTool],
+                           review_prompt: str = code_review_assistant_prompt
+                           ) -> CheckpointingAgentExecutor:
     prompt = ChatPromptTemplate.from_messages([
         ('system', "You are an experienced code reviewer"),
-        ('human', code_review_assistant_prompt),
+        ('human', review_prompt),
         ("placeholder", "{agent_scratchpad}")
     ])
     reviewer_agent = create_tool_calling_agent(llm, tools, prompt)
-    reviewer_agent_executor = AgentExecutor(agent=reviewer_agent, tools=tools, verbose=True)
+    return CheckpointingAgentExecutor(agent=reviewer_agent, tools=tools, verbose=True)
+
+
+def _prepare_chunk_inputs(toolbox: GitTools, old_branch: str, new_branch: str,
+                          budget: int) -> list[dict[str, str | int]]:
+    batches = chunk_file_diffs(toolbox.iter_file_diffs(old_branch, new_branch), budget)
+    return [
+        {
+            'old_branch': old_branch,
+            'new_branch': new_branch,
+            'part': part,
+            'parts': len(batches),
+            'changes': "\n\n".join(chunk.render() for chunk in batch),
+        }
+        for part, batch in enumerate(batches, start=1)
+    ]
+
+
+def _create_chunk_chain(llm: BaseChatModel):
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are an experienced code reviewer"),
+        ('human', chunk_review_prompt),
+    ])
+    return prompt | llm | StrOutputParser()
+
+
+def create_file_review_chain(llm: BaseChatModel):
+    """Chain reviewing the diff of a single file."""
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are an experienced code reviewer"),
+        ('human', file_review_prompt),
+    ])
+    return prompt | llm | StrOutputParser()
+
 
-    result = reviewer_agent_executor.invoke(
+def file_review_inputs(toolbox: GitTools, old_branch: str, new_branch: str,
+                       files: list[tuple[str, str]]) -> list[dict[str, str]]:
+    """Inputs of the file review chain for (path, change type) pairs."""
+    return [
         {
             'old_branch': old_branch,
             'new_branch': new_branch,
-        },
-        verbose=True,
-    )
+            'file_path': file_path,
+            'change_type': change_type,
+            'diff': toolbox.diff_file_content(old_branch, new_branch, file_path),
+        }
+        for file_path, change_type in files
+    ]
+
+
+def merge_findings(findings: list[str]) -> str:
+    """Merge the reviews of independent parts of the changes into one report."""
+    if len(findings) == 1:
+        return findings[0]
+    return "\n\n".join(f"## Part {part} of {len(findings)}\n\n{text}"
+                        for part, text in enumerate(findings, start=1))
+
+
+def _prepare_inputs(toolbox: GitTools, old_branch: str, new_branch: str,
+                    mode: str) -> tuple[str, dict[str, str]]:
+    if mode not in REVIEW_MODES:
+        raise ValueError(f"Unknown review mode '{mode}', expected one of {REVIEW_MODES}")
+    inputs = {
+        'old_branch': old_branch,
+        'new_branch': new_branch,
+    }
+    if mode == 'agent':
+        return code_review_assistant_prompt, inputs
+    inputs['changes'] = format_changes(toolbox, old_branch, new_branch)
+    return prefetch_review_prompt, inputs
+
+
+@traced('review')
+def make_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                model: str = 'llama-3.1-70b-versatile',
+                cache_path: str | Path | None = None, mode: str = 'agent',
+                diff_budget: int | None = None, max_concurrency: int = 4,
+                llm: BaseChatModel | None = None, toolbox: GitTools | None = None,
+                review_attempts: int = 3) -> str:
+    """Review the changes between two branches.
+
+    In the 'agent' mode the agent fetches the diff of every file with tools, in the
+    'prefetch' mode all diffs are computed up front and packed into the first prompt.
+    The 'chunked' mode splits the diffs into batches of `diff_budget` tokens and reviews
+    up to `max_concurrency` batches in parallel. A ready `llm` overrides `model` and an
+    opened `toolbox` of the repository overrides `repo_path` and `cache_path`. An agent
+    run failing on a retryable model error is resumed from its last finished step, up to
+    `review_attempts` runs in total.
+    """
+    llm = llm or get_llm(model)
+    # Only the toolbox and the cache opened here are closed here
+    blob_cache = None
+    own_toolbox = toolbox is None
+    if own_toolbox:
+        blob_cache = BlobCache(cache_path) if cache_path else None
+        toolbox = GitTools(repo_path, blob_cache=blob_cache)
+    counter = RoundTripCounter()
+    try:
+        if mode == 'chunked':
+            batch_inputs = _prepare_chunk_inputs(toolbox, old_branch, new_branch,
+                                                 diff_budget or get_diff_budget(model))
+            if not batch_inputs:
+                return f"Branches `{old_branch}` and `{new_branch}` have the same content"
+            findings = _create_chunk_chain(llm).batch(
+                batch_inputs, config=run_config(counter, max_concurrency=max_concurrency))
+            logger.info(counter.report())
+            return merge_findings(findings)
+
+        review_prompt, inputs = _prepare_inputs(toolbox, old_branch, new_branch, mode)
+        tools: list[BaseTool] = toolbox.get_tools()
+        reviewer_agent_executor = _create_agent_executor(llm, tools, review_prompt)
+
+        result = invoke_resumable(reviewer_agent_executor, inputs, config=run_config(counter),
+                                  attempts=review_attempts)
+    finally:
+        if own_toolbox:
+            toolbox.close()
+        if blob_cache is not None:
+            blob_cache.close()
+    logger.info(counter.report())
 
     return result['output']
+
+
+async def amake_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                       model: str = 'llama-3.1-70b-versatile',
+                       cache_path: str | Path | None = None, mode: str = 'agent',
+                       diff_budget: int | None = None, max_concurrency: int = 4,
+                       llm: BaseChatModel | None = None, review_attempts: int = 3) -> str:
+    """Review the changes between two branches without blocking the event loop.
+
+    Model calls use the async clients of the providers and git access runs in the thread of
+    the `GitTools` executor, so one event loop can keep many reviews in flight.
+    """
+    with trace_span('amake_review', 'review'):
+        llm = llm or get_llm(model)
+        blob_cache = BlobCache(cache_path) if cache_path else None
+        toolbox = GitTools(repo_path, blob_cache=blob_cache)
+        counter = RoundTripCounter()
+        try:
+            if mode == 'chunked':
+                batch_inputs = await toolbox.run_blocking(
+                    _prepare_chunk_inputs, toolbox, old_branch, new_branch,
+                    diff_budget or get_diff_budget(model))
+                if not batch_inputs:
+                    return f"Branches `{old_branch}` and `{new_branch}` have the same content"
+                findings = await _create_chunk_chain(llm).abatch(
+                    batch_inputs,
+                    config=run_config(counter, max_concurrency=max_concurrency))
+                logger.info(counter.report())
+                return merge_findings(findings)
+
+            review_prompt, inputs = await toolbox.run_blocking(
+                _prepare_inputs, toolbox, old_branch, new_branch, mode)
+            tools: list[BaseTool] = toolbox.get_tools()
+            reviewer_agent_executor = _create_agent_executor(llm, tools, review_prompt)
+
+            result = await ainvoke_resumable(reviewer_agent_executor, inputs,
+                                             config=run_config(counter),
+                                             attempts=review_attempts)
+        finally:
+            toolbox.close()
+            if blob_cache is not None:
+                blob_cache.close()
+        logger.info(counter.report())
+
+        return result['output']
@@ -0,0 +1,178 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from pathlib import Path
+from textwrap import dedent
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from pr_reviewer.diff_chunker import chunk_file_diffs
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.review_options import SPECIALISTS
+from pr_reviewer.simple_reviewer import RoundTripCounter, get_diff_budget, get_llm, run_config
+from pr_reviewer.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+specialist_review_prompt = dedent("""
+    You are reviewing the changes that planned to be merged from the branch '{new_branch}'
+    to the '{old_branch}' as a {specialist} reviewer. Focus only on {focus}, other reviewers
+    cover the rest. This is the part {part} of {parts} of the changes.
+
+    Report every issue as a separate line in the format:
+    - `path/to/file`: the issue and an actionable suggestion
+
+    Answer only "No issues found." if there is nothing to report.
+
+    {changes}
+""")
+
+_FINDING = re.compile(r"^\s*[-*]\s+`?(?P<path>[^`:\s]+)`?\s*:\s*(?P<text>.+)$")
+GENERAL = '(general)'
+
+
+@dataclass
+class Finding:
+    file_path: str
+    text: str
+    specialists: list[str] = field(default_factory=list)
+
+
+def parse_findings(text: str, specialist: str,
+                   known_paths: set[str] | None = None) -> list[Finding]:
+    """Split the answer of a specialist into findings per file.
+
+    Lines not following the requested format or naming a path outside `known_paths` are
+    kept as general findings.
+    """
+    findings = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.rstrip('.').lower() == 'no issues found':
+            continue
+        match = _FINDING.match(line)
+        if match and (known_paths is None or match['path'] in known_paths):
+            findings.append(Finding(match['path'], match['text'].strip(), [specialist]))
+        else:
+            findings.append(Finding(GENERAL, line.lstrip('-* '), [specialist]))
+    return findings
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def dedupe_findings(findings: list[Finding], similarity: float = 0.85) -> list[Finding]:
+    """Merge findings about the same file with the same or nearly the same text.
+
+    The first wording is kept and the specialists of the merged findings are combined.
+    """
+    merged: list[Finding] = []
+    by_path: dict[str, list[tuple[str, Finding]]] = {}
+    for finding in findings:
+        normalized = _normalize(finding.text)
+        candidates = by_path.setdefault(finding.file_path, [])
+        for other_normalized, other in candidates:
+            if normalized == other_normalized or SequenceMatcher(
+                    None, normalized, other_normalized).ratio() >= similarity:
+                other.specialists.extend(s for s in finding.specialists
+                                         if s not in other.specialists)
+                break
+        else:
+            finding = Finding(finding.file_path, finding.text, list(finding.specialists))
+            candidates.append((normalized, finding))
+            merged.append(finding)
+    return merged
+
+
+def render_findings(findings: list[Finding]) -> str:
+    """Render findings grouped by file, general findings go last."""
+    paths = sorted({finding.file_path for finding in findings} - {GENERAL})
+    if any(finding.file_path == GENERAL for finding in findings):
+        paths.append(GENERAL)
+    sections = []
+    for file_path in paths:
+        lines = [f"- {finding.text} _({', '.join(finding.specialists)})_"
+                 for finding in findings if finding.file_path == file_path]
+        title = "General" if file_path == GENERAL else file_path
+        sections.append(f"### {title}\n\n" + "\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def _create_specialist_chain(llm: BaseChatModel):
+    prompt = ChatPromptTemplate.from_messages([
+        ('system', "You are an experienced code reviewer"),
+        ('human', specialist_review_prompt),
+    ])
+    return prompt | llm | StrOutputParser()
+
+
+def specialist_inputs(toolbox: GitTools, old_branch: str, new_branch: str,
+                      specialists: list[str], budget: int) -> list[dict[str, str | int]]:
+    """Inputs of the specialist chain: every specialist gets every batch of the diffs.
+
+    The diffs are computed once and shared by all specialists.
+    """
+    batches = chunk_file_diffs(toolbox.iter_file_diffs(old_branch, new_branch), budget)
+    changes = ["\n\n".join(chunk.render() for chunk in batch) for batch in batches]
+    return [
+        {
+            'old_branch': old_branch,
+            'new_branch': new_branch,
+            'specialist': specialist,
+            'focus': SPECIALISTS[specialist],
+            'part': part,
+            'parts': len(changes),
+            'changes': text,
+        }
+        for specialist in specialists
+        for part, text in enumerate(changes, start=1)
+    ]
+
+
+@traced('review')
+def make_specialist_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                           model: str = 'llama-3.1-70b-versatile',
+                           cache_path: str | Path | None = None,
+                           specialists: list[str] | None = None,
+                           diff_budget: int | None = None, max_concurrency: int = 8,
+                           llm: BaseChatModel | None = None) -> str:
+    """Review the changes between two branches by specialist reviewers in parallel.
+
+    Every specialist (security, performance, correctness, style by default) reviews the
+    same precomputed diffs by independent model calls running concurrently, so the review
+    takes about as long as the slowest call when `max_concurrency` covers all of them.
+    Findings are deduplicated across the specialists and merged into one report per file.
+    """
+    specialists = specialists or list(SPECIALISTS)
+    unknown = [name for name in specialists if name not in SPECIALISTS]
+    if unknown:
+        raise ValueError(f"Unknown specialists {unknown}, expected some of {list(SPECIALISTS)}")
+
+    llm = llm or get_llm(model)
+    blob_cache = BlobCache(cache_path) if cache_path else None
+    toolbox = GitTools(repo_path, blob_cache=blob_cache)
+    try:
+        inputs = specialist_inputs(toolbox, old_branch, new_branch, specialists,
+                                   diff_budget or get_diff_budget(model))
+        if not inputs:
+            return f"Branches `{old_branch}` and `{new_branch}` have the same content"
+
+        counter = RoundTripCounter()
+        answers = _create_specialist_chain(llm).batch(
+            inputs, config=run_config(counter, max_concurrency=max_concurrency))
+        logger.info(counter.report())
+
+        known_paths = {file_path for file_path, _ in toolbox.changed_files(old_branch, new_branch)}
+        findings = [finding for item, answer in zip(inputs, answers)
+                    for finding in parse_findings(answer, item['specialist'], known_paths)]
+        findings = dedupe_findings(findings)
+        return render_findings(findings) if findings else "No issues found."
+    finally:
+        toolbox.close()
+        if blob_cache is not None:
+            blob_cache.close()
@@ -0,0 +1,82 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+from langchain_core.language_models import BaseChatModel
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.simple_reviewer import (RoundTripCounter, create_file_review_chain,
+                                         file_review_inputs, get_llm, run_config)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileFinding:
+    file_path: str
+    change_type: str
+    text: str
+
+    def render(self) -> str:
+        return f"### {self.file_path} ({self.change_type})\n\n{self.text}"
+
+
+def stream_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                  model: str = 'llama-3.1-70b-versatile',
+                  cache_path: str | Path | None = None,
+                  max_concurrency: int = 4,
+                  llm: BaseChatModel | None = None) -> Iterator[FileFinding]:
+    """Review the changes between two branches, yielding findings per file.
+
+    Files are reviewed by parallel model calls and every finding is yielded as soon as its
+    call completes, so the first results are available long before the whole review is done.
+    A ready `llm` overrides `model`.
+    """
+    blob_cache = BlobCache(cache_path) if cache_path else None
+    toolbox = GitTools(repo_path, blob_cache=blob_cache)
+    try:
+        files = toolbox.changed_files(old_branch, new_branch)
+        if not files:
+            return
+
+        counter = RoundTripCounter()
+        chain = create_file_review_chain(llm or get_llm(model))
+        inputs = file_review_inputs(toolbox, old_branch, new_branch, files)
+        for i, text in chain.batch_as_completed(
+                inputs, config=run_config(counter, max_concurrency=max_concurrency)):
+            yield FileFinding(files[i][0], files[i][1], text)
+    finally:
+        # Also runs when the consumer stops early and the generator is closed
+        toolbox.close()
+        if blob_cache is not None:
+            blob_cache.close()
+    logger.info(counter.report())
+
+
+async def astream_review(repo_path: str | Path, old_branch: str, new_branch: str,
+                         model: str = 'llama-3.1-70b-versatile',
+                         cache_path: str | Path | None = None,
+                         max_concurrency: int = 4,
+                         llm: BaseChatModel | None = None) -> AsyncIterator[FileFinding]:
+    """Async counterpart of `stream_review`."""
+    blob_cache = BlobCache(cache_path) if cache_path else None
+    toolbox = GitTools(repo_path, blob_cache=blob_cache)
+    try:
+        files = await toolbox.run_blocking(toolbox.changed_files, old_branch, new_branch)
+        if not files:
+            return
+        inputs = await toolbox.run_blocking(file_review_inputs, toolbox, old_branch,
+                                            new_branch, files)
+    finally:
+        toolbox.close()
+        if blob_cache is not None:
+            blob_cache.close()
+
+    counter = RoundTripCounter()
+    chain = create_file_review_chain(llm or get_llm(model))
+    async for i, text in chain.abatch_as_completed(
+            inputs, config=run_config(counter, max_concurrency=max_concurrency)):
+        yield FileFinding(files[i][0], files[i][1], text)
+    logger.info(counter.report())
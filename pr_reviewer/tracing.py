@@ -0,0 +1,192 @@
+import functools
+import json
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from langchain_core.callbacks import BaseCallbackHandler
+
+_current_tracer: ContextVar['Tracer | None'] = ContextVar('current_tracer', default=None)
+_current_span: ContextVar['Span | None'] = ContextVar('current_span', default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+class Tracer:
+    """Collects spans of one review run: model calls, tool calls, tree walks and blob reads.
+
+    Instrumented code records spans only while the tracer is active (see `activate`),
+    otherwise the instrumentation costs a single context variable lookup.
+    """
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: str, parent: Span | None = None,
+                   **attributes: Any) -> Span:
+        parent = parent or _current_span.get()
+        return Span(name=name, kind=kind, trace_id=self.trace_id, span_id=secrets.token_hex(8),
+                    parent_id=parent.span_id if parent else None, start_ns=time.time_ns(),
+                    attributes=attributes)
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes: Any) -> Iterator[Span]:
+        span = self.start_span(name, kind, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span)
+
+    @contextmanager
+    def activate(self) -> Iterator['Tracer']:
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    def to_json(self) -> list[dict[str, Any]]:
+        return [asdict(span) | {'duration_ms': span.duration_ms} for span in self.spans]
+
+    def to_otlp(self, service_name: str = 'pr-reviewer') -> dict[str, Any]:
+        """Export spans in the OTLP/JSON format accepted by OpenTelemetry collectors."""
+        def attribute(key: str, value: Any) -> dict[str, Any]:
+            if isinstance(value, bool):
+                return {'key': key, 'value': {'boolValue': value}}
+            if isinstance(value, int):
+                return {'key': key, 'value': {'intValue': str(value)}}
+            if isinstance(value, float):
+                return {'key': key, 'value': {'doubleValue': value}}
+            return {'key': key, 'value': {'stringValue': str(value)}}
+
+        spans = [
+            {
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': span.parent_id or '',
+                'name': span.name,
+                'kind': 1,  # SPAN_KIND_INTERNAL
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [attribute('pr_reviewer.kind', span.kind)] + [
+                    attribute(f'pr_reviewer.{key}', value)
+                    for key, value in span.attributes.items()],
+                'status': {'code': 2} if 'error' in span.attributes else {},
+            }
+            for span in self.spans
+        ]
+        return {'resourceSpans': [{
+            'resource': {'attributes': [attribute('service.name', service_name)]},
+            'scopeSpans': [{'scope': {'name': 'pr_reviewer.tracing'}, 'spans': spans}],
+        }]}
+
+    def write_json(self, path: str | Path):
+        with open(path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def write_otlp(self, path: str | Path):
+        with open(path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_otlp(), f)
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Aggregate spans by kind and name."""
+        groups: dict[tuple[str, str], dict[str, Any]] = defaultdict(
+            lambda: {'count': 0, 'total_ms': 0.0, 'tokens_in': 0, 'tokens_out': 0, 'bytes': 0})
+        for span in self.spans:
+            group = groups[(span.kind, span.name)]
+            group['count'] += 1
+            group['total_ms'] += span.duration_ms
+            for key in ('tokens_in', 'tokens_out', 'bytes'):
+                group[key] += span.attributes.get(key, 0)
+        return [{'kind': kind, 'name': name, **group}
+                for (kind, name), group in sorted(groups.items(),
+                                                  key=lambda item: -item[1]['total_ms'])]
+
+    def summary_table(self) -> str:
+        header = (f"{'kind':<10} {'name':<26} {'count':>6} {'total ms':>10} {'avg ms':>9} "
+                  f"{'tok in':>8} {'tok out':>8} {'bytes':>10}")
+        rows = [header, '-' * len(header)]
+        for row in self.summary():
+            rows.append(f"{row['kind']:<10} {row['name'][:26]:<26} {row['count']:>6} "
+                        f"{row['total_ms']:>10.1f} {row['total_ms'] / row['count']:>9.1f} "
+                        f"{row['tokens_in']:>8} {row['tokens_out']:>8} {row['bytes']:>10}")
+        return "\n".join(rows)
+
+
+def get_tracer() -> Tracer | None:
+    return _current_tracer.get()
+
+
+@contextmanager
+def trace_span(name: str, kind: str, **attributes: Any) -> Iterator[Span | None]:
+    """Record a span in the active tracer, does nothing if tracing is off."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, kind, **attributes) as span:
+        yield span
+
+
+def traced(kind: str, name: str | None = None) -> Callable:
+    """Decorator recording a span for every call, string results are counted in bytes."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _current_tracer.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, kind) as span:
+                result = func(*args, **kwargs)
+                if isinstance(result, str):
+                    span.attributes['bytes'] = len(result.encode('utf-8'))
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def tracing_callbacks() -> list['BaseCallbackHandler']:
+    """Callbacks recording model calls into the active tracer, empty if tracing is off."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return []
+    # The handler depends on LangChain, the rest of the tracing is used by the git layer too
+    from pr_reviewer.llm_tracing import TracingCallbackHandler
+    return [TracingCallbackHandler(tracer)]
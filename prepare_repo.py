@@ -5,6 +5,8 @@ from dulwich import porcelain
 from dulwich.client import get_transport_and_path
 from dulwich.repo import Repo
 
+from pr_reviewer.git_tools.partial_fetch import partial_fetch
+
 
 def list_remote_branches(repo_url: str) -> list[str]:
     client, remote_path = get_transport_and_path(repo_url)
@@ -53,6 +55,29 @@ def clone_repo(repo_path: Path, repo_url: str, branches: list[str]):
     print("Cloning and branch setup completed.")
 
 
+def partial_sync_repo(repo_path: Path, repo_url: str, branches: list[str],
+                      base_branch: str | None, depth: int):
+    if repo_path.exists():
+        print(f"Repository already exists. Fetching new commits...")
+        repo = Repo(str(repo_path))
+    else:
+        print(f"Fetching branches and their history down to the merge-base...")
+        repo = Repo.init(str(repo_path), mkdir=True)
+
+    with repo:
+        stats = partial_fetch(repo, repo_url, branches, base_branch=base_branch, depth=depth)
+
+    for branch, merge_base in stats.merge_bases.items():
+        if merge_base is None:
+            print(f"Warning: no common history of {branch} with the base branch was found")
+    if not stats.rounds:
+        print("Branches are up to date, nothing was fetched.")
+    else:
+        print(f"Fetched {len(stats.branches)} branches in {stats.rounds} rounds "
+              f"({stats.packs} new packs, depth {stats.depth}"
+              f"{', shallow' if stats.shallow else ''}).")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Prepare a Git repository with specific branches.")
@@ -61,6 +86,14 @@ def main():
     parser.add_argument("-p", "--path", help="Local path for the repository")
     parser.add_argument("branches", nargs="*",
                         help="List of branches to download (empty for all branches)")
+    parser.add_argument("--partial", action="store_true",
+                        help="Fetch only the listed branches with the history down to their "
+                             "merge-base with the base branch")
+    parser.add_argument("--base",
+                        help="Base branch for --partial (default: main or master if listed)")
+    parser.add_argument("--depth", type=int, default=16,
+                        help="Initial history depth for --partial, deepened until the "
+                             "merge-base is found")
 
     args = parser.parse_args()
 
@@ -73,7 +106,9 @@ def main():
 
     repo_path = Path(args.path)
 
-    if repo_path.exists():
+    if args.partial:
+        partial_sync_repo(repo_path, args.repo, args.branches, args.base, args.depth)
+    elif repo_path.exists():
         sync_repo(repo_path, args.repo, args.branches)
     else:
         clone_repo(repo_path, args.repo, args.branches)
@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from pr_reviewer.benchmark.runner import find_regressions, find_slow_startup, run_benchmarks
+from pr_reviewer.benchmark.synthetic_repo import RepoSpec
+
+
+def initialize_arguments() -> argparse.Namespace:
+    defaults = RepoSpec()
+    parser = argparse.ArgumentParser(
+        description="Benchmark the git tools and the review loop on a synthetic repository "
+                    "with a scripted offline model.")
+    parser.add_argument("--files", type=int, default=defaults.files,
+                        help="Number of files in the base branch")
+    parser.add_argument("--depth", type=int, default=defaults.depth,
+                        help="Maximal directory depth")
+    parser.add_argument("--blob_size", type=int, default=defaults.blob_size,
+                        help="Approximate size of a file in bytes")
+    parser.add_argument("--changed_ratio", type=float, default=defaults.changed_ratio,
+                        help="Share of the files modified in the feature branch")
+    parser.add_argument("--seed", type=int, default=defaults.seed,
+                        help="Seed of the generator, the same seed gives the same repository")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of timed runs of every case")
+    parser.add_argument("-o", "--output", type=Path,
+                        help="JSON filename for storing the report (stdout by default)")
+    parser.add_argument("--baseline", type=Path,
+                        help="JSON report of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown of a median against the baseline (default: 0.2)")
+    return parser.parse_args()
+
+
+def main():
+    args = initialize_arguments()
+    if args.baseline and not args.baseline.is_file():
+        print(f"Error: The baseline '{args.baseline}' does not exist.")
+        sys.exit(1)
+
+    spec = RepoSpec(files=args.files, depth=args.depth, blob_size=args.blob_size,
+                    changed_ratio=args.changed_ratio, seed=args.seed)
+    report = run_benchmarks(spec, repeat=args.repeat)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text, encoding='utf-8')
+    else:
+        print(text)
+
+    failed = False
+    slow_startup = find_slow_startup(report)
+    if slow_startup:
+        print("Start-up over the budget:", *slow_startup, sep="\n", file=sys.stderr)
+        failed = True
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get('params') != report['params']:
+            print("Warning: the baseline was measured with different parameters",
+                  file=sys.stderr)
+        regressions = find_regressions(report, baseline, threshold=args.threshold)
+        if regressions:
+            print("Regressions against the baseline:", *regressions, sep="\n", file=sys.stderr)
+            failed = True
+        else:
+            print("No regressions against the baseline", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import functools
+import sys
+from pathlib import Path
+
+from pr_reviewer.review_options import DEFAULT_MODEL, configure_logging
+
+
+def initialize_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run the reviewer as a long-lived service with a job queue and warm "
+                    "repositories and model clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Number of reviews running at the same time")
+    parser.add_argument("-m", "--model", default=DEFAULT_MODEL,
+                        help="Model for jobs without the `model` key")
+    parser.add_argument("--warm_model", action="append", default=[],
+                        help="Create the client of the model at start-up (repeatable)")
+    parser.add_argument("--max_repos", type=int, default=16,
+                        help="Maximum number of idle opened repositories kept warm")
+    parser.add_argument("--max_queue", type=int, default=0,
+                        help="Maximum number of queued jobs, further jobs are rejected with "
+                             "503 (default: unlimited)")
+    parser.add_argument("-c", "--cache", type=Path,
+                        help="Path to the on-disk cache of decoded files and rendered diffs")
+    parser.add_argument("--llm_cache", type=Path,
+                        help="Path to the on-disk cache of model responses")
+    parser.add_argument("--llm_cache_ttl", type=float, default=7 * 24 * 3600,
+                        help="Lifetime of cached model responses in seconds (default: 7 days)")
+    parser.add_argument("--fallback_model", action="append", default=[],
+                        help="Model to call when a model keeps failing, e.g. on rate "
+                             "limits (repeatable, tried in order)")
+    parser.add_argument("--rate_limit", action="append", default=[],
+                        help="Requests per minute of a provider or a model, e.g. groq=30 or "
+                             "openai/gpt-4o=500 (repeatable)")
+    parser.add_argument("--max_retries", type=int, default=4,
+                        help="Retries of a failed model call before the fallback model is used")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    return parser.parse_args()
+
+
+def main():
+    args = initialize_arguments()
+
+    # LangChain and the provider SDKs are imported only after the arguments are parsed
+    from dotenv import load_dotenv
+
+    from pr_reviewer.llm_cache import enable_llm_cache
+    from pr_reviewer.resilient_llm import (RateLimits, RetryPolicy, get_resilient_llm,
+                                           parse_rate_limits)
+    from pr_reviewer.review_service import ReviewHTTPServer, ReviewService
+
+    try:
+        rate_limits = RateLimits(parse_rate_limits(args.rate_limit))
+    except ValueError as e:
+        print(f"Error: {e}.")
+        sys.exit(1)
+
+    load_dotenv()
+    configure_logging()
+    if args.llm_cache:
+        enable_llm_cache(args.llm_cache, ttl=args.llm_cache_ttl)
+
+    # Clients of all models share the rate limits of the process
+    llm_factory = functools.partial(get_resilient_llm, fallback_models=args.fallback_model,
+                                    rate_limits=rate_limits,
+                                    policy=RetryPolicy(max_retries=args.max_retries))
+    service = ReviewService(workers=args.workers, cache_path=args.cache,
+                            max_repos=args.max_repos, max_queue=args.max_queue,
+                            llm_factory=llm_factory)
+    service.start(warm_models=[args.model, *args.warm_model])
+    server = ReviewHTTPServer(service, args.host, args.port, default_model=args.model,
+                              verbose=args.verbose)
+    print(f"Review service is listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping, waiting for the queued reviews")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import pytest
+from dulwich.objects import Blob, Commit, Tree
+from dulwich.repo import Repo
+
+
+def commit_files(repo: Repo, files: dict[str, bytes], parents: list[bytes] | None = None,
+                 message: bytes = b'commit', commit_time: int = 1700000000,
+                 gitlinks: dict[str, bytes] | None = None,
+                 modes: dict[str, int] | None = None) -> bytes:
+    """Store `files` (path -> content) and submodule `gitlinks` (path -> commit SHA) as a new
+    commit and return its SHA. Files are 0o100644 unless listed in `modes`."""
+    trees: dict[str, Tree] = {'': Tree()}
+    entries = {}
+    for file_path in sorted(files):
+        blob = Blob.from_string(files[file_path])
+        repo.object_store.add_object(blob)
+        entries[file_path] = ((modes or {}).get(file_path, 0o100644), blob.id)
+    for file_path, sha in (gitlinks or {}).items():
+        entries[file_path] = (0o160000, sha)
+    for file_path, (mode, sha) in sorted(entries.items()):
+        *dirs, fn = file_path.split('/')
+        for i in range(len(dirs)):
+            trees.setdefault('/'.join(dirs[:i + 1]), Tree())
+        trees['/'.join(dirs)].add(fn.encode(), mode, sha)
+
+    # Store subtrees bottom-up so parents get the final SHAs of their children
+    for dir_path in sorted(trees, key=lambda p: p.count('/') if p else -1, reverse=True):
+        if not dir_path:
+            continue
+        repo.object_store.add_object(trees[dir_path])
+        parent_path, _, name = dir_path.rpartition('/')
+        trees[parent_path].add(name.encode(), 0o040000, trees[dir_path].id)
+    repo.object_store.add_object(trees[''])
+
+    commit = Commit()
+    commit.tree = trees[''].id
+    commit.parents = parents or []
+    commit.author = commit.committer = b'Test <test@example.com>'
+    commit.author_time = commit.commit_time = commit_time
+    commit.author_timezone = commit.commit_timezone = 0
+    commit.encoding = b'UTF-8'
+    commit.message = message
+    repo.object_store.add_object(commit)
+    return commit.id
+
+
+BASE_FILES = {
+    'README.md': b'# Sample\n',
+    'file_to_modify.txt': b'Row to keep\nRow to deletion\nRow to change\n',
+    'file_to_delete.txt': b'Obsolete\n',
+    'src/pkg/module.py': b'def answer():\n    return 41\n',
+}
+
+FEATURE_FILES = {
+    'README.md': b'# Sample\n',
+    'file_to_modify.txt': b'Row to keep\nRow changed\nAnd added row\n',
+    'file_to_add.txt': b'This file was added\n',
+    'src/pkg/module.py': b'def answer():\n    return 42\n',
+}
+
+
+@pytest.fixture
+def local_repo(tmp_path: Path) -> Path:
+    """Offline repository with `main` and `test` branches differing in several files."""
+    repo_path = tmp_path / 'repo'
+    repo = Repo.init(str(repo_path), mkdir=True)
+    base = commit_files(repo, BASE_FILES, message=b'base')
+    feature = commit_files(repo, FEATURE_FILES, parents=[base], message=b'feature',
+                           commit_time=1700000100)
+    repo.refs[b'refs/heads/main'] = base
+    repo.refs[b'refs/heads/test'] = feature
+    repo.close()
+    return repo_path
+
+
+@pytest.fixture
+def submodule_repo(local_repo: Path) -> Path:
+    """`local_repo` with a `bump` branch adding a submodule and `test` files to `main`."""
+    repo = Repo(str(local_repo))
+    base = repo.refs[b'refs/heads/main']
+    repo.refs[b'refs/heads/bump'] = commit_files(
+        repo, FEATURE_FILES, parents=[base], commit_time=1700000200,
+        gitlinks={'libs/core': b'a' * 40})
+    repo.close()
+    return local_repo
+
+
+@pytest.fixture
+def closed(monkeypatch) -> list[str]:
+    """Names of the `GitTools` and `BlobCache` classes in the order their instances are
+    closed, the instances are still closed."""
+    from pr_reviewer.git_tools.blob_cache import BlobCache
+    from pr_reviewer.git_tools.git_tools import GitTools
+
+    names = []
+    for cls in (GitTools, BlobCache):
+        def close(self, close=cls.close, name=cls.__name__):
+            names.append(name)
+            close(self)
+        monkeypatch.setattr(cls, 'close', close)
+    return names
@@ -0,0 +1,63 @@
+from pr_reviewer.benchmark.runner import benchmark_repo, find_regressions, find_slow_startup
+from pr_reviewer.benchmark.stub_llm import ScriptedReviewModel
+from pr_reviewer.benchmark.synthetic_repo import RepoSpec, create_synthetic_repo
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.simple_reviewer import make_review
+
+
+def test_synthetic_repo_has_requested_shape(tmp_path):
+    spec = RepoSpec(files=50, depth=2, changed_ratio=0.2, added_ratio=0.1, deleted_ratio=0.1)
+    shape = create_synthetic_repo(tmp_path / 'repo', spec)
+
+    assert shape == {'changed': 10, 'added': 5, 'deleted': 5}
+    changes = GitTools(str(tmp_path / 'repo')).changed_files('main', 'feature')
+    assert sorted(change_type for _, change_type in changes) == \
+        ['add'] * 5 + ['delete'] * 5 + ['modify'] * 10
+    assert all(path.count('/') <= 2 for path, _ in changes)
+
+
+def test_synthetic_repo_is_deterministic(tmp_path):
+    spec = RepoSpec(files=20)
+    create_synthetic_repo(tmp_path / 'first', spec)
+    create_synthetic_repo(tmp_path / 'second', spec)
+
+    assert GitTools(str(tmp_path / 'first')).get_tree_sha('feature') == \
+        GitTools(str(tmp_path / 'second')).get_tree_sha('feature')
+
+
+def test_scripted_model_drives_agent_review(tmp_path):
+    create_synthetic_repo(tmp_path / 'repo', RepoSpec(files=20, changed_ratio=0.2))
+
+    review = make_review(str(tmp_path / 'repo'), 'main', 'feature', llm=ScriptedReviewModel())
+    assert review == "Reviewed 4 files."
+
+    review = make_review(str(tmp_path / 'repo'), 'main', 'feature', mode='prefetch',
+                         llm=ScriptedReviewModel())
+    assert review == "Reviewed the prefetched changes."
+
+
+def test_benchmark_repo_reports_all_cases(tmp_path):
+    create_synthetic_repo(tmp_path / 'repo', RepoSpec(files=10))
+
+    results = benchmark_repo(tmp_path / 'repo', repeat=1)
+    assert {'diff_between_branches_cold', 'diff_between_branches_warm',
+            'review_agent', 'review_prefetch'} <= results.keys()
+    assert all(timing['median_ms'] >= timing['min_ms'] > 0 for timing in results.values())
+
+
+def test_find_regressions():
+    baseline = {'results': {'fast': {'median_ms': 10.0}, 'slow': {'median_ms': 10.0}}}
+    report = {'results': {'fast': {'median_ms': 11.0}, 'slow': {'median_ms': 13.0},
+                          'new': {'median_ms': 5.0}}}
+
+    regressions = find_regressions(report, baseline, threshold=0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('slow: 10.00ms -> 13.00ms')
+
+
+def test_find_slow_startup():
+    report = {'results': {'import_make_review_help': {'median_ms': 600.0},
+                          'import_git_tools_only': {'median_ms': 150.0},
+                          'review_agent': {'median_ms': 900.0}}}
+
+    assert find_slow_startup(report, budget_ms=500) == ['import_make_review_help: 600.00ms > 500ms']
@@ -0,0 +1,23 @@
+import pytest
+
+from pr_reviewer.benchmark.import_time import HEAVY_PACKAGES, parse_importtime, startup_profiles
+
+
+def test_parse_importtime():
+    profile = parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   dulwich.objects\n"
+        "import time:       500 |       1500 | dulwich\n"
+        "import time:       200 |        200 | json\n")
+
+    assert profile.total_ms == 1.7
+    assert profile.modules['dulwich.objects'] == 0.1
+    assert profile.imported('dulwich') and not profile.imported('dul')
+
+
+@pytest.mark.parametrize('case', ['make_review_help', 'git_tools_only'])
+def test_startup_skips_langchain(local_repo, case):
+    profile = startup_profiles(local_repo)[case]
+
+    # The time itself depends on the machine, run_benchmark.py checks it against the budget
+    assert [package for package in HEAVY_PACKAGES if profile.imported(package)] == []
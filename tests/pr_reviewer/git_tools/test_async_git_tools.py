@@ -0,0 +1,35 @@
+import asyncio
+
+from pr_reviewer.git_tools.git_tools import GitTools
+
+
+def test_async_methods_match_sync(local_repo):
+    git_tools = GitTools(local_repo)
+
+    async def run():
+        return await asyncio.gather(
+            git_tools.alist_branches(),
+            git_tools.adiff_between_branches("main", "test"),
+            git_tools.adiff_file_content("main", "test", "file_to_modify.txt"),
+            git_tools.aget_file_content("test", "file_to_add.txt"),
+        )
+
+    try:
+        branches, diff, file_diff, content = asyncio.run(run())
+        assert branches == git_tools.list_branches()
+        assert diff == git_tools.diff_between_branches("main", "test")
+        assert file_diff == git_tools.diff_file_content("main", "test", "file_to_modify.txt")
+        assert content == git_tools.get_file_content("test", "file_to_add.txt")
+    finally:
+        git_tools.close()
+
+
+def test_tools_support_ainvoke(local_repo):
+    git_tools = GitTools(local_repo)
+    tools = {t.name: t for t in git_tools.get_tools()}
+    try:
+        diff = asyncio.run(tools["diff_file_content"].ainvoke(
+            {"base_branch": "main", "feature_branch": "test", "file_path": "file_to_add.txt"}))
+        assert "added" in diff
+    finally:
+        git_tools.close()
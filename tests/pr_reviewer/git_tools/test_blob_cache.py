@@ -0,0 +1,109 @@
+import gc
+
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.blob_cache import BlobCache
+from pr_reviewer.git_tools.git_tools import GitTools
+from tests.conftest import commit_files
+
+
+def test_blob_cache_roundtrip(tmp_path):
+    cache = BlobCache(tmp_path / "cache.sqlite")
+    key = BlobCache.make_key("diff", b"a" * 40, b"b" * 40, "x.py|x.py")
+    assert cache.get(key) is None
+    cache.put(key, "diff text")
+    assert cache.get(key) == "diff text"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_blob_cache_lru_eviction(tmp_path):
+    cache = BlobCache(tmp_path / "cache.sqlite", max_bytes=10)
+    cache.put("first", "aaaa")
+    cache.put("second", "bbbb")
+    cache.get("first")
+    cache.put("third", "cccc")
+
+    assert cache.get("second") is None
+    assert cache.get("first") == "aaaa"
+    assert cache.get("third") == "cccc"
+    assert cache.total_bytes() <= 10
+
+
+def test_blob_cache_tracks_total_size(tmp_path):
+    first = BlobCache(tmp_path / "cache.sqlite", max_bytes=100)
+    second = BlobCache(tmp_path / "cache.sqlite", max_bytes=100)
+    first.put("key", "aaaa")
+    second.put("key", "bbbbbb")
+    second.put("other", "cc")
+    assert first.total_bytes() == second.total_bytes() == 8
+    first.clear()
+    assert second.total_bytes() == 0
+
+
+def test_blob_cache_batches_access_times(tmp_path):
+    cache = BlobCache(tmp_path / "cache.sqlite", touch_batch=3)
+    cache.put("key", "value")
+    cache._conn.execute("UPDATE entries SET accessed = 0")
+    accessed = "SELECT accessed FROM entries WHERE key = 'key'"
+
+    cache.get("key")
+    cache.get("key")
+    assert cache._conn.execute(accessed).fetchone()[0] == 0
+    # Written with the next put
+    cache.put("other", "value")
+    assert cache._conn.execute(accessed).fetchone()[0] > 0
+
+
+def test_unclosed_blob_cache_writes_access_times(tmp_path):
+    cache = BlobCache(tmp_path / "cache.sqlite")
+    cache.put("key", "value")
+    cache._conn.execute("UPDATE entries SET accessed = 0")
+    cache.get("key")
+    del cache
+    gc.collect()
+
+    other = BlobCache(tmp_path / "cache.sqlite")
+    assert other._conn.execute("SELECT accessed FROM entries").fetchone()[0] > 0
+    other.close()
+    other.close()
+
+
+def test_blob_cache_shared_between_instances(tmp_path):
+    first = BlobCache(tmp_path / "cache.sqlite")
+    second = BlobCache(tmp_path / "cache.sqlite")
+    first.put("key", "value")
+    assert second.get("key") == "value"
+
+
+def test_git_tools_reuses_cached_diffs(local_repo, tmp_path):
+    cache_path = tmp_path / "cache.sqlite"
+    first_run = GitTools(local_repo, blob_cache=BlobCache(cache_path))
+    diff = first_run.diff_file_content("main", "test", "file_to_modify.txt")
+    content = first_run.get_file_content("test", "file_to_add.txt")
+
+    cache = BlobCache(cache_path)
+    second_run = GitTools(local_repo, blob_cache=cache)
+    assert second_run.diff_file_content("main", "test", "file_to_modify.txt") == diff
+    assert second_run.get_file_content("test", "file_to_add.txt") == content
+    assert cache.misses == 0
+    assert cache.hits == 2
+
+
+def test_cached_diffs_depend_on_file_modes(tmp_path):
+    cache_path = tmp_path / "cache.sqlite"
+    diffs = []
+    for name, new_mode in [('same_mode', 0o100644), ('executable', 0o100755)]:
+        repo = Repo.init(str(tmp_path / name), mkdir=True)
+        base = commit_files(repo, {'run.sh': b'echo a\n'})
+        feature = commit_files(repo, {'run.sh': b'echo b\n'}, parents=[base],
+                               modes={'run.sh': new_mode})
+        repo.refs[b'refs/heads/main'] = base
+        repo.refs[b'refs/heads/feature'] = feature
+        repo.close()
+        git_tools = GitTools(tmp_path / name, blob_cache=BlobCache(cache_path))
+        diffs.append(git_tools.diff_file_content("main", "feature", "run.sh"))
+        git_tools.close()
+
+    assert "new file mode" not in diffs[0] and "old mode" not in diffs[0]
+    assert "100755" in diffs[1]
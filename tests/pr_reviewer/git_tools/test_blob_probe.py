@@ -0,0 +1,69 @@
+import shutil
+import subprocess
+
+import pytest
+from dulwich.object_store import DiskObjectStore
+from dulwich.objects import Blob
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.blob_probe import probe_blob
+from pr_reviewer.git_tools.diff_filter import DiffFilter
+from pr_reviewer.git_tools.git_tools import GitTools
+from tests.conftest import commit_files
+
+BIG = b''.join(b'line %d of a large generated module\n' % i for i in range(20000))
+
+
+@pytest.fixture
+def big_repo(tmp_path):
+    repo = Repo.init(str(tmp_path / 'big'), mkdir=True)
+    base = commit_files(repo, {'big.py': BIG, 'app.py': b'x = 1\n'})
+    feature = commit_files(repo, {'big.py': BIG + b'one more line\n', 'app.py': b'x = 2\n'},
+                           parents=[base])
+    repo.refs[b'refs/heads/main'] = base
+    repo.refs[b'refs/heads/feature'] = feature
+    repo.close()
+    return tmp_path / 'big'
+
+
+def _blobs(repo: Repo) -> list[Blob]:
+    return [obj for obj in (repo[sha] for sha in repo.object_store) if isinstance(obj, Blob)]
+
+
+def _check_probes(repo: Repo):
+    for blob in _blobs(repo):
+        size, read_head = probe_blob(repo.object_store, blob.id, 100)
+        assert size == len(blob.data)
+        assert read_head() == blob.data[:100]
+
+
+def test_probe_loose_objects(big_repo):
+    with Repo(str(big_repo)) as repo:
+        _check_probes(repo)
+
+
+@pytest.mark.skipif(shutil.which('git') is None, reason="packs with deltas are made by git")
+def test_probe_packed_and_deltified_objects(big_repo):
+    subprocess.run(['git', 'gc', '--aggressive', '-q'], cwd=big_repo, check=True)
+    with Repo(str(big_repo)) as repo:
+        assert not list(repo.object_store._iter_loose_objects())
+        deltas = [obj for pack in repo.object_store.packs for obj in pack.iter_unpacked()
+                  if obj.delta_base is not None]
+        assert deltas
+        _check_probes(repo)
+
+
+def test_filter_does_not_read_large_blobs(big_repo, monkeypatch):
+    git_tools = GitTools(big_repo, diff_filter=DiffFilter(max_size=1024))
+    read = []
+    get_object = DiskObjectStore.__getitem__
+    monkeypatch.setattr(DiskObjectStore, '__getitem__',
+                        lambda store, sha: read.append(sha) or get_object(store, sha))
+
+    excluded = git_tools.excluded_files('main', 'feature')
+
+    assert [(file.path, file.reason, file.old_size) for file in excluded] == \
+           [('big.py', "larger than 1024 bytes", len(BIG))]
+    blobs = {Blob.from_string(data).id for data in (BIG, BIG + b'one more line\n',
+                                                    b'x = 1\n', b'x = 2\n')}
+    assert not blobs & set(read)
@@ -0,0 +1,54 @@
+from pr_reviewer.git_tools.git_tools import GitTools
+
+
+def test_change_set_walks_trees_once(local_repo):
+    git_tools = GitTools(local_repo)
+    git_tools.diff_between_branches("main", "test")
+    git_tools.diff_file_content("main", "test", "file_to_modify.txt")
+    git_tools.diff_file_content("main", "test", "src/pkg/module.py")
+
+    assert git_tools.change_cache.misses == 1
+    assert git_tools.change_cache.hits == 2
+
+
+def test_change_set_indexed_by_path(local_repo):
+    git_tools = GitTools(local_repo)
+    change_set = git_tools._get_change_set("main", "test")
+
+    assert change_set.get("file_to_modify.txt").type == "modify"
+    assert change_set.get("file_to_add.txt").type == "add"
+    assert change_set.get("file_to_delete.txt").type == "delete"
+    assert change_set.get("README.md") is None
+
+
+def test_diff_file_content_for_deleted_file(local_repo):
+    git_tools = GitTools(local_repo)
+    assert git_tools.diff_file_content("main", "test", "file_to_delete.txt") == "-Obsolete"
+    assert "No changes found" in git_tools.diff_file_content("main", "test", "README.md")
+
+
+def test_get_file_content_uses_change_set(local_repo):
+    git_tools = GitTools(local_repo)
+    git_tools.diff_between_branches("main", "test")
+
+    assert "return 42" in git_tools.get_file_content("test", "src/pkg/module.py")
+    assert "return 41" in git_tools.get_file_content("main", "src/pkg/module.py")
+    assert "not found" in git_tools.get_file_content("main", "file_to_add.txt")
+
+
+def test_change_cache_eviction(local_repo):
+    git_tools = GitTools(local_repo, change_cache_size=1)
+    git_tools.diff_between_branches("main", "test")
+    git_tools.diff_between_branches("test", "main")
+    git_tools.diff_between_branches("main", "test")
+
+    assert git_tools.change_cache.stats() == {'hits': 0, 'misses': 3, 'size': 1, 'max_size': 1}
+
+
+def test_diffs_of_submodules(submodule_repo):
+    git_tools = GitTools(submodule_repo)
+    assert git_tools.diff_file_content('main', 'bump', 'libs/core') == \
+           f"+Subproject commit {'a' * 40}"
+    diffs = {path: diff for path, _, diff in git_tools.iter_file_diffs('main', 'bump')}
+    assert len(diffs) == 5 and diffs['libs/core'].startswith("+Subproject commit")
+    assert 'libs/core' in {file.path for file in git_tools.diff_stats('main', 'bump').files}
@@ -0,0 +1,63 @@
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.diff_filter import DiffFilter
+from pr_reviewer.git_tools.git_tools import GitTools
+from tests.conftest import commit_files
+
+
+@pytest.fixture
+def noisy_repo(tmp_path):
+    repo_path = tmp_path / 'noisy'
+    repo = Repo.init(str(repo_path), mkdir=True)
+    base = commit_files(repo, {'app.py': b'x = 1\n', 'poetry.lock': b'[[package]]\n'})
+    feature = commit_files(repo, {
+        'app.py': b'x = 2\n',
+        'poetry.lock': b'[[package]]\nname = "dulwich"\n',
+        'logo.png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+        'api/service_pb2.py': b'# Generated by the protocol buffer compiler.\n',
+        'api/client.py': b'# Code generated by tool. DO NOT EDIT.\nimport api\n',
+        'vendor/lib/util.py': b'def util():\n    pass\n',
+        'data.csv': b'a,b\n' * 100,
+    }, parents=[base])
+    repo.refs[b'refs/heads/main'] = base
+    repo.refs[b'refs/heads/feature'] = feature
+    repo.close()
+    return repo_path
+
+
+def test_filter_rules():
+    diff_filter = DiffFilter(max_size=100)
+    assert diff_filter.check('poetry.lock', []) == "matches '*.lock'"
+    assert diff_filter.check('src/vendor/x.py', []) == "matches '*/vendor/*'"
+    assert diff_filter.check('app.py', [b'\x00\x01']) == "binary"
+    assert diff_filter.check('gen.go', [b'// Code generated by stringer\n']) == "generated"
+    assert diff_filter.check('big.txt', [b'a' * 101]) == "larger than 100 bytes"
+    assert diff_filter.check('app.py', [b'print(1)\n']) is None
+
+
+def test_excluded_files_are_listed_with_stats(noisy_repo):
+    git_tools = GitTools(noisy_repo, diff_filter=DiffFilter(max_size=200))
+
+    assert git_tools.changed_files("main", "feature") == [("app.py", "modify")]
+    excluded = {file.path: file for file in git_tools.excluded_files("main", "feature")}
+    assert excluded.keys() == {'poetry.lock', 'logo.png', 'api/service_pb2.py',
+                               'api/client.py', 'vendor/lib/util.py', 'data.csv'}
+    assert excluded['logo.png'].reason == "binary"
+    assert excluded['logo.png'].new_size == 16
+    assert excluded['api/client.py'].reason == "generated"
+
+    diff = git_tools.diff_between_branches("main", "feature")
+    assert "Type: modify, Old: app.py, New: app.py" in diff
+    assert "- logo.png (add, binary, none -> 16 bytes)" in diff
+
+
+def test_diff_of_excluded_binary_file_does_not_fail(noisy_repo):
+    git_tools = GitTools(noisy_repo)
+    assert "excluded" in git_tools.diff_file_content("main", "feature", "logo.png")
+
+
+def test_keep_all_filter(noisy_repo):
+    git_tools = GitTools(noisy_repo, diff_filter=DiffFilter.keep_all())
+    assert len(git_tools.changed_files("main", "feature")) == 7
+    assert git_tools.excluded_files("main", "feature") == []
@@ -0,0 +1,101 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.diff_filter import DiffFilter
+from pr_reviewer.git_tools.diff_stats import assign_shards, count_changed_lines, language_of
+from pr_reviewer.git_tools.git_tools import GitTools
+from tests.conftest import BASE_FILES, commit_files
+
+ROOT = Path(__file__).parents[3]
+
+
+@pytest.fixture
+def stats_repo(local_repo):
+    # Two more PRs forked from main: one shares a changed file with `test`, one adds a binary
+    repo = Repo(str(local_repo))
+    base = repo.refs[b'refs/heads/main']
+    repo.refs[b'refs/heads/fix'] = commit_files(
+        repo, {**BASE_FILES, 'src/pkg/module.py': b'def answer():\n    return 42\n'},
+        parents=[base])
+    repo.refs[b'refs/heads/logo'] = commit_files(
+        repo, {**BASE_FILES, 'logo.png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR',
+               'Dockerfile': b'FROM python:3.12\nCOPY . .\n'}, parents=[base])
+    repo.close()
+    return local_repo
+
+
+def test_count_changed_lines():
+    assert count_changed_lines([b'a', b'b', b'c'], [b'a', b'x', b'y', b'c']) == (2, 1)
+    assert count_changed_lines([], [b'a', b'b']) == (2, 0)
+    assert count_changed_lines([b'a', b'b'], [b'a', b'b']) == (0, 0)
+    assert count_changed_lines([b'a', b'a'], [b'a']) == (0, 1)
+    # Long changes are matched as multisets
+    old = [str(i).encode() for i in range(100)]
+    new = old[50:] + old[:50] + [b'x']
+    assert count_changed_lines(old, new, exact_limit=10) == (1, 0)
+    assert count_changed_lines(old, new) == (51, 50)
+
+
+def test_language_of():
+    assert language_of('src/pkg/module.py') == 'Python'
+    assert language_of('web/App.TSX') == 'TypeScript'
+    assert language_of('docker/Dockerfile') == 'Dockerfile'
+    assert language_of('LICENSE') == 'Other'
+
+
+def test_diff_stats(stats_repo):
+    git_tools = GitTools(stats_repo)
+
+    stats = git_tools.diff_stats('main', 'test')
+
+    counts = {file.path: (file.change_type, file.added, file.removed) for file in stats.files}
+    assert counts == {'file_to_add.txt': ('add', 1, 0),
+                      'file_to_delete.txt': ('delete', 0, 1),
+                      'file_to_modify.txt': ('modify', 2, 2),
+                      'src/pkg/module.py': ('modify', 1, 1)}
+    assert (stats.added, stats.removed) == (4, 4)
+    assert stats.languages() == {'Text': 6, 'Python': 2}
+    # The module change of `fix` is the same pair of blobs, so it is counted once
+    assert git_tools.diff_stats('main', 'fix').added == 1
+    assert git_tools.line_stats.counts == 4
+
+    logo = git_tools.diff_stats('main', 'logo')
+    assert [file.path for file in logo.files] == ['Dockerfile'] and logo.excluded == 1
+    logo = GitTools(stats_repo, diff_filter=DiffFilter.keep_all()).diff_stats('main', 'logo')
+    assert [(file.path, file.binary) for file in logo.files] == [('Dockerfile', False),
+                                                                ('logo.png', True)]
+
+
+def test_assign_shards():
+    costs = [10, 1, 7, 3, 0]
+    shards = assign_shards(costs, 2)
+    assert sorted(sum(cost for cost, shard in zip(costs, shards) if shard == n)
+                  for n in range(2)) == [10, 11]
+    assert assign_shards([], 3) == []
+
+
+def test_cli(stats_repo, tmp_path):
+    manifest = tmp_path / 'prs.jsonl'
+    not_a_repo = tmp_path / 'not_a_repo'
+    not_a_repo.mkdir()
+    manifest.write_text("\n".join(json.dumps(
+        {'path': str(path), 'source_branch': branch, 'destination_branch': 'main',
+         'id': branch}) for path, branch in [(stats_repo, 'fix'), (stats_repo, 'test'),
+                                             (stats_repo, 'missing'), (not_a_repo, 'other')]))
+
+    result = subprocess.run([sys.executable, str(ROOT / 'make_diff_stats.py'), str(manifest),
+                             '--sort', '--shards', '2'],
+                            capture_output=True, text=True, cwd=ROOT, check=True)
+
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [record['id'] for record in records] == ['test', 'fix', 'missing', 'other']
+    assert records[0]['files_changed'] == 4 and 'files' not in records[0]
+    assert records[0]['shard'] != records[1]['shard']
+    assert records[2]['error'] == "Unknown branch main or missing"
+    assert records[3]['error'].startswith("NotGitRepository")
+    assert "Counted 4 PRs from 2 repositories" in result.stderr
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from dulwich.objects import Commit, Tree
+from dulwich.repo import MemoryRepo, Repo
+
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.git_tools.merge_base import AncestryIndex
+from tests.conftest import commit_files
+
+
+@pytest.fixture
+def diverged_repo(tmp_path):
+    """`main` moved ahead with its own changes after `feature` was forked from it."""
+    repo_path = tmp_path / 'diverged'
+    repo = Repo.init(str(repo_path), mkdir=True)
+    fork = commit_files(repo, {'app.py': b'x = 1\n', 'docs.md': b'v1\n'}, message=b'fork')
+    feature = commit_files(repo, {'app.py': b'x = 2\n', 'docs.md': b'v1\n'}, parents=[fork])
+    main = fork
+    main_files = {'app.py': b'x = 1\n'}
+    for i in range(3):
+        main_files.update({'docs.md': f'v{i + 2}\n'.encode(), f'upstream_{i}.py': b'pass\n'})
+        main = commit_files(repo, main_files, parents=[main])
+    repo.refs[b'refs/heads/main'] = main
+    repo.refs[b'refs/heads/feature'] = feature
+    repo.close()
+    return repo_path, fork
+
+
+def test_diff_from_merge_base(diverged_repo):
+    repo_path, fork = diverged_repo
+    git_tools = GitTools(repo_path)
+
+    assert git_tools.merge_base("main", "feature") == fork.decode()
+    assert git_tools.changed_files("main", "feature") == [("app.py", "modify")]
+
+
+def test_tip_to_tip_diff(diverged_repo):
+    repo_path, _ = diverged_repo
+    git_tools = GitTools(repo_path, use_merge_base=False)
+
+    assert len(git_tools.changed_files("main", "feature")) == 5
+
+
+def test_criss_cross_merge_bases(tmp_path):
+    repo = Repo.init(str(tmp_path / 'criss'), mkdir=True)
+    root = commit_files(repo, {'f': b'0'})
+    a = commit_files(repo, {'f': b'a'}, parents=[root])
+    b = commit_files(repo, {'f': b'b'}, parents=[root])
+    a_merge = commit_files(repo, {'f': b'ab'}, parents=[a, b])
+    b_merge = commit_files(repo, {'f': b'ba'}, parents=[b, a])
+    a_tip = commit_files(repo, {'f': b'a2'}, parents=[a_merge])
+
+    index = AncestryIndex(repo.object_store)
+    assert set(index.merge_bases(a_tip, b_merge)) == {a, b}
+    assert index.merge_base(a_tip, a_merge) == a_merge
+    assert index.is_ancestor(root, a_tip)
+    assert not index.is_ancestor(b_merge, a_tip)
+
+
+def test_unrelated_histories_fall_back_to_tips(tmp_path):
+    repo_path = tmp_path / 'unrelated'
+    repo = Repo.init(str(repo_path), mkdir=True)
+    repo.refs[b'refs/heads/main'] = commit_files(repo, {'f': b'main\n'})
+    repo.refs[b'refs/heads/feature'] = commit_files(repo, {'f': b'feature\n'})
+    repo.close()
+
+    git_tools = GitTools(repo_path)
+    assert git_tools.merge_base("main", "feature") is None
+    assert git_tools.changed_files("main", "feature") == [("f", "modify")]
+
+
+def _linear_history(repo: Repo, commits: int, parent: bytes | None = None,
+                    start_time: int = 1600000000) -> list[bytes]:
+    # Commits share one tree, so a deep history is quick to build
+    tree = Tree()
+    repo.object_store.add_object(tree)
+    history = []
+    for i in range(commits):
+        commit = Commit()
+        commit.tree = tree.id
+        commit.parents = [parent] if parent else []
+        commit.author = commit.committer = b'Test <test@example.com>'
+        commit.author_time = commit.commit_time = start_time + i
+        commit.author_timezone = commit.commit_timezone = 0
+        commit.message = str(i).encode()
+        repo.object_store.add_object(commit)
+        parent = commit.id
+        history.append(commit.id)
+    return history
+
+
+def test_deep_history_walk_stops_at_fork_point():
+    repo = MemoryRepo()
+    history = _linear_history(repo, 30000)
+    feature = _linear_history(repo, 1, parent=history[-2], start_time=1700000000)[0]
+    index = AncestryIndex(repo.object_store)
+
+    start = time.perf_counter()
+    assert index.merge_base(history[-1], feature) == history[-2]
+    elapsed = time.perf_counter() - start
+
+    # Only the tips and the fork point with its parent are read, not the 30k commits
+    assert index.visited() <= 4
+    assert elapsed < 0.5
+    # The merge-base of a pair is computed once
+    assert index.merge_base(history[-1], feature) == history[-2]
+    assert index.visited() <= 4
+    assert index.merge_base(history[0], history[-1]) == history[0]
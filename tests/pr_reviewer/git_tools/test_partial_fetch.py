@@ -0,0 +1,82 @@
+import shutil
+
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.git_tools.partial_fetch import partial_fetch
+from tests.conftest import commit_files
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None,
+                                reason="file:// fetches are served by git upload-pack")
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """Bare repository: `feature` forks from `main` 10 commits deep, `other` is unrelated."""
+    repo = Repo.init_bare(str(tmp_path / 'remote.git'), mkdir=True)
+    main = None
+    history = []
+    for i in range(40):
+        main = commit_files(repo, {'main.txt': f'{i}\n'.encode()}, [main] if main else [],
+                            commit_time=1700000000 + i)
+        history.append(main)
+    feature = history[30]
+    for i in range(3):
+        feature = commit_files(repo, {'main.txt': b'30\n', 'feature.txt': f'{i}\n'.encode()},
+                               [feature], commit_time=1700001000 + i)
+    other = commit_files(repo, {'other.txt': b'unrelated\n'})
+    repo.refs[b'refs/heads/main'] = main
+    repo.refs[b'refs/heads/feature'] = feature
+    repo.refs[b'refs/heads/other'] = other
+    yield repo, history
+    repo.close()
+
+
+def test_fetches_requested_branches_down_to_merge_base(tmp_path, remote):
+    remote_repo, history = remote
+    repo = Repo.init(str(tmp_path / 'local'), mkdir=True)
+    messages = []
+
+    stats = partial_fetch(repo, f"file://{remote_repo.path}", ['main', 'feature'], depth=4,
+                          progress=messages.append)
+
+    assert stats.merge_bases == {'feature': history[30].decode('ascii')}
+    assert stats.rounds == 2 and stats.packs == 2 and stats.shallow
+    assert history[30] in repo.object_store and history[0] not in repo.object_store
+    assert remote_repo.refs[b'refs/heads/other'] not in repo.object_store
+    assert any(b'Fetching 2 commits with depth 4' in message for message in messages)
+    assert set(repo.refs.as_dict(b'refs/heads')) == {b'main', b'feature'}
+    assert repo.refs[b'refs/remotes/origin/feature'] == remote_repo.refs[b'refs/heads/feature']
+
+    git_tools = GitTools(str(tmp_path / 'local'))
+    assert git_tools.merge_base('main', 'feature') == history[30].decode('ascii')
+    assert git_tools.changed_files('main', 'feature') == [('feature.txt', 'add')]
+
+
+def test_incremental_sync_fetches_only_new_objects(tmp_path, remote):
+    remote_repo, history = remote
+    repo = Repo.init(str(tmp_path / 'local'), mkdir=True)
+    partial_fetch(repo, remote_repo.path, ['main', 'feature'], progress=None)
+
+    stats = partial_fetch(repo, remote_repo.path, ['main', 'feature'], progress=None)
+    assert stats.rounds == 0 and stats.packs == 0
+
+    feature = remote_repo.refs[b'refs/heads/feature']
+    new_tip = commit_files(remote_repo, {'main.txt': b'30\n', 'feature.txt': b'new\n'},
+                           [feature], commit_time=1700002000)
+    remote_repo.refs[b'refs/heads/feature'] = new_tip
+    objects_before = len(list(repo.object_store))
+
+    stats = partial_fetch(repo, remote_repo.path, ['main', 'feature'], progress=None)
+    assert stats.rounds == 1 and stats.packs == 1
+    # The new commit, its tree and the changed blob
+    assert len(list(repo.object_store)) - objects_before == 3
+    assert repo.refs[b'refs/heads/feature'] == new_tip
+
+
+def test_unknown_branch(tmp_path, remote):
+    remote_repo, _ = remote
+    repo = Repo.init(str(tmp_path / 'local'), mkdir=True)
+    with pytest.raises(ValueError, match="missing"):
+        partial_fetch(repo, remote_repo.path, ['main', 'missing'], progress=None)
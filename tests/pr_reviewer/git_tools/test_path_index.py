@@ -0,0 +1,79 @@
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.git_tools.path_index import PathIndex
+from tests.conftest import commit_files
+
+
+def test_lookup_reads_every_tree_once(local_repo):
+    git_tools = GitTools(local_repo)
+    index = git_tools.path_index
+    root = git_tools._get_branch_tree("test")
+
+    mode, sha = index.lookup(root, "src/pkg/module.py")
+    assert git_tools.repo[sha].data == b'def answer():\n    return 42\n'
+    assert index.tree_reads == 3
+
+    index.lookup(root, "src/pkg/module.py")
+    index.lookup(root, "src/pkg")
+    assert index.tree_reads == 3
+
+
+def test_branches_share_unchanged_subtrees(tmp_path):
+    repo = Repo.init(str(tmp_path / 'repo'), mkdir=True)
+    files = {f'deep/nested/dir/file_{i}.txt': f'{i}\n'.encode() for i in range(10)}
+    base = commit_files(repo, files | {'README.md': b'base\n'})
+    feature = commit_files(repo, files | {'README.md': b'feature\n'}, parents=[base])
+    index = PathIndex(repo.object_store)
+
+    for root in (repo[base].tree, repo[feature].tree):
+        for i in range(10):
+            index.lookup(root, f'deep/nested/dir/file_{i}.txt')
+    # Two roots and three shared subdirectories
+    assert index.tree_reads == 5
+
+
+def test_lookup_errors(local_repo):
+    git_tools = GitTools(local_repo)
+    root = git_tools._get_branch_tree("main")
+
+    with pytest.raises(KeyError, match="src/missing"):
+        git_tools.path_index.lookup(root, "src/missing/module.py")
+    with pytest.raises(NotADirectoryError, match="README.md"):
+        git_tools.path_index.lookup(root, "README.md/module.py")
+
+
+def test_get_file_content_messages(local_repo):
+    git_tools = GitTools(local_repo)
+
+    assert git_tools.get_file_content("main", "README.md") == "# Sample\n"
+    assert git_tools.get_file_content("main", "src/missing/module.py") == \
+        "Directory missing not found in path src/missing/module.py in branch main"
+    assert git_tools.get_file_content("main", "file_to_add.txt") == \
+        "File file_to_add.txt not found in branch main"
+    assert git_tools.get_file_content("main", "README.md/x") == \
+        "Path README.md is not a directory in branch main"
+    assert "is a directory" in git_tools.get_file_content("main", "src/pkg")
+
+
+def test_list_directory(local_repo):
+    git_tools = GitTools(local_repo)
+
+    assert git_tools.list_directory("test") == \
+        "README.md\nfile_to_add.txt\nfile_to_modify.txt\nsrc/"
+    assert git_tools.list_directory("test", "src/pkg") == "module.py"
+    assert "not found" in git_tools.list_directory("test", "docs")
+    assert "not a directory" in git_tools.list_directory("test", "README.md")
+
+    tools = {t.name: t for t in git_tools.get_tools()}
+    assert tools["list_directory"].invoke({"branch": "main", "dir_path": "src"}) == "pkg/"
+
+
+def test_get_file_content_of_submodule(submodule_repo):
+    git_tools = GitTools(submodule_repo)
+    expected = f"Path libs/core is a submodule at {'a' * 40} in branch bump"
+    assert git_tools.get_file_content('bump', 'libs/core') == expected
+    # The same path taken from a computed change set
+    git_tools.changed_files('main', 'bump')
+    assert git_tools.get_file_content('bump', 'libs/core') == expected
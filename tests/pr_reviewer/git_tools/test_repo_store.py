@@ -0,0 +1,126 @@
+import os
+import shutil
+import time
+
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.repo_store import RepoStore, job_ref_prefix, repo_key
+from tests.conftest import commit_files
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None,
+                                reason="local fetches are served by git upload-pack")
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """Bare upstream with `main` and two PR branches forked from it."""
+    repo = Repo.init_bare(str(tmp_path / 'upstream.git'), mkdir=True)
+    main = commit_files(repo, {'app.py': b'print(1)\n', 'README.md': b'readme\n'})
+    repo.refs[b'refs/heads/main'] = main
+    for i, branch in enumerate(['pr-1', 'pr-2']):
+        repo.refs[f'refs/heads/{branch}'.encode()] = commit_files(
+            repo, {'app.py': b'print(1)\n', 'README.md': b'readme\n',
+                   f'{branch}.py': os.urandom(2048).hex().encode()}, [main], commit_time=1700000100 + i)
+    yield repo
+    repo.close()
+
+
+def _age(store: RepoStore, repo_url: str, job_id: str, seconds: float):
+    marker = store.repo_path(repo_url) / 'jobs' / job_id
+    past = time.time() - seconds
+    os.utime(marker, (past, past))
+
+
+def test_jobs_share_one_repository(tmp_path, remote):
+    store = RepoStore(tmp_path / 'store')
+    url = remote.path
+
+    first = store.fetch(url, 'job-1', ['main', 'pr-1'])
+    second = store.fetch(url, 'job-2', ['main', 'pr-2'])
+    again = store.fetch(url, 'job-3', ['main', 'pr-1'])
+
+    assert list(store.root.iterdir()) == [store.repo_path(url)]
+    assert first.rounds == 1 and second.rounds == 1
+    # Both branches of job-3 are already in the shared objects, nothing is transferred
+    assert again.rounds == 0 and again.packs == 0
+    with Repo(str(store.repo_path(url))) as repo:
+        assert repo.bare
+
+    with store.open(url, 'job-2') as toolbox:
+        assert toolbox.list_branches() == ['main', 'pr-2']
+        assert toolbox.changed_files('main', 'pr-2') == [('pr-2.py', 'add')]
+        assert toolbox.get_file_content('pr-2', 'app.py') == 'print(1)\n'
+    assert {job.job_id: job.branches for job in store.jobs()} == \
+           {'job-1': ['main', 'pr-1'], 'job-2': ['main', 'pr-2'], 'job-3': ['main', 'pr-1']}
+
+    with pytest.raises(KeyError):
+        with store.open(url, 'unknown'):
+            pass
+
+
+def test_gc_removes_stale_jobs_and_their_objects(tmp_path, remote):
+    store = RepoStore(tmp_path / 'store')
+    url = remote.path
+    store.fetch(url, 'job-1', ['main', 'pr-1'])
+    store.fetch(url, 'job-2', ['main', 'pr-2'])
+    pr_1 = remote.refs[b'refs/heads/pr-1']
+    _age(store, url, 'job-1', 3600)
+
+    stats = store.gc(max_age=600)
+
+    assert stats.removed_jobs == [f'{repo_key(url)}/job-1']
+    assert stats.repacked == [store.repo_path(url).stem]
+    assert stats.size_after < stats.size_before
+    assert [job.job_id for job in store.jobs()] == ['job-2']
+    with Repo(str(store.repo_path(url))) as repo:
+        assert pr_1 not in repo.object_store
+        assert len(repo.object_store.packs) == 1
+    with store.open(url, 'job-2') as toolbox:
+        assert toolbox.changed_files('main', 'pr-2') == [('pr-2.py', 'add')]
+
+    # The last job of a repository takes the repository with it
+    _age(store, url, 'job-2', 3600)
+    stats = store.gc(max_age=600)
+    assert stats.removed_repos == [store.repo_path(url).stem]
+    assert not store.repo_path(url).exists()
+
+
+def test_gc_by_size_and_open_repositories(tmp_path, remote):
+    store = RepoStore(tmp_path / 'store')
+    url = remote.path
+    store.fetch(url, 'job-1', ['main', 'pr-1'])
+    store.fetch(url, 'job-2', ['main', 'pr-2'])
+    _age(store, url, 'job-1', 60)
+    size = store.size()
+
+    with store.open(url, 'job-2') as toolbox:
+        stats = store.gc(max_bytes=size // 2)
+        # Refs are removed at once, the open job and the packs of its repository are kept
+        assert stats.removed_jobs == [f'{repo_key(url)}/job-1'] and not stats.repacked
+        assert toolbox.changed_files('main', 'pr-2') == [('pr-2.py', 'add')]
+    stats = store.gc(max_bytes=size - 1)
+    assert stats.repacked == [store.repo_path(url).stem] and not stats.removed_jobs
+    assert store.size() < size
+    assert [job.job_id for job in store.jobs()] == ['job-2']
+
+
+def test_gc_by_size_repacks_every_repository_once(tmp_path, remote):
+    store = RepoStore(tmp_path / 'store')
+    url = remote.path
+    for i, branch in enumerate(['pr-1', 'pr-2', 'pr-1']):
+        store.fetch(url, f'job-{i}', ['main', branch])
+        _age(store, url, f'job-{i}', 60 - i)
+
+    stats = store.gc(max_bytes=store.size() // 2)
+
+    assert stats.removed_jobs == [f'{repo_key(url)}/job-0', f'{repo_key(url)}/job-1']
+    assert stats.repacked == [store.repo_path(url).stem]
+    assert [job.job_id for job in store.jobs()] == ['job-2']
+
+
+def test_job_ids_are_validated():
+    assert job_ref_prefix('pr-42_1.a') == 'refs/jobs/pr-42_1.a/heads/'
+    for job_id in ['', '../x', 'a/b', '.hidden', 'x.lock']:
+        with pytest.raises(ValueError):
+            job_ref_prefix(job_id)
@@ -0,0 +1,118 @@
+from textwrap import dedent
+
+import pytest
+from dulwich.repo import Repo
+
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.git_tools.symbol_index import ModuleSymbols, SymbolIndex, changed_line_ranges
+from tests.conftest import commit_files
+
+BASE = dedent("""\
+    import os
+
+    LIMIT = 10
+
+
+    def parse(value):
+        return int(value)
+
+
+    class Loader:
+        @staticmethod
+        def load(path):
+            with open(path) as f:
+                return [parse(line) for line in f]
+
+        def size(self, path):
+            return os.path.getsize(path)
+
+
+    def main():
+        print(Loader.load('data.txt'))
+
+
+    def unrelated():
+        return LIMIT
+""")
+FEATURE = BASE.replace("return int(value)", "return int(value.strip())") \
+    .replace("LIMIT = 10", "LIMIT = 20")
+
+
+@pytest.fixture
+def symbols_repo(tmp_path):
+    repo = Repo.init(str(tmp_path / 'repo'), mkdir=True)
+    base = commit_files(repo, {'app.py': BASE.encode(), 'notes.txt': b'a\n',
+                               'broken.py': b'x = 1\n'})
+    feature = commit_files(repo, {'app.py': FEATURE.encode(), 'notes.txt': b'b\n',
+                                  'broken.py': b'def (:\n'}, parents=[base])
+    repo.refs[b'refs/heads/main'] = base
+    repo.refs[b'refs/heads/feature'] = feature
+    repo.close()
+    return str(tmp_path / 'repo')
+
+
+def test_symbols_and_callers():
+    symbols = ModuleSymbols.parse(BASE)
+    assert [(s.name, s.kind, s.start, s.end) for s in symbols.symbols] == [
+        ('parse', 'function', 6, 7),
+        ('Loader', 'class', 10, 17),
+        ('Loader.load', 'function', 11, 14),
+        ('Loader.size', 'function', 16, 17),
+        ('main', 'function', 20, 21),
+        ('unrelated', 'function', 24, 25),
+    ]
+    assert symbols.enclosing(13).name == 'Loader.load'
+    assert symbols.enclosing(15).name == 'Loader'
+    assert symbols.enclosing(3) is None
+    parse = symbols.enclosing(7)
+    assert [caller.name for caller in symbols.callers(parse)] == ['Loader.load']
+    load = symbols.enclosing(12)
+    assert [caller.name for caller in symbols.callers(load)] == ['main']
+
+
+def test_changed_line_ranges():
+    assert changed_line_ranges(BASE, FEATURE) == [(3, 3), (7, 7)]
+    assert changed_line_ranges('a\nb\nc\n', 'a\nc\n') == [(1, 1)]
+    assert changed_line_ranges('', 'a\nb\n') == [(1, 2)]
+    assert changed_line_ranges('a\nb\n', 'a\nb\n') == []
+    assert changed_line_ranges('a\nb\n', 'a\nb\nc\n') == [(3, 3)]
+    assert changed_line_ranges('a\nx\nb\nb\n', 'a\nb\nb\n') == [(1, 1)]
+
+
+def test_get_changed_symbols(symbols_repo):
+    git_tools = GitTools(symbols_repo)
+
+    context = git_tools.get_changed_symbols('main', 'feature', 'app.py')
+
+    assert context.startswith("Changed symbols of app.py in branch feature:")
+    assert "# Lines 3-3: module level (changed)\nLIMIT = 20" in context
+    assert "# Lines 6-7: function `parse` (changed)\ndef parse(value):\n" \
+           "    return int(value.strip())" in context
+    assert "# Lines 11-14: function `Loader.load` (calls `parse`)\n    @staticmethod" in context
+    assert "def main" not in context and "def unrelated" not in context
+    assert len(context) < len(FEATURE)
+
+
+def test_get_changed_symbols_fallbacks(symbols_repo):
+    git_tools = GitTools(symbols_repo)
+    assert "only extracted from Python files" in \
+           git_tools.get_changed_symbols('main', 'feature', 'notes.txt')
+    assert "can't be parsed in branch feature (line 1" in \
+           git_tools.get_changed_symbols('main', 'feature', 'broken.py')
+    assert git_tools.get_changed_symbols('main', 'feature', 'missing.py') == \
+           "No changes found for file missing.py"
+
+
+def test_parses_are_cached_per_blob(symbols_repo):
+    git_tools = GitTools(symbols_repo)
+    for _ in range(3):
+        git_tools.get_changed_symbols('main', 'feature', 'app.py')
+        git_tools.get_changed_symbols('main', 'feature', 'broken.py')
+    assert git_tools.symbol_index.parses == 2
+    assert git_tools.symbol_index.diffs == 1
+
+    index = SymbolIndex(max_size=1)
+    index.get(b'a', lambda sha: 'x = 1\n')
+    index.get(b'b', lambda sha: 'y = 2\n')
+    index.get(b'a', lambda sha: 'x = 1\n')
+    assert index.parses == 3
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import json
+import threading
+import time
+
+from pr_reviewer.batch_runner import BatchReviewRunner, write_results
+from pr_reviewer.review_options import ReviewJob, read_manifest
+
+
+class RecordingReview:
+    """Review function that tracks how many reviews per provider run at the same time."""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.current: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+
+    def __call__(self, repo_path, old_branch, new_branch, model):
+        provider = 'openai' if model.startswith('gpt') else 'groq'
+        with self.lock:
+            self.current[provider] = self.current.get(provider, 0) + 1
+            self.peak[provider] = max(self.peak.get(provider, 0), self.current[provider])
+        time.sleep(self.delay)
+        with self.lock:
+            self.current[provider] -= 1
+        if new_branch == 'broken':
+            raise RuntimeError("model failure")
+        return f"review of {new_branch}"
+
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        '{"path": "repo", "source_branch": "feature", "destination_branch": "main"}\n'
+        '\n'
+        '{"path": "repo", "source_branch": "fix", "destination_branch": "main", '
+        '"model": "gpt-4o-mini", "id": "pr-7"}\n')
+
+    jobs = read_manifest(manifest)
+    assert [job.id for job in jobs] == ["1", "pr-7"]
+    assert jobs[0].model == "llama-3.1-70b-versatile"
+    assert jobs[1].model == "gpt-4o-mini"
+
+
+def test_provider_limits_are_respected():
+    review = RecordingReview()
+    runner = BatchReviewRunner(workers=4, provider_limits={'groq': 1}, review_fn=review)
+    jobs = [ReviewJob("repo", f"b{i}", "main", model=model)
+            for i in range(4) for model in ("llama-3.1-70b-versatile", "gpt-4o-mini")]
+
+    results = list(runner.run(jobs))
+
+    assert len(results) == 8
+    assert all(result.status == 'ok' for result in results)
+    assert review.peak['groq'] == 1
+    assert review.peak['openai'] == 3
+
+
+def test_failures_are_reported_in_results_stream():
+    runner = BatchReviewRunner(workers=2, review_fn=RecordingReview(delay=0))
+    jobs = [ReviewJob("repo", "feature", "main", id="a"),
+            ReviewJob("repo", "broken", "main", id="b")]
+    stream = io.StringIO()
+
+    stats = write_results(runner.run(jobs), stream)
+
+    records = {r['id']: r for r in map(json.loads, stream.getvalue().splitlines())}
+    assert records['a']['review'] == "review of feature"
+    assert records['b']['status'] == 'error'
+    assert "model failure" in records['b']['error']
+    assert stats['reviews'] == 2
+    assert stats['failed'] == 1
+
+
+def test_async_runner_keeps_many_reviews_in_flight():
+    in_flight = peak = 0
+
+    async def areview(repo_path, old_branch, new_branch, model):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return f"review of {new_branch}"
+
+    async def collect(runner, jobs):
+        return [result async for result in runner.arun(jobs)]
+
+    runner = BatchReviewRunner(workers=20, provider_limits={'groq': 10}, areview_fn=areview)
+    jobs = [ReviewJob("repo", f"b{i}", "main") for i in range(30)]
+    results = asyncio.run(collect(runner, jobs))
+
+    assert len(results) == 30
+    assert peak == 10
@@ -0,0 +1,62 @@
+from pr_reviewer.diff_chunker import chunk_file_diffs, pack_chunks, split_diff
+
+HEADER = "diff --git a/app.py b/app.py\nindex 1111111..2222222 100644\n--- a/app.py\n+++ b/app.py"
+
+
+def make_diff(hunks: int, lines_per_hunk: int) -> str:
+    parts = [HEADER]
+    for h in range(hunks):
+        parts.append(f"@@ -{h * 100},{lines_per_hunk} +{h * 100},{lines_per_hunk} @@")
+        parts.extend(f"+line {h}.{i}" for i in range(lines_per_hunk))
+    return "\n".join(parts)
+
+
+def count_lines(text: str) -> int:
+    return len(text.splitlines())
+
+
+def test_small_diff_is_one_chunk():
+    diff = make_diff(hunks=2, lines_per_hunk=3)
+    chunks = split_diff("app.py", "modify", diff, max_tokens=100, count_tokens=count_lines)
+
+    assert len(chunks) == 1
+    assert chunks[0].text == diff
+
+
+def test_split_at_hunk_boundaries_with_header():
+    diff = make_diff(hunks=4, lines_per_hunk=3)
+    chunks = split_diff("app.py", "modify", diff, max_tokens=12, count_tokens=count_lines)
+
+    assert len(chunks) == 2
+    for chunk in chunks:
+        lines = chunk.text.splitlines()
+        assert "\n".join(lines[:4]) == HEADER
+        assert lines[4].startswith("@@")
+        assert chunk.tokens <= 12
+    assert [c.part for c in chunks] == [1, 2]
+    assert "part 2/2" in chunks[1].render()
+
+
+def test_oversized_hunk_is_split_by_lines():
+    diff = make_diff(hunks=1, lines_per_hunk=20)
+    chunks = split_diff("app.py", "modify", diff, max_tokens=10, count_tokens=count_lines)
+
+    assert len(chunks) == 4
+    assert all(chunk.tokens <= 10 for chunk in chunks)
+
+
+def test_added_file_without_hunks():
+    diff = "\n".join(f"+row {i}" for i in range(10))
+    chunks = split_diff("new.txt", "add", diff, max_tokens=4, count_tokens=count_lines)
+
+    assert len(chunks) == 3
+    assert "\n".join(c.text for c in chunks) == diff
+
+
+def test_pack_chunks_fits_budget():
+    file_diffs = [(f"f{i}.py", "modify", make_diff(hunks=1, lines_per_hunk=3)) for i in range(5)]
+    batches = chunk_file_diffs(file_diffs, budget=20, count_tokens=count_lines)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [c.file_path for batch in batches for c in batch] == [f"f{i}.py" for i in range(5)]
+    assert pack_chunks([], budget=10) == []
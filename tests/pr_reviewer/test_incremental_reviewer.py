@@ -0,0 +1,70 @@
+import pytest
+from dulwich.repo import Repo
+from langchain_core.language_models import FakeListChatModel
+
+from pr_reviewer import incremental_reviewer
+from pr_reviewer.benchmark.stub_llm import FakeAPIError, FlakyReviewModel
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.incremental_reviewer import files_to_review, load_state, make_incremental_review
+from tests.conftest import FEATURE_FILES, commit_files
+
+
+def push_fixup(repo_path, files: dict[str, bytes]):
+    repo = Repo(str(repo_path))
+    parent = repo.refs[b'refs/heads/test']
+    repo.refs[b'refs/heads/test'] = commit_files(repo, {**FEATURE_FILES, **files},
+                                                 parents=[parent], commit_time=1700000200)
+    repo.close()
+
+
+def test_incremental_review_carries_findings_forward(local_repo, tmp_path, monkeypatch):
+    llm = FakeListChatModel(responses=["first run"])
+    monkeypatch.setattr(incremental_reviewer, "get_llm", lambda model: llm)
+    state_path = tmp_path / "state.json"
+
+    review = make_incremental_review(local_repo, "main", "test", state_path)
+    state = load_state(state_path)
+    assert set(state.findings) == {"file_to_modify.txt", "file_to_add.txt",
+                                   "file_to_delete.txt", "src/pkg/module.py"}
+    assert review.count("first run") == 4
+
+    push_fixup(local_repo, {'src/pkg/module.py': b'def answer():\n    return 43\n'})
+    llm.responses = ["second run"]
+    llm.i = 0
+    review = make_incremental_review(local_repo, "main", "test", state_path)
+
+    assert review.count("first run") == 3
+    assert "### src/pkg/module.py\n\nsecond run" in review
+    assert load_state(state_path).findings["src/pkg/module.py"] == "second run"
+
+
+def test_unchanged_pr_needs_no_model_calls(local_repo, tmp_path, monkeypatch):
+    llm = FakeListChatModel(responses=["finding"])
+    monkeypatch.setattr(incremental_reviewer, "get_llm", lambda model: llm)
+    state_path = tmp_path / "state.json"
+
+    first = make_incremental_review(local_repo, "main", "test", state_path)
+    monkeypatch.setattr(incremental_reviewer, "get_llm", lambda model: None)
+    assert make_incremental_review(local_repo, "main", "test", state_path) == first
+
+
+def test_state_of_other_model_is_ignored(local_repo, tmp_path, monkeypatch):
+    llm = FakeListChatModel(responses=["finding"])
+    monkeypatch.setattr(incremental_reviewer, "get_llm", lambda model: llm)
+    state_path = tmp_path / "state.json"
+    make_incremental_review(local_repo, "main", "test", state_path, model="gpt-4o-mini")
+
+    state = load_state(state_path)
+    toolbox = GitTools(local_repo)
+    assert files_to_review(toolbox, state, "main", "test", "gpt-4o-mini") == []
+    assert files_to_review(toolbox, state, "main", "test", "gpt-4o") == [
+        "file_to_add.txt", "file_to_delete.txt", "file_to_modify.txt", "src/pkg/module.py"]
+
+
+def test_incremental_review_closes_what_it_opens(local_repo, tmp_path, closed):
+    with pytest.raises(FakeAPIError):
+        make_incremental_review(local_repo, "main", "test", tmp_path / "state.json",
+                                cache_path=tmp_path / "cache.sqlite",
+                                llm=FlakyReviewModel(failures=[1], status_code=401))
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+    assert load_state(tmp_path / "state.json") is None
@@ -0,0 +1,44 @@
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from pr_reviewer.llm_cache import CacheMissError, DiskResponseCache
+
+
+def test_repeated_call_is_served_from_cache(tmp_path):
+    cache = DiskResponseCache(tmp_path / "llm.sqlite")
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+
+    assert llm.invoke("review this").content == "first"
+    assert llm.invoke("review this").content == "first"
+    assert llm.invoke("review that").content == "second"
+
+
+def test_key_includes_tool_results(tmp_path):
+    cache = DiskResponseCache(tmp_path / "llm.sqlite")
+    llm = FakeListChatModel(responses=["first", "second"], cache=cache)
+    call = [HumanMessage("review"), ToolMessage("diff A", tool_call_id="1")]
+    other_result = [HumanMessage("review"), ToolMessage("diff B", tool_call_id="1")]
+
+    assert llm.invoke(call).content == "first"
+    assert llm.invoke(other_result).content == "second"
+
+
+def test_cache_is_shared_between_runs(tmp_path):
+    first_run = FakeListChatModel(responses=["recorded"],
+                                  cache=DiskResponseCache(tmp_path / "llm.sqlite"))
+    first_run.invoke("review")
+
+    replay = FakeListChatModel(responses=["recorded"],
+                               cache=DiskResponseCache(tmp_path / "llm.sqlite", replay=True))
+    assert replay.invoke("review").content == "recorded"
+    assert replay.i == 0  # The model was not called
+    with pytest.raises(CacheMissError):
+        replay.invoke("unknown prompt")
+
+
+def test_expired_entries_are_ignored(tmp_path):
+    llm = FakeListChatModel(responses=["first", "second"],
+                            cache=DiskResponseCache(tmp_path / "llm.sqlite", ttl=0))
+    llm.invoke("review")
+    assert llm.invoke("review").content == "second"
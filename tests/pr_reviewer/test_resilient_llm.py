@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from pr_reviewer.benchmark.stub_llm import FakeAPIError, FlakyReviewModel
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.resilient_llm import (AgentCheckpoint, RateLimits, RetryPolicy, TokenBucket,
+                                       ainvoke_resumable, get_resilient_llm, invoke_resumable,
+                                       is_retryable, parse_rate_limits, retry_after)
+from pr_reviewer.simple_reviewer import (RoundTripCounter, _create_agent_executor,
+                                         code_review_assistant_prompt, run_config)
+
+NO_DELAY = RetryPolicy(max_retries=2, base_delay=0.0)
+PROMPT = [HumanMessage("Review the changes ```diff\n+x\n```")]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    clock.now += 10
+    assert bucket.reserve() == 0.0
+    bucket.pause(3)
+    assert bucket.reserve() == 4.0
+
+
+def test_rate_limits_are_shared_per_provider_and_model():
+    limits = RateLimits(parse_rate_limits(['groq=30', 'openai/gpt-4o = 600']))
+    assert len(limits.buckets('llama-3.1-8b-instant')) == 1
+    assert limits.buckets('llama-3.1-8b-instant')[0] is limits.buckets('mixtral-8x7b-32768')[0]
+    assert limits.buckets('gpt-4o')[0].rate == 10
+    assert limits.buckets('gpt-4o-mini') == []
+    for value in ['groq', 'groq=fast', '=10', 'groq=0']:
+        with pytest.raises(ValueError):
+            parse_rate_limits([value])
+
+
+def test_retryable_errors_and_retry_after():
+    assert is_retryable(FakeAPIError(429)) and is_retryable(FakeAPIError(503))
+    assert is_retryable(TimeoutError()) and not is_retryable(FakeAPIError(400))
+    assert not is_retryable(ValueError())
+    assert retry_after(FakeAPIError(429, retry_after=2.5)) == 2.5
+    error = FakeAPIError(429)
+    error.response.headers = {'retry-after-ms': '250', 'retry-after': '1'}
+    assert retry_after(error) == 0.25
+    error.response.headers = {'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+    assert retry_after(error) == 0.0
+    assert retry_after(ValueError()) is None
+
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    assert all(0 <= policy.delay(2) <= 4 for _ in range(50))
+    assert policy.delay(0, FakeAPIError(429, retry_after=5)) == 5
+    assert policy.delay(0, FakeAPIError(429, retry_after=60)) == 10
+
+
+def test_retries_respect_retry_after():
+    sleeps = []
+    flaky = FlakyReviewModel(failures=[1, 2], retry_after=0.5)
+    limits = RateLimits({'groq': 6000})
+    llm = get_resilient_llm('llama-3.1-8b-instant', rate_limits=limits, policy=NO_DELAY,
+                            llm_factory=lambda model: flaky, sleep=sleeps.append)
+
+    result = llm.generate([PROMPT])
+
+    assert result.generations[0][0].text == "Reviewed the prefetched changes."
+    assert result.generations[0][0].generation_info == {'model_name': 'llama-3.1-8b-instant',
+                                                        'attempts': 3}
+    assert flaky.calls == 3
+    assert sleeps.count(0.5) == 2
+    # The rate-limited answers paused the shared bucket for the other callers
+    assert limits.buckets('llama-3.1-8b-instant')[0].reserve() > 0
+
+
+def test_falls_over_to_the_alternate_model():
+    models = {'gpt-4o': FlakyReviewModel(failures=[1, 2, 3]),
+              'llama-3.1-8b-instant': FlakyReviewModel(),
+              'mixtral-8x7b-32768': FlakyReviewModel(failures=[1], status_code=400)}
+    llm = get_resilient_llm('gpt-4o', ['llama-3.1-8b-instant'], policy=NO_DELAY,
+                            llm_factory=models.get, sleep=lambda seconds: None)
+    assert llm.invoke(PROMPT).content == "Reviewed the prefetched changes."
+    assert models['gpt-4o'].calls == 3 and models['llama-3.1-8b-instant'].calls == 1
+
+    # Errors which don't go away on retries fall over at once
+    llm = get_resilient_llm('mixtral-8x7b-32768', ['llama-3.1-8b-instant'], policy=NO_DELAY,
+                            llm_factory=models.get)
+    assert asyncio.run(llm.ainvoke(PROMPT)).content == "Reviewed the prefetched changes."
+    assert models['mixtral-8x7b-32768'].calls == 1
+
+    llm = get_resilient_llm('gpt-4o', policy=RetryPolicy(max_retries=0),
+                            llm_factory=lambda model: FlakyReviewModel(failures=[1]))
+    with pytest.raises(FakeAPIError):
+        llm.invoke(PROMPT)
+
+
+REVIEW_INPUTS = {'old_branch': 'main', 'new_branch': 'test'}
+
+
+def _review(local_repo, llm, asynchronous: bool = False):
+    toolbox = GitTools(local_repo)
+    executor = _create_agent_executor(llm, toolbox.get_tools(), code_review_assistant_prompt)
+    counter = RoundTripCounter()
+    checkpoint = AgentCheckpoint(REVIEW_INPUTS)
+    if asynchronous:
+        result = asyncio.run(ainvoke_resumable(executor, REVIEW_INPUTS,
+                                               config=run_config(counter), policy=NO_DELAY,
+                                               checkpoint=checkpoint))
+    else:
+        result = invoke_resumable(executor, REVIEW_INPUTS, config=run_config(counter),
+                                  policy=NO_DELAY, sleep=lambda seconds: None,
+                                  checkpoint=checkpoint)
+    toolbox.close()
+    return result, checkpoint, counter
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_failed_review_resumes_from_checkpoint(local_repo, asynchronous):
+    # The third model call, the final answer after all tool calls, is rate limited
+    flaky = FlakyReviewModel(failures=[3])
+
+    result, checkpoint, counter = _review(local_repo, flaky, asynchronous)
+
+    assert result['output'] == "Reviewed 4 files."
+    assert flaky.calls == 4
+    assert len(checkpoint.steps) == 2 and checkpoint.replayed == 2
+    # The tools ran once: the list of changes and the diffs of four files
+    assert counter.tool_calls == 5
+
+
+def test_wrapped_model_calls_are_counted_once(local_repo):
+    flaky = FlakyReviewModel()
+    llm = get_resilient_llm('gpt-4o', policy=NO_DELAY, llm_factory=lambda model: flaky)
+
+    result, checkpoint, counter = _review(local_repo, llm)
+
+    assert result['output'] == "Reviewed 4 files."
+    assert flaky.calls == counter.model_calls == 3
+
+
+def test_review_fails_on_errors_which_are_not_retryable(local_repo):
+    flaky = FlakyReviewModel(failures=[2], status_code=401)
+    with pytest.raises(FakeAPIError):
+        _review(local_repo, flaky)
+    assert flaky.calls == 2
+
+
+def test_every_call_starts_from_a_fresh_checkpoint(local_repo, caplog):
+    toolbox = GitTools(local_repo)
+    executor = _create_agent_executor(FlakyReviewModel(failures=[3]), toolbox.get_tools(),
+                                      code_review_assistant_prompt)
+    counter = RoundTripCounter()
+
+    invoke_resumable(executor, REVIEW_INPUTS, config=run_config(counter), policy=NO_DELAY,
+                     sleep=lambda seconds: None)
+    invoke_resumable(executor, REVIEW_INPUTS, config=run_config(counter), policy=NO_DELAY)
+    toolbox.close()
+
+    # Nothing was replayed from the first review, the tools ran again in the second one
+    assert executor.checkpoint is None
+    assert counter.tool_calls == 10
+    assert "resuming after 2 steps" in caplog.text
+
+    with pytest.raises(ValueError):
+        invoke_resumable(executor, REVIEW_INPUTS, checkpoint=AgentCheckpoint({}))
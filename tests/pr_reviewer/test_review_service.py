@@ -0,0 +1,132 @@
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pr_reviewer.benchmark.stub_llm import ScriptedReviewModel
+from pr_reviewer.review_options import ReviewJob
+from pr_reviewer.review_service import GitToolsPool, ReviewHTTPServer, ReviewService
+
+
+class DiffLengthReview:
+    """Review function returning the length of the diff read through the warm toolbox."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.llms = []
+
+    def __call__(self, repo_path, old_branch, new_branch, model, mode, llm, toolbox):
+        self.llms.append((model, llm))
+        time.sleep(self.delay)
+        if new_branch == 'broken':
+            raise RuntimeError("model failure")
+        return f"{mode}: {len(toolbox.diff_between_branches(old_branch, new_branch))}"
+
+
+def wait_for(service: ReviewService, job_id: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while service.get(job_id).status in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return service.get(job_id)
+
+
+def test_pool_reuses_repositories(local_repo):
+    pool = GitToolsPool(max_idle=1)
+    with pool.acquire(local_repo) as first:
+        with pool.acquire(local_repo) as second:
+            assert first is not second
+    with pool.acquire(local_repo) as third:
+        assert third in (first, second)
+
+    assert (pool.opened, pool.reused) == (2, 1)
+    assert pool.idle_count() == 1
+    pool.close()
+
+
+def test_service_reviews_with_warm_repos_and_clients(local_repo):
+    review = DiffLengthReview()
+    service = ReviewService(workers=2, review_fn=review, llm_factory=lambda model: object())
+    service.start(warm_models=['gpt-4o-mini'])
+    try:
+        records = [service.submit(ReviewJob(str(local_repo), 'test', 'main', model='gpt-4o-mini'),
+                                  mode='prefetch') for _ in range(4)]
+        broken = service.submit(ReviewJob(str(local_repo), 'broken', 'main', id='broken'))
+        results = [wait_for(service, record.id) for record in records]
+        assert wait_for(service, 'broken').error == "RuntimeError: model failure"
+    finally:
+        service.stop()
+
+    assert {result.status for result in results} == {'ok'}
+    assert results[0].review.startswith('prefetch: ')
+    # Jobs of one model share the warm client
+    assert len({id(llm) for model, llm in review.llms if model == 'gpt-4o-mini'}) == 1
+    metrics = service.metrics()
+    assert metrics['completed'] == 5 and metrics['failed'] == 1
+    assert metrics['repos_opened'] <= 2 and metrics['repos_reused'] >= 3
+    assert broken.status == 'error'
+
+
+def test_service_rejects_jobs_over_queue_limit(local_repo):
+    service = ReviewService(workers=1, review_fn=DiffLengthReview(), max_queue=1)
+    service.submit(ReviewJob(str(local_repo), 'test', 'main'))
+    with pytest.raises(queue.Full):
+        service.submit(ReviewJob(str(local_repo), 'test', 'main'))
+    with pytest.raises(ValueError, match="Unknown review mode"):
+        service.submit(ReviewJob(str(local_repo), 'test', 'main'), mode='fast')
+    assert service.metrics()['queue_depth'] == 1
+
+
+def test_http_interface(local_repo):
+    service = ReviewService(workers=2, review_fn=DiffLengthReview(delay=0.05),
+                            llm_factory=lambda model: object())
+    service.start()
+    server = ReviewHTTPServer(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    def request(path: str, body: dict | None = None) -> tuple[int, str]:
+        data = json.dumps(body).encode() if body is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url + path, data=data)) as r:
+                return r.status, r.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    try:
+        status, body = request('/reviews', {'path': str(local_repo), 'source_branch': 'test',
+                                            'destination_branch': 'main', 'id': 'pr-1'})
+        assert (status, json.loads(body)) == (202, {'id': 'pr-1', 'status': 'queued'})
+        assert request('/reviews', {'path': str(local_repo)})[0] == 400
+
+        wait_for(service, 'pr-1')
+        status, body = request('/reviews/pr-1')
+        assert status == 200
+        assert json.loads(body)['review'].startswith('agent: ')
+        assert request('/reviews/pr-2')[0] == 404
+
+        status, body = request('/metrics')
+        assert "pr_reviewer_queue_depth 0" in body
+        assert "pr_reviewer_review_p95_seconds" in body
+        assert json.loads(request('/stats')[1])['completed'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.stop()
+
+
+def test_service_runs_make_review(local_repo, tmp_path, closed):
+    service = ReviewService(workers=1, llm_factory=lambda model: ScriptedReviewModel(),
+                            cache_path=tmp_path / "cache.sqlite")
+    service.start()
+    try:
+        record = service.submit(ReviewJob(str(local_repo), 'test', 'main'))
+        assert wait_for(service, record.id).review == "Reviewed 4 files."
+    finally:
+        service.stop()
+    # The warm toolbox is closed with the pool, the shared cache after it
+    assert closed == ['GitTools', 'BlobCache']
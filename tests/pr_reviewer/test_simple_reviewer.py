@@ -0,0 +1,116 @@
+import asyncio
+import logging
+
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+
+from pr_reviewer.benchmark.stub_llm import FakeAPIError, FlakyReviewModel, ScriptedReviewModel
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.simple_reviewer import amake_review, format_changes, prefetch_review_prompt
+
+
+def test_format_changes_packs_all_diffs(local_repo):
+    changes = format_changes(GitTools(local_repo), "main", "test")
+
+    assert "### file_to_modify.txt (modify)" in changes
+    assert "+Row changed" in changes
+    assert "### file_to_add.txt (add)" in changes
+    assert "### file_to_delete.txt (delete)" in changes
+    assert "README.md" not in changes
+    assert "without a diff" not in changes
+
+
+def test_format_changes_lists_files_over_limit(local_repo):
+    changes = format_changes(GitTools(local_repo), "main", "test", max_chars=40)
+
+    assert "Files without a diff" in changes
+    assert "- src/pkg/module.py (modify)" in changes
+
+
+def test_format_changes_same_branches(local_repo):
+    assert "same content" in format_changes(GitTools(local_repo), "main", "main")
+
+
+def test_prefetch_prompt_keeps_braces_of_diffs(local_repo):
+    prompt = ChatPromptTemplate.from_messages([('human', prefetch_review_prompt)])
+    messages = prompt.format_messages(old_branch="main", new_branch="test",
+                                      changes="+ data = {'key': 1}")
+    assert "{'key': 1}" in messages[0].content
+
+
+def test_chunked_review_merges_findings(local_repo, monkeypatch, capsys, caplog):
+    from langchain_core.language_models import FakeListChatModel
+
+    from pr_reviewer import simple_reviewer
+
+    caplog.set_level(logging.INFO, logger='pr_reviewer')
+    llm = FakeListChatModel(responses=["finding A", "finding B"])
+    monkeypatch.setattr(simple_reviewer, "get_llm", lambda model: llm)
+
+    review = simple_reviewer.make_review(local_repo, "main", "test", mode="chunked",
+                                         diff_budget=10_000)
+    assert review == "finding A"
+
+    review = simple_reviewer.make_review(local_repo, "main", "test", mode="chunked",
+                                         diff_budget=50, max_concurrency=1)
+    assert review.startswith("## Part 1 of ")
+    assert "finding A" in review and "finding B" in review
+    # The round-trip report is logged, not printed
+    assert capsys.readouterr().out == ""
+    assert any("model calls" in message for message in caplog.messages)
+
+
+def test_make_review_closes_what_it_opens(local_repo, tmp_path, closed):
+    from langchain_core.language_models import FakeListChatModel
+
+    from pr_reviewer import simple_reviewer
+
+    llm = FakeListChatModel(responses=["finding"])
+
+    simple_reviewer.make_review(local_repo, "main", "test", mode="chunked", llm=llm,
+                                cache_path=tmp_path / "cache.sqlite")
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+
+    # A toolbox of the caller stays open
+    closed.clear()
+    toolbox = GitTools(local_repo)
+    simple_reviewer.make_review(local_repo, "main", "test", mode="chunked", llm=llm,
+                                toolbox=toolbox)
+    assert closed == []
+    toolbox.close()
+
+
+@pytest.mark.parametrize('mode, expected', [('agent', "Reviewed 4 files."),
+                                            ('prefetch', "Reviewed the prefetched changes.")])
+def test_amake_review(local_repo, tmp_path, closed, mode, expected):
+    review = asyncio.run(amake_review(local_repo, "main", "test", mode=mode,
+                                      llm=ScriptedReviewModel(),
+                                      cache_path=tmp_path / "cache.sqlite"))
+
+    assert review == expected
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+
+
+def test_amake_review_chunked(local_repo, closed, caplog):
+    from langchain_core.language_models import FakeListChatModel
+
+    caplog.set_level(logging.INFO, logger='pr_reviewer')
+    llm = FakeListChatModel(responses=["finding A", "finding B"])
+
+    review = asyncio.run(amake_review(local_repo, "main", "test", mode="chunked", llm=llm,
+                                      diff_budget=50, max_concurrency=1))
+    assert review.startswith("## Part 1 of ")
+    assert "finding A" in review and "finding B" in review
+    assert any("model calls" in message for message in caplog.messages)
+
+    assert asyncio.run(amake_review(local_repo, "main", "main", mode="chunked", llm=llm)) == \
+           "Branches `main` and `main` have the same content"
+    assert closed == ['GitTools', 'GitTools']
+
+
+def test_amake_review_closes_on_failure(local_repo, tmp_path, closed):
+    llm = FlakyReviewModel(failures=[1], status_code=401)
+    with pytest.raises(FakeAPIError):
+        asyncio.run(amake_review(local_repo, "main", "test", llm=llm,
+                                 cache_path=tmp_path / "cache.sqlite"))
+    assert sorted(closed) == ['BlobCache', 'GitTools']
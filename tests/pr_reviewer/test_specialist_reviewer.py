@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from pr_reviewer.benchmark.stub_llm import FakeAPIError, FlakyReviewModel, ScriptedReviewModel
+from pr_reviewer.specialist_reviewer import (GENERAL, Finding, dedupe_findings,
+                                             make_specialist_review, parse_findings,
+                                             render_findings)
+
+
+def test_parse_findings():
+    text = ("- `src/app.py`: SQL query is built with an f-string, use parameters.\n"
+            "* other.py: unused import\n"
+            "Overall the change looks fine.\n")
+
+    findings = parse_findings(text, 'security', known_paths={'src/app.py'})
+    assert findings == [
+        Finding('src/app.py', "SQL query is built with an f-string, use parameters.",
+                ['security']),
+        Finding(GENERAL, "other.py: unused import", ['security']),
+        Finding(GENERAL, "Overall the change looks fine.", ['security']),
+    ]
+    assert parse_findings("No issues found.", 'style') == []
+
+
+def test_dedupe_findings_merges_specialists():
+    findings = dedupe_findings([
+        Finding('a.py', "Query is built with an f-string, use parameters.", ['security']),
+        Finding('a.py', "The query is built with an f-string; use parameters", ['correctness']),
+        Finding('b.py', "Query is built with an f-string, use parameters.", ['style']),
+        Finding('a.py', "Loop reads the file on every iteration", ['performance']),
+    ])
+
+    assert [(f.file_path, f.specialists) for f in findings] == [
+        ('a.py', ['security', 'correctness']),
+        ('b.py', ['style']),
+        ('a.py', ['performance']),
+    ]
+    assert render_findings(findings).startswith(
+        "### a.py\n\n- Query is built with an f-string, use parameters. "
+        "_(security, correctness)_\n- Loop reads")
+
+
+def test_specialist_review_merges_answers(local_repo):
+    llm = FakeListChatModel(responses=[
+        "- `src/pkg/module.py`: magic number 42",
+        "No issues found.",
+    ])
+
+    review = make_specialist_review(local_repo, "main", "test", llm=llm,
+                                    specialists=['correctness', 'style'], max_concurrency=1)
+    assert review == "### src/pkg/module.py\n\n- magic number 42 _(correctness)_"
+
+    with pytest.raises(ValueError, match="Unknown specialists"):
+        make_specialist_review(local_repo, "main", "test", llm=llm, specialists=['typos'])
+
+
+def test_specialists_run_in_parallel(local_repo):
+    start = time.perf_counter()
+    review = make_specialist_review(local_repo, "main", "test",
+                                    llm=ScriptedReviewModel(latency=0.3))
+
+    # Four specialists, each call takes 0.3s
+    assert time.perf_counter() - start < 0.9
+    assert review == ("### General\n\n- Reviewed the prefetched changes. "
+                      "_(security, performance, correctness, style)_")
+
+
+def test_specialist_review_closes_what_it_opens(local_repo, tmp_path, closed):
+    make_specialist_review(local_repo, "main", "test", llm=ScriptedReviewModel(),
+                           cache_path=tmp_path / "cache.sqlite")
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+
+    closed.clear()
+    with pytest.raises(FakeAPIError):
+        make_specialist_review(local_repo, "main", "test", specialists=['style'],
+                               llm=FlakyReviewModel(failures=[1], status_code=401),
+                               cache_path=tmp_path / "cache.sqlite")
+    assert sorted(closed) == ['BlobCache', 'GitTools']
@@ -0,0 +1,99 @@
+import asyncio
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Any
+
+from langchain_core.language_models import FakeListChatModel
+
+from pr_reviewer import streaming_reviewer
+from pr_reviewer.streaming_reviewer import astream_review, stream_review
+
+
+def test_stream_review_yields_finding_per_file(local_repo, monkeypatch):
+    llm = FakeListChatModel(responses=["looks fine"])
+    monkeypatch.setattr(streaming_reviewer, "get_llm", lambda model: llm)
+
+    findings = list(stream_review(local_repo, "main", "test"))
+
+    assert sorted(f.file_path for f in findings) == [
+        "file_to_add.txt", "file_to_delete.txt", "file_to_modify.txt", "src/pkg/module.py"]
+    assert findings[0].render().endswith("\n\nlooks fine")
+
+
+class GatedModel(FakeListChatModel):
+    """Answers the first call at once, the other ones only after `gate` is set."""
+    gate: Any
+    completed: int = 0
+
+    def _call(self, *args, **kwargs) -> str:
+        if self.completed:
+            self.gate.wait(timeout=10)
+        self.completed += 1
+        return super()._call(*args, **kwargs)
+
+
+def test_stream_review_is_lazy(local_repo, monkeypatch):
+    gate = threading.Event()
+    llm = GatedModel(responses=["looks fine"], gate=gate)
+    monkeypatch.setattr(streaming_reviewer, "get_llm", lambda model: llm)
+    closed = []
+    monkeypatch.setattr(streaming_reviewer.GitTools, "close",
+                        lambda self: closed.append(self))
+
+    findings = stream_review(local_repo, "main", "test", max_concurrency=1)
+    first = next(findings)
+
+    # The first finding comes before the other files are reviewed
+    assert first.text == "looks fine"
+    assert llm.completed == 1
+    gate.set()
+    findings.close()
+    assert len(closed) == 1
+
+
+def test_astream_review(local_repo, monkeypatch):
+    llm = FakeListChatModel(responses=["async finding"])
+    monkeypatch.setattr(streaming_reviewer, "get_llm", lambda model: llm)
+
+    async def collect():
+        return [finding async for finding in astream_review(local_repo, "main", "test")]
+
+    findings = asyncio.run(collect())
+    assert len(findings) == 4
+    assert all(finding.text == "async finding" for finding in findings)
+
+
+def test_stream_review_same_branches(local_repo):
+    assert list(stream_review(local_repo, "main", "main")) == []
+
+
+def test_stream_review_closes_its_cache(local_repo, tmp_path, monkeypatch, closed):
+    monkeypatch.setattr(streaming_reviewer, "get_llm",
+                        lambda model: FakeListChatModel(responses=["looks fine"]))
+    cache_path = tmp_path / "cache.sqlite"
+
+    findings = stream_review(local_repo, "main", "test", cache_path=cache_path)
+    next(findings)
+    findings.close()
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+
+    closed.clear()
+
+    async def collect():
+        return [finding async for finding in astream_review(local_repo, "main", "test",
+                                                            cache_path=cache_path)]
+
+    assert len(asyncio.run(collect())) == 4
+    assert sorted(closed) == ['BlobCache', 'GitTools']
+
+
+def test_cli_rejects_mode_with_stream(local_repo):
+    root = Path(__file__).resolve().parents[2]
+    result = subprocess.run([sys.executable, str(root / 'make_review.py'), '-p', str(local_repo),
+                             '--stream', '--mode', 'chunked'],
+                            capture_output=True, text=True, cwd=root)
+
+    assert result.returncode == 2
+    assert "argument --mode: not allowed with --stream" in result.stderr
@@ -0,0 +1,73 @@
+import asyncio
+
+from langchain_core.language_models import FakeListChatModel
+
+from pr_reviewer import simple_reviewer
+from pr_reviewer.git_tools.git_tools import GitTools
+from pr_reviewer.tracing import Tracer, trace_span
+
+
+def test_spans_are_recorded_only_when_active(local_repo):
+    git_tools = GitTools(local_repo)
+    tracer = Tracer()
+    git_tools.diff_file_content("main", "test", "file_to_modify.txt")
+    assert tracer.spans == []
+
+    git_tools = GitTools(local_repo)
+    with tracer.activate():
+        diff = git_tools.diff_file_content("main", "test", "file_to_modify.txt")
+
+    spans = {span.name: span for span in tracer.spans}
+    assert spans.keys() == {"diff_file_content", "tree_changes", "write_object_diff"}
+    tool = spans["diff_file_content"]
+    assert tool.kind == "tool"
+    assert tool.attributes["bytes"] == len(diff.encode())
+    assert spans["tree_changes"].parent_id == tool.span_id
+    assert spans["tree_changes"].attributes["files"] == 4
+
+
+def test_review_spans_with_model_calls(local_repo, monkeypatch):
+    llm = FakeListChatModel(responses=["finding"])
+    monkeypatch.setattr(simple_reviewer, "get_llm", lambda model: llm)
+    tracer = Tracer()
+    with tracer.activate():
+        simple_reviewer.make_review(local_repo, "main", "test", mode="chunked",
+                                    diff_budget=10_000)
+
+    review = next(span for span in tracer.spans if span.kind == "review")
+    llm_spans = [span for span in tracer.spans if span.kind == "llm"]
+    assert len(llm_spans) == 1
+    assert llm_spans[0].parent_id == review.span_id
+    assert {row["kind"] for row in tracer.summary()} >= {"review", "llm", "tool", "tree_walk"}
+    assert "write_object_diff" in tracer.summary_table()
+
+
+def test_git_spans_of_async_api_are_recorded(local_repo):
+    git_tools = GitTools(local_repo)
+    tracer = Tracer()
+
+    async def run():
+        with tracer.activate(), trace_span("review", "review"):
+            await git_tools.aget_file_content("test", "file_to_add.txt")
+
+    asyncio.run(run())
+    git_tools.close()
+    names = [span.name for span in tracer.spans]
+    assert "get_file_content" in names and "read_blob" in names
+
+
+def test_otlp_export():
+    tracer = Tracer()
+    with tracer.activate(), trace_span("review", "review"):
+        with trace_span("model", "llm", tokens_in=10, tokens_out=2):
+            pass
+
+    otlp = tracer.to_otlp()
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 2
+    child = next(span for span in spans if span["name"] == "model")
+    root = next(span for span in spans if span["name"] == "review")
+    assert child["parentSpanId"] == root["spanId"]
+    assert len(child["traceId"]) == 32 and len(child["spanId"]) == 16
+    assert {"key": "pr_reviewer.tokens_in", "value": {"intValue": "10"}} in child["attributes"]
+    assert tracer.to_json()[0]["duration_ms"] >= 0